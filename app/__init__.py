@@ -1,10 +1,26 @@
-from flask import Flask
-from flask_cors import CORS
-from app.models.database import db
-from flask_migrate import Migrate
 import os
 
 def create_app():
+    # Imported here so the collectors under app.metrics can be used without Flask or
+    # SQLAlchemy installed, as the agent (python -m app.agent) does
+    from flask import Flask
+    from flask_cors import CORS
+    from flask_migrate import Migrate
+    from app import instrumentation
+    from app.logging_config import configure_logging
+    from app.models.database import db
+    from app.api.token_cache import token_cache
+    from app.metrics.alerts import alert_engine
+    from app.metrics.broadcaster import broadcaster
+    from app.metrics.collector import collector
+    from app.metrics.docker_pool import docker_pool
+    from app.metrics.leader import collect_command, coordinator
+    from app.models.query_plans import check_query_plans_command
+    from app.models.retention import retention_engine
+    from app.models.recent_samples import recent_samples
+    from app.models.write_buffer import write_buffer
+    from app.models import sqlite_tuning
+
     app = Flask(__name__)
     CORS(app)
     
@@ -16,9 +32,24 @@ def create_app():
         
     app.config.from_object('app.config.Config')  # Load config first
     
+    configure_logging(app)
+
     # Initialize extensions
     db.init_app(app)
+    sqlite_tuning.init_app(app)
+    instrumentation.init_app(app, db)
     migrate = Migrate(app, db)  # Initialize Flask-Migrate
+    write_buffer.init_app(app)
+    recent_samples.init_app(app)
+    docker_pool.init_app(app)
+    token_cache.init_app(app)
+    alert_engine.init_app(app)
+    collector.init_app(app)
+    broadcaster.init_app(app)
+    retention_engine.init_app(app)
+    coordinator.init_app(app)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(collect_command)
 
     with app.app_context():
         from app.api.routes import api_bp
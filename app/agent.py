@@ -0,0 +1,280 @@
+"""Metricly agent: samples this host and pushes the samples to a hub.
+
+    python -m app.agent --hub http://hub:5000 --token <token>
+
+where <token> is one of the hub's AGENT_TOKENS that lists this server's IP.
+
+Uses the same collectors as the hub (app.metrics.system_metrics and, with --docker,
+app.metrics.docker_metrics) but neither Flask nor SQLAlchemy, so it only needs psutil,
+requests and, for container metrics, the Docker SDK. Samples are taken every --interval
+seconds and pushed as one gzipped JSON batch every --push-interval seconds to the hub's
+/api/ingest. While the hub can't be reached, batches are spooled to --spool-dir and sent
+oldest first once it is back.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+import zlib
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import requests
+
+from app.logging_config import configure_logging
+from app.metrics.system_metrics import get_system_metrics
+
+log = logging.getLogger('app.agent')  # not __name__, which is __main__ under python -m
+
+LOCALHOST = "127.0.0.1"
+MAX_BACKOFF = 300
+SPOOL_DRAIN_BATCHES = 10  # spooled batches sent per push, so a backlog drains without a burst
+
+
+def encode_batch(server_ip, samples, hostname=None):
+    """Gzipped JSON body of a push: ``{server_ip, hostname, samples}``."""
+    body = {'server_ip': server_ip, 'hostname': hostname, 'samples': samples}
+    return gzip.compress(json.dumps(body, separators=(',', ':')).encode(), compresslevel=6)
+
+
+def decode_batch(data, max_bytes, compressed=True):
+    """Parse a pushed batch.
+
+    Raises OverflowError if it inflates to more than ``max_bytes`` and ValueError if it is malformed.
+    """
+    if compressed:
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = inflater.decompress(data, max_bytes + 1)
+        except zlib.error as e:
+            raise ValueError(f"Invalid gzip data: {e}")
+        if len(data) > max_bytes or inflater.unconsumed_tail:
+            raise OverflowError(f"Batch is larger than {max_bytes} bytes")
+    elif len(data) > max_bytes:
+        raise OverflowError(f"Batch is larger than {max_bytes} bytes")
+    try:
+        batch = json.loads(data)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(batch, dict) or not isinstance(batch.get('samples'), list):
+        raise ValueError("Batch must be an object with a samples list")
+    if not isinstance(batch.get('server_ip'), str):
+        raise ValueError("Batch must name its server_ip")
+    return batch
+
+
+class Spool:
+    """Pushes that failed, one gzipped batch per file, sent again oldest first.
+
+    Files are written to a temporary name and renamed, so a crash never leaves a partial
+    batch behind. Past ``max_bytes`` the oldest batches are dropped.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def files(self):
+        names = sorted(name for name in os.listdir(self.path) if name.endswith('.json.gz'))
+        return [os.path.join(self.path, name) for name in names]
+
+    def put(self, body):
+        # Names sort by creation time, so files() lists batches oldest first
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json.gz"
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, os.path.join(self.path, name))
+        self._trim()
+
+    def _trim(self):
+        files = self.files()
+        sizes = [os.path.getsize(path) for path in files]
+        total = sum(sizes)
+        for path, size in zip(files, sizes):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            log.warning("Spool is over %d bytes; dropped %s", self.max_bytes, os.path.basename(path))
+
+
+class Agent:
+    """Samples on one cadence and pushes on another, spooling what the hub doesn't accept."""
+
+    def __init__(self, hub_url, token, server_ip, interval=5.0, push_interval=15.0,
+                 docker=False, spool=None, timeout=(3, 30)):
+        self.ingest_url = hub_url.rstrip('/') + '/api/ingest'
+        self.server_ip = server_ip
+        self.hostname = socket.gethostname()
+        self.interval = interval
+        self.push_interval = push_interval
+        self.docker = docker
+        self.spool = spool
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+        })
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._backoff = 0
+        self._docker_cache = None
+
+    def _add(self, sample):
+        with self._lock:
+            self._pending.append(sample)
+
+    def _take(self):
+        with self._lock:
+            samples, self._pending = self._pending, []
+        return samples
+
+    def _on_docker_refresh(self, server_ip, containers, ts):
+        self._add({'ts': ts, 'containers': containers})
+
+    def sample(self):
+        try:
+            metrics = get_system_metrics(LOCALHOST)
+        except Exception as e:
+            log.warning("Error sampling system metrics: %s", e)
+            return
+        self._add({'ts': int(time.time()), 'system': metrics})
+
+    def send(self, body):
+        """POST one batch; True once the hub has it or has rejected it for good."""
+        response = self.session.post(self.ingest_url, data=body, timeout=self.timeout)
+        if response.ok:
+            return True
+        if response.status_code in (400, 403, 413):
+            # Retrying a batch the hub can't parse or won't take would only block the spool behind it
+            log.error("Hub rejected a batch (%d): %s; dropping it", response.status_code, response.text[:200])
+            return True
+        raise Exception(f"Hub returned {response.status_code} {response.reason}")
+
+    def push(self):
+        """Send the samples taken since the last push, then part of the spool."""
+        samples = self._take()
+        body = encode_batch(self.server_ip, samples, self.hostname) if samples else None
+        try:
+            if body is not None:
+                self.send(body)
+                body = None
+            for path in (self.spool.files()[:SPOOL_DRAIN_BATCHES] if self.spool else []):
+                with open(path, 'rb') as f:
+                    self.send(f.read())
+                os.remove(path)
+        except Exception as e:
+            self._backoff = min(max(self._backoff * 2, self.push_interval), MAX_BACKOFF)
+            log.warning("Error pushing to %s: %s; retrying in %ds", self.ingest_url, e, self._backoff)
+            if body is not None:
+                self._keep(body)
+            return False
+        self._backoff = 0
+        return True
+
+    def _keep(self, body):
+        if self.spool is None:
+            log.warning("No spool configured; dropped a batch")
+            return
+        try:
+            self.spool.put(body)
+        except OSError as e:
+            log.error("Error spooling a batch: %s", e)
+
+    def run(self):
+        if self.docker:
+            # Imported only when needed, so hosts without the Docker SDK can still run the agent
+            from app.metrics.docker_metrics import docker_metrics_cache
+            self._docker_cache = docker_metrics_cache
+            docker_metrics_cache.ttl = self.interval
+            docker_metrics_cache.on_refresh = self._on_docker_refresh
+            docker_metrics_cache.start()
+
+        log.info("Pushing samples of %s to %s every %gs", self.server_ip, self.ingest_url, self.push_interval)
+        next_sample = next_push = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_sample:
+                self.sample()
+                next_sample += self.interval
+                if next_sample <= now:
+                    next_sample = now + self.interval
+            if now >= next_push:
+                self.push()
+                next_push = time.monotonic() + (self._backoff or self.push_interval)
+            self._stop.wait(max(min(next_sample, next_push) - time.monotonic(), 0))
+
+        if self._docker_cache is not None:
+            self._docker_cache.stop()
+        # Last push on the way out; whatever it can't deliver is spooled for next time
+        samples = self._take()
+        if samples:
+            body = encode_batch(self.server_ip, samples, self.hostname)
+            try:
+                self.send(body)
+            except Exception as e:
+                log.warning("Error pushing final batch: %s; spooling it", e)
+                self._keep(body)
+
+    def stop(self):
+        self._stop.set()
+
+
+def detect_server_ip(hub_url):
+    """Address this host reaches the hub from, i.e. the one the hub would know it by."""
+    parsed = urlparse(hub_url)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.connect((parsed.hostname, parsed.port or 80))  # UDP: nothing is sent
+        return s.getsockname()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.agent', description=__doc__.splitlines()[0])
+    parser.add_argument('--hub', default=os.getenv('METRICLY_HUB_URL'),
+                        help='Hub base URL, e.g. http://hub:5000 (METRICLY_HUB_URL)')
+    parser.add_argument('--token', default=os.getenv('METRICLY_AGENT_TOKEN'),
+                        help='A token from the hub\'s AGENT_TOKENS that lists this server (METRICLY_AGENT_TOKEN)')
+    parser.add_argument('--server-ip', default=os.getenv('AGENT_SERVER_IP'),
+                        help='IP this server is registered under on the hub; detected if omitted')
+    parser.add_argument('--interval', type=float, default=float(os.getenv('AGENT_INTERVAL', 5)),
+                        help='Seconds between samples')
+    parser.add_argument('--push-interval', type=float, default=float(os.getenv('AGENT_PUSH_INTERVAL', 15)),
+                        help='Seconds between pushes')
+    parser.add_argument('--docker', action=argparse.BooleanOptionalAction,
+                        default=os.getenv('AGENT_DOCKER', 'false').lower() == 'true',
+                        help='Also sample Docker containers')
+    parser.add_argument('--spool-dir', default=os.getenv('AGENT_SPOOL_DIR', os.path.expanduser('~/.metricly/spool')),
+                        help='Where batches wait while the hub is unreachable')
+    parser.add_argument('--spool-max-mb', type=float, default=float(os.getenv('AGENT_SPOOL_MAX_MB', 100)),
+                        help='Spool size past which the oldest batches are dropped')
+    args = parser.parse_args(argv)
+    if not args.hub or not args.token:
+        parser.error('--hub and --token are required')
+
+    configure_logging(SimpleNamespace(config={
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'INFO'),
+        'LOG_FORMAT': os.getenv('LOG_FORMAT', 'text'),
+    }))
+    agent = Agent(
+        args.hub, args.token, args.server_ip or detect_server_ip(args.hub),
+        interval=args.interval, push_interval=args.push_interval, docker=args.docker,
+        spool=Spool(args.spool_dir, int(args.spool_max_mb * 1024 * 1024)),
+    )
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: agent.stop())
+    agent.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,147 @@
 import docker
+import hmac
 import jwt
-from datetime import datetime, timedelta
+import logging
+from datetime import datetime, timedelta, timezone
 import requests
 import socket
-from flask import Blueprint, jsonify, request
+import time
+from flask import Blueprint, Response, current_app, g, jsonify, request
 from functools import wraps
 from werkzeug.security import check_password_hash
-from app.metrics.system_metrics import get_system_metrics
-from app.metrics.docker_metrics import get_docker_metrics
-from app.models.database import Metric, db, Server, User, Threshold  # ✅ Ensure User model exists
+from app.agent import decode_batch
+from app.api.serialization import check_format, compress_response, render
+from app.api.token_cache import Principal, token_cache
+from app.instrumentation import PROMETHEUS_CONTENT_TYPE, registry
+from app.metrics.docker_logs import LogStream, encode_log_event, log_stream_slots, since_for_cursor
+from app.metrics.docker_metrics import find_docker_metrics
+from app.metrics.docker_pool import docker_pool
+from app.metrics.collector import collector
+from app.metrics.leader import coordinator
+from app.metrics.alerts import alert_engine
+from app.metrics.broadcaster import broadcaster, encode_event
+from app.models.database import db, Server, User, Threshold  # ✅ Ensure User model exists
+from app.models.downsample import DOWNSAMPLE_MODES, bucket_width
+from app.models.recent_samples import recent_samples
+from app.models.retention import retention_engine
+from app.models.write_buffer import write_buffer
+from app.models.timeseries import (
+    BYTES_PER_MB,
+    RAW_TIER,
+    container_names,
+    delete_server_samples,
+    format_ts,
+    query_container_history,
+    query_system_history,
+    tier_retention,
+)
 import os
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 api_bp = Blueprint('api', __name__)
+log = logging.getLogger(__name__)
 limiter = Limiter(key_func=get_remote_address)
 
 # Get secret key from environment variable
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your_secret_key')  # Fallback for development
 TOKEN_EXPIRATION = int(os.environ.get('TOKEN_EXPIRATION_HOURS', 24))  # Default 24 hours
 
+# Seconds covered by each history timeRange
+TIME_RANGES = {
+    '1h': 3600,
+    '24h': 86400,
+    '7d': 604800
+}
+
+def parse_downsampling(range_seconds):
+    """Read ?points=, ?bucket= (seconds) and ?mode=avg|lttb for the history endpoints.
+
+    Returns ``(mode, bucket, points)``, with ``bucket`` None when no downsampling was asked for.
+    """
+    mode = request.args.get('mode', 'avg')
+    if mode not in DOWNSAMPLE_MODES:
+        raise ValueError(f"Invalid mode, expected one of: {', '.join(DOWNSAMPLE_MODES)}")
+    points = request.args.get('points', type=int)
+    bucket = request.args.get('bucket', type=int)
+    if (points is not None and points < 3) or (bucket is not None and bucket < 1):
+        raise ValueError("points must be at least 3 and bucket at least 1 second")
+
+    if bucket is None and points is not None:
+        bucket = bucket_width(range_seconds, points)
+    elif bucket is not None and points is None:
+        points = max(3, range_seconds // bucket)
+    return mode, bucket, points
+
+def parse_time_arg(name):
+    """Read a timestamp argument as epoch seconds; ISO 8601 timestamps (UTC if naive) work too."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be epoch seconds or an ISO 8601 timestamp")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def parse_since():
+    """Read the ?since= cursor of the history endpoints.
+
+    History endpoints return points at or after the cursor, so passing the timestamp of the
+    last point already held re-sends that point, whose bucket may have been incomplete.
+    """
+    return parse_time_arg('since')
+
+def parse_bool_arg(name):
+    return request.args.get(name, 'false').lower() in ('1', 'true', 'yes')
+
+def parse_format():
+    """Read ?format=json|columnar|msgpack for the history endpoints."""
+    return check_format(request.args.get('format', 'json'))
+
+def history_response(data, fmt='json'):
+    """Render ``data`` in ``fmt`` with an ETag, answering 304 when it matches the client's If-None-Match."""
+    response = render(data, fmt)
+    # Weak from the start: compression weakens it on a 200 but never sees the body of a 304,
+    # and both must carry the same validator whatever encoding the client negotiates
+    response.add_etag(weak=True)
+    response.headers['Cache-Control'] = 'no-cache'  # Always revalidate, never reuse blindly
+    return response.make_conditional(request)
+
+# ✅ Compress API responses for clients that accept brotli or gzip
+@api_bp.after_request
+def compress(response):
+    if not current_app.config.get('COMPRESSION_ENABLED', True):
+        return response
+    return compress_response(
+        response, request.accept_encodings,
+        min_size=current_app.config.get('COMPRESSION_MIN_SIZE', 500),
+        level=current_app.config.get('COMPRESSION_LEVEL', 6)
+    )
+
 # ✅ Middleware to protect routes
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get("Authorization")
+def authenticate():
+    """Verify the request's bearer token and put its ``Principal`` on ``g.current_user``.
+
+    Returns an error response if the token is missing or invalid, else None. Verified tokens
+    are cached, so repeat requests skip both the decode and the user lookup.
+    """
+    token = request.headers.get("Authorization")
 
-        if not token:
-            return jsonify({"error": "Token is missing"}), 401
+    if not token:
+        return jsonify({"error": "Token is missing"}), 401
 
+    token = token.split("Bearer ")[-1]
+    principal = token_cache.get(token)
+    if principal is None:
         try:
-            data = jwt.decode(token.split("Bearer ")[-1], SECRET_KEY, algorithms=["HS256"])
+            data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
             current_user = User.query.filter_by(username=data["username"]).first()
             if not current_user:
                 return jsonify({"error": "User not found"}), 401
@@ -38,7 +149,23 @@ def token_required(f):
             return jsonify({"error": "Token expired"}), 401
         except jwt.InvalidTokenError:
             return jsonify({"error": "Invalid token"}), 401
+        principal = Principal(current_user.u_id, current_user.username, current_user.role)
+        token_cache.put(token, principal, data.get("exp"))
+
+    g.current_user = principal
+    return None
 
+def known_server(ip):
+    """True for localhost and registered servers, the only hosts this hub talks to."""
+    return ip == "127.0.0.1" or Server.query.filter_by(ip_address=ip).first() is not None
+
+def token_required(f):
+    """Require a valid bearer token; see :func:`authenticate`."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        error = authenticate()
+        if error is not None:
+            return error
         return f(*args, **kwargs)
     
     return decorated
@@ -69,22 +196,14 @@ def register():
 @limiter.limit("5 per minute")
 def login():
     data = request.get_json()
-    print(f"Login attempt received for username: {data.get('username')}")  # Debug log
     
     if not data or "username" not in data or "password" not in data:
-        print("Missing username or password")  # Debug log
+        log.debug("Login attempt without username or password")
         return jsonify({"error": "Missing username or password"}), 400
 
     try:
-        print("Attempting to query user from database...")  # Debug log
         user = User.query.filter_by(username=data["username"]).first()
-        print(f"User found: {user is not None}")  # Debug log
-        print(f"User details: {user.__dict__ if user else None}")  # Debug log
-        
-        if user:
-            password_check = user.check_password(data["password"])
-            print(f"Password check result: {password_check}")  # Debug log
-            print(f"Provided password: {data['password']}")  # Debug log
+        password_check = user is not None and user.check_password(data["password"])
         
         if user and password_check:
             token = jwt.encode(
@@ -95,14 +214,13 @@ def login():
                 SECRET_KEY,
                 algorithm="HS256",
             )
-            print("Login successful, token generated")  # Debug log
+            log.info("Login succeeded", extra={'username': user.username})
             return jsonify({"token": token})
         
-        print("Login failed: Invalid credentials")  # Debug log
+        log.info("Login failed: invalid credentials", extra={'username': data["username"]})
         return jsonify({"error": "Invalid credentials"}), 401
     except Exception as e:
-        print(f"Login error: {str(e)}")  # Debug log
-        print(f"Full error details: {repr(e)}")  # Debug log
+        log.exception("Login error")
         return jsonify({"error": "Login failed", "details": str(e)}), 500
 
 # ✅ Get system metrics (public access)
@@ -120,9 +238,13 @@ def store_system_metrics():
                 return jsonify({"error": "Server not found"}), 404
 
         try:
-            metrics = get_system_metrics(current_server_ip)
+            # Serve the collector's latest snapshot; only sample on demand before the first tick
+            metrics = collector.get_latest(current_server_ip)
+            if metrics is None:
+                metrics = collector.collect_now(current_server_ip)
+            metrics = dict(metrics)
         except Exception as e:
-            print(f"Error collecting system metrics: {str(e)}")
+            log.warning("Error collecting system metrics for %s: %s", current_server_ip, e)
             return jsonify({"error": str(e)}), 500
         
         # Validate metrics data
@@ -144,13 +266,26 @@ def store_system_metrics():
             
         return jsonify(metrics)
     except Exception as e:
-        print(f"Error in store_system_metrics: {str(e)}")
+        log.exception("Error in store_system_metrics")
         return jsonify({"error": str(e)}), 500
 
-# ✅ Get Docker metrics (public access)
+# ✅ Get Docker metrics (public for localhost, protected for remote servers)
 @api_bp.route('/docker', methods=['GET'])
 def docker_metrics():
-    return jsonify(get_docker_metrics())
+    server_ip = request.args.get('server', '127.0.0.1')
+    if server_ip != "127.0.0.1":
+        error = authenticate()
+        if error is not None:
+            return error
+    try:
+        if not known_server(server_ip):
+            return jsonify({"error": "Server not found"}), 404
+        # Remote caches are created by the collector, never on behalf of a request
+        cache = find_docker_metrics(server_ip)
+        return jsonify(cache.get() if cache is not None else [])
+    except Exception as e:
+        log.exception("Error getting Docker metrics")
+        return jsonify({"error": str(e)}), 500
 
 # ✅ Get all servers (protected)
 @api_bp.route('/servers', methods=['GET'])
@@ -172,8 +307,64 @@ def add_server():
     new_server = Server(ip_address=data["ip_address"])
     db.session.add(new_server)
     db.session.commit()
+    collector.add_server(new_server.ip_address)
     return jsonify({"message": "Server added"}), 201
 
+# ✅ Get the latest snapshot of every server in one response (protected)
+@api_bp.route('/servers/metrics/latest', methods=['GET'])
+@token_required
+def get_all_latest_metrics():
+    snapshots = collector.get_all_latest()
+    return jsonify([
+        {"ip_address": ip, "metrics": metrics, "error": error}
+        for ip, (metrics, error) in snapshots.items()
+    ])
+
+# ✅ Memory and queue usage of the in-process sample caches (protected)
+@api_bp.route('/collector/stats', methods=['GET'])
+@token_required
+def get_collector_stats():
+    return jsonify({
+        "recent_samples": recent_samples.stats(),
+        "write_buffer": {"queued_rows": len(write_buffer), "dropped_rows": write_buffer.dropped},
+        "stream_subscribers": broadcaster.subscriber_count(),
+        "auth_cache": token_cache.stats(),
+        "collector_leader": coordinator.is_leader
+    })
+
+# ✅ Live metrics stream (protected): Server-Sent Events fed by the shared collector.
+# ?servers=ip1,ip2 limits the stream to those servers; ?interval= is the minimum number of
+# seconds between batches, with newer samples replacing older ones that were not yet sent.
+@api_bp.route('/stream/metrics', methods=['GET'])
+@token_required
+def stream_metrics():
+    servers = [ip for ip in request.args.get('servers', '').split(',') if ip]
+    min_interval = max(request.args.get('interval', 0, type=float), 0)
+    heartbeat = current_app.config.get('STREAM_HEARTBEAT_SECONDS', 15)
+
+    subscription = broadcaster.subscribe(servers, min_interval)
+    if subscription is None:
+        return jsonify({"error": "Too many live streams open"}), 503
+
+    def generate():
+        yield f"retry: {int(collector.interval * 1000)}\n\n"
+        # Start with the current snapshot so the client doesn't wait a full interval
+        for ip, (metrics, error) in collector.get_all_latest().items():
+            if subscription.wants(ip) and (metrics or error):
+                yield encode_event(ip, metrics, error)
+        while not subscription.closed:
+            events = subscription.next_batch(heartbeat)
+            yield ''.join(events) if events else ": keep-alive\n\n"
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Stop nginx from buffering the stream
+    })
+    # Released when the server closes the response, even if the body was never read (HEAD,
+    # a client gone before the first chunk), which a finally in generate() would miss
+    response.call_on_close(lambda: broadcaster.unsubscribe(subscription))
+    return response
+
 # ✅ Get server metrics from database (protected)
 @api_bp.route('/servers/<ip>/metrics', methods=['GET'])
 @token_required
@@ -186,57 +377,43 @@ def get_server_metrics(ip):
                 return jsonify({"error": "Server not found"}), 404
 
         time_range = request.args.get('timeRange', '1h')
-        current_time = datetime.utcnow()
-        
-        if time_range == '1h':
-            start_time = current_time - timedelta(hours=1)
-        elif time_range == '24h':
-            start_time = current_time - timedelta(days=1)
-        elif time_range == '7d':
-            start_time = current_time - timedelta(days=7)
-        else:
+        if time_range not in TIME_RANGES:
             return jsonify({'error': 'Invalid time range'}), 400
+        range_seconds = TIME_RANGES[time_range]
+        start_ts = int(time.time()) - range_seconds
 
-        # Get historical metrics
-        historical_metrics = Metric.query.filter(
-            Metric.server_ip == ip,
-            Metric.metric_name == 'system',
-            Metric.timestamp >= start_time
-        ).order_by(Metric.timestamp.asc()).all()
-
-        formatted_metrics = []
-        
-        # Get the latest metrics first
         try:
-            latest_metrics = get_system_metrics(ip)
-            if latest_metrics:
-                latest_data = {
-                    'timestamp': datetime.utcnow().isoformat(),
+            mode, bucket, points = parse_downsampling(range_seconds)
+            since = parse_since()
+            fmt = parse_format()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if since is not None:
+            # Start at the cursor's bucket so the first bucket returned is complete
+            start_ts = max(start_ts, since // bucket * bucket if bucket else since)
+
+        # Get historical metrics; per-mount disk usage only when asked for with ?disks=all
+        formatted_metrics = query_system_history(
+            ip, start_ts, range_seconds, mode=mode, bucket=bucket, points=points,
+            include_disks=request.args.get('disks') == 'all'
+        )
+
+        # ?include_live=true appends the collector's latest snapshot; it is never sampled here
+        if parse_bool_arg('include_live'):
+            latest_metrics = collector.get_latest(ip)
+            if latest_metrics and (
+                not formatted_metrics or latest_metrics['timestamp'] > formatted_metrics[-1]['timestamp']
+            ):
+                formatted_metrics.append({
+                    'timestamp': latest_metrics['timestamp'],
                     'cpu_percent': float(latest_metrics.get('cpu_percent', 0)),
                     'memory_info': latest_metrics.get('memory_info', {}),
                     'disk_usage': latest_metrics.get('disk_usage', {})
-                }
-                formatted_metrics.append(latest_data)
-        except Exception as e:
-            print(f"Error getting latest metrics: {str(e)}")
-
-        # Format historical metrics
-        for metric in historical_metrics:
-            try:
-                metric_data = {
-                    'timestamp': metric.timestamp.isoformat(),
-                    'cpu_percent': float(metric.metric_value or 0),
-                    'memory_info': metric.memory_info or {},
-                    'disk_usage': metric.disk_usage or {}
-                }
-                formatted_metrics.append(metric_data)
-            except (ValueError, TypeError, AttributeError) as e:
-                print(f"Error formatting metric: {e}")
-                continue
+                })
 
-        return jsonify(formatted_metrics)
+        return history_response(formatted_metrics, fmt)
     except Exception as e:
-        print(f"Error in get_server_metrics: {str(e)}")
+        log.exception("Error in get_server_metrics")
         return jsonify({'error': str(e)}), 500
 
 # ✅ Control Docker containers (protected)
@@ -247,12 +424,11 @@ def container_action(container_name, action):
         server_ip = request.args.get('server')
         if not server_ip:
             return jsonify({'error': 'Missing server IP'}), 400
+        if not known_server(server_ip):
+            return jsonify({'error': 'Server not found'}), 404
 
-        # Use socket file for localhost, TCP for remote servers
-        if server_ip == "127.0.0.1":
-            client = docker.from_env()
-        else:
-            client = docker.DockerClient(base_url=f"tcp://{server_ip}:2375")
+        # Pooled client: socket file for localhost, TCP for remote servers
+        client = docker_pool.get(server_ip)
 
         container = client.containers.get(container_name)
 
@@ -288,7 +464,7 @@ def delete_server(ip):
 
         try:
             # Delete associated metrics first
-            Metric.query.filter_by(server_ip=ip).delete()
+            delete_server_samples(ip)
             
             # Delete associated thresholds
             Threshold.query.filter_by(server_ip=ip).delete()
@@ -296,15 +472,16 @@ def delete_server(ip):
             # Delete the server
             db.session.delete(server)
             db.session.commit()
+            collector.remove_server(ip)
             
             return jsonify({"message": "Server removed successfully"}), 200
         except Exception as e:
             db.session.rollback()
-            print(f"Database error while removing server: {str(e)}")
+            log.exception("Database error while removing server %s", ip)
             return jsonify({"error": "Database error while removing server"}), 500
             
     except Exception as e:
-        print(f"Error removing server: {str(e)}")
+        log.exception("Error removing server %s", ip)
         return jsonify({"error": "Failed to remove server"}), 500
 
 def check_server_connection(ip_address):
@@ -318,16 +495,126 @@ def check_server_connection(ip_address):
 @api_bp.route("/server/<ip>/status")
 @token_required
 def get_server_status(ip):
+    pushed_at = collector.last_push(ip)
+    if pushed_at is not None and time.time() - pushed_at < collector.push_timeout:
+        return jsonify({"isOnline": True, "error": None})  # Its agent pushed recently
     is_online, error = check_server_connection(ip)
     return jsonify({
         "isOnline": is_online,
         "error": error
     })
 
+def agent_servers():
+    """IPs the request's agent token may push for, or None unless it is one of AGENT_TOKENS."""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    token = header[len('Bearer '):].encode()
+    # Compare against every token so the time taken doesn't reveal which one nearly matched
+    servers = None
+    for known, ips in current_app.config['AGENT_TOKENS'].items():
+        if hmac.compare_digest(token, known.encode()):
+            servers = ips
+    return servers
+
+def parse_pushed_samples(samples):
+    """Check the samples of a pushed batch; returns them with integer timestamps."""
+    parsed = []
+    for sample in samples:
+        if not isinstance(sample, dict) or not isinstance(sample.get('ts'), (int, float)):
+            raise ValueError("Every sample needs a numeric ts")
+        system, containers = sample.get('system'), sample.get('containers')
+        if system is not None and not isinstance(system, dict):
+            raise ValueError("system must be an object")
+        if containers is not None and not (
+            isinstance(containers, list) and all(isinstance(c, dict) and 'name' in c for c in containers)
+        ):
+            raise ValueError("containers must be a list of objects with a name")
+        parsed.append({'ts': int(sample['ts']), 'system': system, 'containers': containers})
+    return parsed
+
+# ✅ Samples pushed by an agent (python -m app.agent), authenticated with one of AGENT_TOKENS
+# and only for the servers that token lists. The body is a JSON batch, gzipped with Content-Encoding: gzip; samples older than the raw
+# retention window are skipped and late ones are rolled up again
+@api_bp.route('/ingest', methods=['POST'])
+def ingest_samples():
+    if not current_app.config['AGENT_TOKENS']:
+        return jsonify({"error": "Agent ingestion is disabled"}), 404
+    servers = agent_servers()
+    if servers is None:
+        return jsonify({"error": "Invalid agent token"}), 401
+
+    max_bytes = current_app.config['INGEST_MAX_BYTES']
+    if (request.content_length or 0) > max_bytes:
+        return jsonify({"error": f"Batch is larger than {max_bytes} bytes"}), 413
+    try:
+        batch = decode_batch(
+            request.get_data(), max_bytes,
+            compressed=request.headers.get('Content-Encoding', '').lower() == 'gzip'
+        )
+        samples = parse_pushed_samples(batch['samples'])
+    except OverflowError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    ip = batch['server_ip']
+    if ip == "127.0.0.1":
+        return jsonify({"error": "Agents must push under the IP their server is registered with"}), 400
+    if ip not in servers:
+        return jsonify({"error": f"Token may not push for {ip}"}), 403
+    if not Server.query.filter_by(ip_address=ip).first():
+        return jsonify({"error": "Server not found"}), 404
+
+    # An hour short of raw retention, so nothing is stored just to be expired on the next pass
+    min_ts = time.time() - tier_retention(RAW_TIER) + 3600
+    try:
+        accepted = collector.ingest(ip, samples, min_ts=min_ts)
+    except OverflowError as e:
+        return jsonify({"error": str(e)}), 503
+    if accepted:
+        coordinator.relay(ip)
+        kept = [sample['ts'] for sample in samples if sample['ts'] >= min_ts]
+        if current_app.config.get('RETENTION_ENABLED', True):
+            retention_engine.request_backfill(min(kept), max(kept))
+    log.debug("Ingested %d samples from %s", accepted, ip, extra={'server_ip': ip})
+    return jsonify({"accepted": accepted, "skipped": len(samples) - accepted})
+
 @api_bp.route("/health")
 def health_check():
     return jsonify({"status": "healthy"}), 200
 
+# Service state sampled at scrape time, next to the latency histograms
+registry.gauge('metricly_collector_leader', 'Whether this process is the one collecting (1) or mirrors it (0).',
+               lambda: int(coordinator.is_leader))
+registry.gauge('metricly_collector_servers', 'Servers registered with the collector.',
+               lambda: len(collector.get_all_latest()))
+registry.gauge('metricly_write_buffer_queued_rows', 'Rows waiting for the next write buffer flush.',
+               lambda: len(write_buffer))
+registry.gauge('metricly_write_buffer_dropped_rows_total', 'Rows dropped because the write buffer stayed full.',
+               lambda: write_buffer.dropped, kind='counter')
+registry.gauge('metricly_ring_buffer_series', 'Series held in the in-memory ring buffers.',
+               lambda: recent_samples.stats()['series'])
+registry.gauge('metricly_ring_buffer_memory_bytes', 'Memory allocated to the ring buffers.',
+               lambda: recent_samples.stats()['memory_bytes'])
+registry.gauge('metricly_stream_subscribers', 'Open live metrics streams.', broadcaster.subscriber_count)
+registry.gauge('metricly_log_streams', 'Open container log streams.', lambda: log_stream_slots.open)
+registry.gauge('metricly_alerts_active', 'Threshold alerts currently firing.', lambda: len(alert_engine.active()))
+registry.gauge('metricly_auth_cache_hits_total', 'Requests authenticated from the token cache.',
+               lambda: token_cache.hits, kind='counter')
+registry.gauge('metricly_auth_cache_misses_total', 'Requests whose token had to be verified.',
+               lambda: token_cache.misses, kind='counter')
+
+# ✅ Self-monitoring in Prometheus text format; public unless METRICS_TOKEN is set
+@api_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if not registry.enabled:
+        return jsonify({"error": "Instrumentation is disabled"}), 404
+    metrics_token = current_app.config.get('METRICS_TOKEN')
+    if metrics_token and request.headers.get('Authorization') != f"Bearer {metrics_token}":
+        return jsonify({"error": "Invalid metrics token"}), 401
+    return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @api_bp.route('/containers/<container_name>/logs', methods=['GET'])
 @token_required
 def get_container_logs(container_name):
@@ -335,12 +622,11 @@ def get_container_logs(container_name):
         server_ip = request.args.get('server')
         if not server_ip:
             return jsonify({'error': 'Missing server IP'}), 400
+        if not known_server(server_ip):
+            return jsonify({'error': 'Server not found'}), 404
 
-        # Use socket file for localhost, TCP for remote servers
-        if server_ip == "127.0.0.1":
-            client = docker.from_env()
-        else:
-            client = docker.DockerClient(base_url=f"tcp://{server_ip}:2375")
+        # Pooled client: socket file for localhost, TCP for remote servers
+        client = docker_pool.get(server_ip)
             
         container = client.containers.get(container_name)
         
@@ -355,6 +641,86 @@ def get_container_logs(container_name):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ✅ Stream container logs (protected) as Server-Sent Events, without reading the whole log.
+# ?follow=true keeps the stream open and pushes lines as they are written; otherwise at most
+# ?limit= lines are sent, then an `end` event whose cursor fetches the next page if `more`.
+# ?tail= (a line count or "all"), ?since= and ?until= (epoch or ISO) choose where to start,
+# and ?cursor= (or Last-Event-ID: the id of the last `logs` event) resumes after it.
+@api_bp.route('/containers/<container_name>/logs/stream', methods=['GET'])
+@token_required
+def stream_container_logs(container_name):
+    server_ip = request.args.get('server')
+    if not server_ip:
+        return jsonify({'error': 'Missing server IP'}), 400
+    if not known_server(server_ip):
+        return jsonify({'error': 'Server not found'}), 404
+
+    max_page = current_app.config.get('LOG_STREAM_MAX_PAGE', 5000)
+    follow = parse_bool_arg('follow')
+    cursor = request.args.get('cursor') or request.headers.get('Last-Event-ID')
+    try:
+        since = parse_time_arg('since')
+        until = parse_time_arg('until')
+        tail = request.args.get('tail', str(current_app.config.get('LOG_STREAM_DEFAULT_TAIL', 100)))
+        tail = tail if tail == 'all' else int(tail)
+        limit = min(request.args.get('limit', max_page, type=int), max_page)
+        if cursor:
+            since_for_cursor(cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        client = docker_pool.get(server_ip)
+        container_id = client.api.inspect_container(container_name)['Id']
+    except docker.errors.NotFound:
+        return jsonify({'error': 'Container not found'}), 404
+    except docker.errors.APIError as e:
+        return jsonify({'error': f'Docker API error: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if not log_stream_slots.acquire(current_app.config.get('LOG_STREAM_MAX_FOLLOWERS', 20)):
+        return jsonify({'error': 'Too many log streams open'}), 503
+
+    def open_stream(since, tail):
+        return client.api.logs(
+            container_id, stream=True, follow=follow, timestamps=True,
+            since=since, until=until, tail=tail
+        )
+
+    def is_running():
+        return client.api.inspect_container(container_id).get('State', {}).get('Running', False)
+
+    logs = LogStream(
+        open_stream, cursor=cursor, since=since, tail=tail, follow=follow, is_running=is_running,
+        limit=None if follow else limit,
+        buffer_lines=current_app.config.get('LOG_STREAM_BUFFER_LINES', 1000)
+    )
+    heartbeat = current_app.config.get('STREAM_HEARTBEAT_SECONDS', 15)
+
+    def generate():
+        # Docker is only asked for logs once the body is read, so HEAD never opens a stream
+        logs.start()
+        while not logs.finished:
+            lines = logs.next_lines(heartbeat)
+            if lines:
+                yield encode_log_event('logs', lines=lines, cursor=logs.cursor)
+            elif not logs.finished:
+                yield ": keep-alive\n\n"
+        yield encode_log_event('end', cursor=logs.cursor, more=logs.more, error=logs.error)
+
+    def close():
+        logs.close()
+        log_stream_slots.release()
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Stop nginx from buffering the stream
+    })
+    # Like the metrics stream, released when the server closes the response, read or not
+    response.call_on_close(close)
+    return response
+
 @api_bp.route('/servers/<ip>/thresholds', methods=['GET', 'POST'])
 @token_required
 def server_thresholds(ip):
@@ -366,7 +732,8 @@ def server_thresholds(ip):
                 return jsonify({
                     'cpu': 80,
                     'memory': 80,
-                    'disk': 80
+                    'disk': 80,
+                    'duration': 0
                 })
             return jsonify(thresholds.to_dict())
         
@@ -375,6 +742,11 @@ def server_thresholds(ip):
             if not data:
                 return jsonify({'error': 'No data provided'}), 400
 
+            # Seconds a threshold must stay exceeded before its alert fires
+            duration = data.get('duration', 0)
+            if not isinstance(duration, int) or duration < 0:
+                return jsonify({'error': 'duration must be a whole number of seconds, 0 or more'}), 400
+
             thresholds = Threshold.query.filter_by(server_ip=ip).first()
             if not thresholds:
                 thresholds = Threshold(server_ip=ip)
@@ -383,140 +755,115 @@ def server_thresholds(ip):
             thresholds.cpu_threshold = data.get('cpu', 80)
             thresholds.memory_threshold = data.get('memory', 80)
             thresholds.disk_threshold = data.get('disk', 80)
+            thresholds.duration_seconds = duration
 
             db.session.commit()
+            alert_engine.set_thresholds(ip, thresholds.to_dict())
             return jsonify(thresholds.to_dict())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ✅ Threshold alerts (protected): ?state=active (default, from memory), resolved or all,
+# optionally for one ?server=; resolved alerts are the ?limit= most recently started
+@api_bp.route('/alerts', methods=['GET'])
+@token_required
+def get_alerts():
+    state = request.args.get('state', 'active')
+    if state not in ('active', 'resolved', 'all'):
+        return jsonify({'error': 'Invalid state, expected one of: active, resolved, all'}), 400
+    server_ip = request.args.get('server')
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    try:
+        result = {}
+        if state in ('active', 'all'):
+            result['active'] = alert_engine.active(server_ip)
+        if state in ('resolved', 'all'):
+            result['resolved'] = alert_engine.resolved(server_ip, limit)
+        return jsonify(result)
+    except Exception as e:
+        log.exception("Error reading alerts")
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/servers/<ip>/docker/metrics', methods=['GET'])
 def get_docker_metrics_history(ip):
     try:
-        print(f"Fetching Docker metrics history for server {ip}")
         time_range = request.args.get('timeRange', '1h')
-        print(f"Time range: {time_range}")
         
-        # Convert time range to seconds
-        range_map = {
-            '1h': 3600,
-            '24h': 86400,
-            '7d': 604800
-        }
-        seconds = range_map.get(time_range, 3600)
-        
-        # Get metrics from database for each container
-        metrics = {}
+        seconds = TIME_RANGES.get(time_range, 3600)
         try:
-            containers = get_docker_metrics()
-            print(f"Found {len(containers)} containers")
-        except Exception as e:
-            print(f"Error getting Docker containers: {e}")
-            containers = []
+            mode, bucket, points = parse_downsampling(seconds)
+            since = parse_since()
+            fmt = parse_format()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        include_live = parse_bool_arg('include_live')
         
-        for container in containers:
+        if not known_server(ip):
+            return jsonify({"error": "Server not found"}), 404
+
+        start_ts = int(time.time()) - seconds
+        if since is not None:
+            start_ts = max(start_ts, since // bucket * bucket if bucket else since)
+
+        # Status comes from the collector's last Docker snapshot of this server's engine;
+        # it is read as-is and never refreshed here
+        docker_cache = find_docker_metrics(ip)
+        snapshot = docker_cache.peek() if docker_cache is not None else None
+        current = {container.get('name'): container for container in snapshot or []}
+
+        # Containers are every series in the store plus anything running that has no samples yet
+        names = set(container_names(ip, seconds, bucket)) | set(current)
+
+        metrics = {}
+        for container_name in sorted(names):
             try:
-                container_name = container.get('name')
-                print(f"\nProcessing container: {container_name}")
-                
-                container_metrics = Metric.query.filter(
-                    Metric.metric_name == f"docker_{container_name}",
-                    Metric.server_ip == ip,
-                    Metric.timestamp >= datetime.now() - timedelta(seconds=seconds)
-                ).order_by(Metric.timestamp.asc()).all()
-                
-                print(f"Found {len(container_metrics)} historical metrics for {container_name}")
-                
-                # Parse memory usage and limit
-                memory_usage = container.get('memory_usage', '0 MB')
-                memory_limit = container.get('memory_limit', '0 MB')
-                print(f"Current memory usage: {memory_usage}, limit: {memory_limit}")
-                
-                # Convert memory strings to MB
-                def parse_memory(mem_str):
-                    try:
-                        if not mem_str or mem_str == '0 MB':
-                            return 0
-                        parts = mem_str.split(' ')
-                        if len(parts) != 2:
-                            print(f"Invalid memory string format: {mem_str}")
-                            return 0
-                        value = float(parts[0])
-                        unit = parts[1].upper()
-                        if unit == 'B':
-                            return value / (1024 * 1024)
-                        elif unit == 'KB':
-                            return value / 1024
-                        elif unit == 'GB':
-                            return value * 1024
-                        elif unit == 'TB':
-                            return value * 1024 * 1024
-                        return value  # Already in MB
-                    except Exception as e:
-                        print(f"Error parsing memory string {mem_str}: {e}")
-                        return 0
-                
-                memory_used_mb = parse_memory(memory_usage)
-                memory_limit_mb = parse_memory(memory_limit)
-                print(f"Parsed memory - used: {memory_used_mb}MB, limit: {memory_limit_mb}MB")
-                
+                container_metrics = query_container_history(
+                    ip, container_name, start_ts, seconds, mode=mode, bucket=bucket, points=points
+                )
+                container = current.get(container_name)
+                if not container_metrics and container is None:
+                    continue  # Nothing in this window for a container that no longer runs
+
                 # Get container status and health information
-                container_status = container.get('status', 'unknown')
-                is_running = container_status == 'running'
-                restart_count = container.get('restart_count', 0)
-                exit_code = container.get('exit_code', 0)
-                
-                # Add current metrics to the list
-                current_metrics = {
-                    'timestamp': datetime.now().isoformat(),
-                    'cpu_percent': float(container.get('cpu_percent', 0)),
-                    'memory_used': memory_used_mb,
-                    'memory_limit': memory_limit_mb,
+                container_status = container.get('status', 'unknown') if container else 'unknown'
+                status = {
                     'status': container_status,
-                    'is_running': is_running,
-                    'restart_count': restart_count,
-                    'exit_code': exit_code
+                    'is_running': container_status == 'running',
+                    'restart_count': container.get('restart_count', 0) if container else 0,
+                    'exit_code': container.get('exit_code', 0) if container else 0
                 }
-                print(f"Current metrics for {container_name}:", current_metrics)
-                
+
                 # Add historical metrics
-                historical_metrics = [{
-                    'timestamp': m.timestamp.isoformat(),
-                    'cpu_percent': float(m.metric_value or 0),
-                    'memory_used': float(m.memory_percent or 0),
-                    'memory_limit': memory_limit_mb,  # Use current limit for historical data
-                    'status': container_status,
-                    'is_running': is_running,
-                    'restart_count': restart_count,
-                    'exit_code': exit_code
-                } for m in container_metrics]
-                
-                metrics[container_name] = historical_metrics + [current_metrics]
-                
-                # Store current metrics in database
-                new_metric = Metric(
-                    metric_name=f"docker_{container_name}",
-                    metric_value=float(container.get('cpu_percent', 0)),
-                    memory_percent=memory_used_mb,  # Store as MB
-                    timestamp=datetime.now(),
-                    server_ip=ip
-                )
-                db.session.add(new_metric)
-                print(f"Added new metric for {container_name} to database")
+                history = [{
+                    'timestamp': format_ts(ts),
+                    'cpu_percent': cpu_percent,
+                    'memory_used': memory_used,
+                    'memory_limit': memory_limit,
+                    **status,
+                    **(extremes[0] if extremes else {})
+                } for ts, cpu_percent, memory_used, memory_limit, *extremes in container_metrics]
+
+                # ?include_live=true appends the snapshot's values as the newest point
+                if include_live and container is not None and docker_cache.snapshot_ts:
+                    live_ts = format_ts(docker_cache.snapshot_ts)
+                    if not history or live_ts > history[-1]['timestamp']:
+                        history.append({
+                            'timestamp': live_ts,
+                            'cpu_percent': float(container.get('cpu_percent', 0)),
+                            'memory_used': container.get('memory_usage_bytes', 0) / BYTES_PER_MB,
+                            'memory_limit': container.get('memory_limit_bytes', 0) / BYTES_PER_MB,
+                            **status
+                        })
+
+                metrics[container_name] = history
             except Exception as e:
-                print(f"Error processing container {container.get('name', 'unknown')}: {e}")
+                log.warning("Error processing container %s: %s", container_name, e, extra={'server_ip': ip})
                 continue
         
-        try:
-            db.session.commit()
-            print("Successfully committed metrics to database")
-        except Exception as e:
-            db.session.rollback()
-            print(f"Error storing Docker metrics: {e}")
-        
-        print(f"Returning metrics for {len(metrics)} containers")
-        return jsonify(metrics)
+        log.debug("Docker history for %s: %d containers over %s", ip, len(metrics), time_range)
+        return history_response(metrics, fmt)
     except Exception as e:
-        print(f"Error in get_docker_metrics_history: {e}")
+        log.exception("Error in get_docker_metrics_history")
         return jsonify({"error": str(e)}), 500
 
 @api_bp.route('/change-password', methods=['POST'])
@@ -528,10 +875,8 @@ def change_password():
         return jsonify({"error": "Missing old or new password"}), 400
 
     try:
-        # Get current user from token
-        token = request.headers.get("Authorization").split("Bearer ")[-1]
-        user_data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        current_user = User.query.filter_by(username=user_data["username"]).first()
+        # Current user as authenticated by token_required
+        current_user = db.session.get(User, g.current_user.id)
 
         if not current_user:
             return jsonify({"error": "User not found"}), 404
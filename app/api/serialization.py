@@ -0,0 +1,97 @@
+import gzip
+
+from flask import Response, jsonify
+
+try:
+    import msgpack
+except ImportError:  # Optional: only needed for ?format=msgpack
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Optional: responses fall back to gzip without it
+    brotli = None
+
+RESPONSE_FORMATS = ('json', 'columnar', 'msgpack')
+
+
+def flatten(point, prefix=''):
+    """Flatten nested dicts into one level with dotted keys, e.g. ``memory_info.percent``."""
+    flat = {}
+    for key, value in point.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def to_columns(points):
+    """Turn a list of point dicts into parallel arrays keyed by dotted column name.
+
+    Every column has one entry per point; points that lack a column get None there.
+    """
+    columns = {}
+    for i, point in enumerate(points):
+        for key, value in flatten(point).items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * len(points)
+            column[i] = value
+    return columns
+
+
+def columnar(data):
+    """Columnar form of a history payload: a list of points, or a dict of lists (per container)."""
+    if isinstance(data, dict):
+        return {name: to_columns(points) for name, points in data.items()}
+    return to_columns(data)
+
+
+def check_format(fmt):
+    """Return ``fmt`` if it can be rendered here, else raise ValueError."""
+    if fmt not in RESPONSE_FORMATS:
+        raise ValueError(f"Invalid format, expected one of: {', '.join(RESPONSE_FORMATS)}")
+    if fmt == 'msgpack' and msgpack is None:
+        raise ValueError("format=msgpack needs the msgpack package installed on the server")
+    return fmt
+
+
+def render(data, fmt='json'):
+    """Serialize a history payload as row JSON, columnar JSON or columnar MessagePack."""
+    check_format(fmt)
+    if fmt == 'json':
+        return jsonify(data)
+    if fmt == 'columnar':
+        return jsonify(columnar(data))
+    return Response(msgpack.packb(columnar(data)), mimetype='application/x-msgpack')
+
+
+def compress_response(response, accept_encodings, min_size=500, level=6):
+    """Compress ``response`` in place with brotli or gzip, whichever the client prefers.
+
+    Streamed, already-encoded and small responses are left alone. A strong ETag is made
+    weak, since the encoded bytes differ from the ones it was computed over.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 304)):
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    if brotli is not None and accept_encodings['br'] and accept_encodings['br'] >= accept_encodings['gzip']:
+        encoding, body = 'br', brotli.compress(data, quality=min(level, 11))
+    elif accept_encodings['gzip']:
+        encoding, body = 'gzip', gzip.compress(data, compresslevel=min(level, 9))
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
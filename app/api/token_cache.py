@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.models.database import User
+
+# The authenticated user as seen by protected routes (flask.g.current_user)
+Principal = namedtuple('Principal', ['id', 'username', 'role'])
+
+
+class _Entry:
+    __slots__ = ('principal', 'expires_at')
+
+    def __init__(self, principal, expires_at):
+        self.principal = principal
+        self.expires_at = expires_at
+
+
+class TokenCache:
+    """LRU cache of verified bearer tokens, so repeat requests skip the JWT decode and user lookup.
+
+    Entries are keyed by a SHA-256 of the token, so raw tokens are never kept, and expire
+    after ``ttl`` seconds or when the token itself expires, whichever comes first. At most
+    ``max_size`` tokens are cached; the least recently used is evicted first. A user's
+    entries are dropped once a transaction that changes their password or username or
+    deletes them commits, so a request racing the change can't cache them again.
+
+    Only this process's cache is invalidated: other worker processes keep accepting a
+    deleted or renamed user's tokens until their entries expire, so ``ttl`` is the
+    revocation window.
+    """
+
+    def __init__(self, max_size=1024, ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # token hash -> _Entry
+        self._by_user = {}  # username -> set of token hashes
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_size = app.config.get('AUTH_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('AUTH_CACHE_TTL', self.ttl)
+        app.extensions['token_cache'] = self
+        if not event.contains(User, 'after_update', self._user_updated):
+            event.listen(User, 'after_update', self._user_updated)
+            event.listen(User, 'after_delete', self._user_deleted)
+            event.listen(Session, 'after_commit', self._session_committed)
+            event.listen(Session, 'after_soft_rollback', self._session_rolled_back)
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        """The cached ``Principal`` for ``token``, or None if it has to be verified."""
+        if self.max_size <= 0:
+            return None
+        key = self.key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.principal
+
+    def put(self, token, principal, token_exp=None):
+        """Cache a verified token; ``token_exp`` is its ``exp`` claim in epoch seconds."""
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        key = self.key(token)
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(principal, expires_at)
+            self._by_user.setdefault(principal.username, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, username):
+        """Forget every cached token of a user, e.g. after a password change or deletion."""
+        with self._lock:
+            for key in list(self._by_user.get(username, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+    # Users changed in a flush are invalidated when its transaction commits, not at the flush
+    def _user_updated(self, mapper, connection, target):
+        state = inspect(target)
+        username = state.attrs.username.history
+        if state.attrs.password.history.has_changes() or username.has_changes():
+            self._pending(target).update([target.username, *(username.deleted or ())])
+
+    def _user_deleted(self, mapper, connection, target):
+        self._pending(target).add(target.username)
+
+    @staticmethod
+    def _pending(target):
+        return object_session(target).info.setdefault('token_cache_invalidate', set())
+
+    def _session_committed(self, session):
+        for username in session.info.pop('token_cache_invalidate', ()):
+            self.invalidate_user(username)
+
+    def _session_rolled_back(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop('token_cache_invalidate', None)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry.principal.username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry.principal.username]
+
+
+token_cache = TokenCache()
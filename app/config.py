@@ -5,7 +5,177 @@ from pathlib import Path
 basedir = Path(__file__).resolve().parent.parent / 'instance'
 basedir.mkdir(exist_ok=True)  # Create instance directory if it doesn't exist
 
+def in_memory(url):
+    """Whether ``url`` is an in-memory SQLite database, private to the engine that opens it."""
+    return url.startswith('sqlite') and (url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in url)
+
+def engine_options(url):
+    """Pool settings for ``url``.
+
+    In-memory SQLite gets a single shared connection (StaticPool), which takes no pool
+    size, overflow or timeout, so only file-backed and server databases get those.
+    """
+    options = {'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'false').lower() == 'true'}
+    if not in_memory(url):
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', 10)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        )
+    return options
+
+def agent_tokens(value):
+    """Parse AGENT_TOKENS, ``token=ip|ip,token=ip``, into a dict of token -> IPs it may push for."""
+    tokens = {}
+    for entry in value.split(','):
+        token, _, ips = entry.strip().partition('=')
+        if token:
+            tokens[token] = frozenset(ip.strip() for ip in ips.split('|') if ip.strip())
+    return tokens
+
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f'sqlite:///{basedir}/metricly.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool settings, used by the main engine and the history bind alike.
+    # History reads go through a separate query-only bind (DATABASE_READ_URL, the main
+    # database by default) so they never hold connections the writers are waiting on.
+    # An in-memory database exists only inside the engine that opened it, so a second
+    # engine would read an empty one; with an in-memory URL history reads use the main engine
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    DATABASE_READ_URL = os.getenv('DATABASE_READ_URL', SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = {} if in_memory(DATABASE_READ_URL) else {
+        'history': {'url': DATABASE_READ_URL, **engine_options(DATABASE_READ_URL)},
+    }
+
+    # SQLite PRAGMAs applied on connect: WAL lets readers run alongside the writer,
+    # synchronous=NORMAL is durable in WAL mode, and busy_timeout waits out lock contention
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev')
+
+    # Background collection: each server is sampled every COLLECTION_INTERVAL seconds,
+    # offset by up to COLLECTION_JITTER seconds so servers don't sample in lockstep
+    COLLECTOR_ENABLED = os.getenv('COLLECTOR_ENABLED', 'true').lower() == 'true'
+    COLLECTION_INTERVAL = float(os.getenv('COLLECTION_INTERVAL', 5))
+    COLLECTION_JITTER = float(os.getenv('COLLECTION_JITTER', 0.5))
+    # Maximum number of servers sampled at once; also sizes the keep-alive connection pool
+    COLLECTION_CONCURRENCY = int(os.getenv('COLLECTION_CONCURRENCY', 20))
+    REMOTE_CONNECT_TIMEOUT = float(os.getenv('REMOTE_CONNECT_TIMEOUT', 2))
+    REMOTE_READ_TIMEOUT = float(os.getenv('REMOTE_READ_TIMEOUT', 5))
+
+    # Only one process collects, however many serve the API (e.g. gunicorn workers): the one
+    # holding a lock on COLLECTOR_LOCK_FILE. The others mirror the snapshots it publishes every
+    # SNAPSHOT_RELAY_INTERVAL seconds and take over if it exits. COLLECTOR_ROLE=follower never
+    # collects, for web workers next to a `flask collect` sidecar
+    COLLECTOR_ROLE = os.getenv('COLLECTOR_ROLE', 'auto').lower()
+    COLLECTOR_LOCK_FILE = os.getenv('COLLECTOR_LOCK_FILE', str(basedir / 'collector.lock'))
+    SNAPSHOT_RELAY_INTERVAL = float(os.getenv('SNAPSHOT_RELAY_INTERVAL', 5))
+
+    # Agents (python -m app.agent) push samples to /api/ingest with one of the comma-separated
+    # AGENT_TOKENS, each followed by the IPs it may push for: token=10.0.0.5|10.0.0.6. A token
+    # listed without IPs is refused for every server; ingestion is off while none are set.
+    # A batch may be at most INGEST_MAX_BYTES once decompressed. A server that pushed within
+    # AGENT_PUSH_TIMEOUT seconds is not pulled
+    AGENT_TOKENS = agent_tokens(os.getenv('AGENT_TOKENS', ''))
+    INGEST_MAX_BYTES = int(os.getenv('INGEST_MAX_BYTES', 16 * 1024 * 1024))
+    AGENT_PUSH_TIMEOUT = float(os.getenv('AGENT_PUSH_TIMEOUT', 60))
+
+    # Live stream (/api/stream/metrics): a keep-alive comment is sent after
+    # STREAM_HEARTBEAT_SECONDS without samples; at most STREAM_MAX_SUBSCRIBERS streams are open
+    STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+    STREAM_MAX_SUBSCRIBERS = int(os.getenv('STREAM_MAX_SUBSCRIBERS', 100))
+
+    # API responses of at least COMPRESSION_MIN_SIZE bytes are brotli (if installed) or gzip encoded
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 500))
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+
+    # The last RING_BUFFER_SECONDS of raw samples are kept in memory per series and serve
+    # recent history without touching SQLite; at most RING_BUFFER_MAX_SERIES series are buffered
+    RING_BUFFER_SECONDS = int(os.getenv('RING_BUFFER_SECONDS', 3900))
+    RING_BUFFER_MAX_SERIES = int(os.getenv('RING_BUFFER_MAX_SERIES', 1000))
+
+    # Seconds to block measuring CPU usage; unset uses the non-blocking delta sampler
+    CPU_SAMPLE_INTERVAL = float(os.getenv('CPU_SAMPLE_INTERVAL', 0)) or None
+
+    # Docker container metrics are served from a snapshot refreshed every DOCKER_METRICS_TTL
+    # seconds, with up to DOCKER_STATS_CONCURRENCY containers' stats fetched at once
+    DOCKER_METRICS_TTL = float(os.getenv('DOCKER_METRICS_TTL', 5))
+    DOCKER_STATS_CONCURRENCY = int(os.getenv('DOCKER_STATS_CONCURRENCY', 16))
+
+    # Docker clients are pooled per server and reused. Remote engines are reached on
+    # tcp://<ip>:DOCKER_REMOTE_PORT; set DOCKER_REMOTE_METRICS to collect their containers too.
+    # A client is pinged every DOCKER_HEALTH_CHECK_INTERVAL seconds it is in use and
+    # closed after DOCKER_CLIENT_IDLE_TIMEOUT seconds unused
+    DOCKER_REMOTE_PORT = int(os.getenv('DOCKER_REMOTE_PORT', 2375))
+    DOCKER_REMOTE_METRICS = os.getenv('DOCKER_REMOTE_METRICS', 'false').lower() == 'true'
+    DOCKER_CLIENT_TIMEOUT = int(os.getenv('DOCKER_CLIENT_TIMEOUT', 10))
+    DOCKER_CLIENT_POOL_SIZE = int(os.getenv('DOCKER_CLIENT_POOL_SIZE', 10))
+    DOCKER_CLIENT_IDLE_TIMEOUT = float(os.getenv('DOCKER_CLIENT_IDLE_TIMEOUT', 300))
+    DOCKER_HEALTH_CHECK_INTERVAL = float(os.getenv('DOCKER_HEALTH_CHECK_INTERVAL', 30))
+
+    # Container log streams (/api/containers/<name>/logs/stream) start from the last
+    # LOG_STREAM_DEFAULT_TAIL lines, return at most LOG_STREAM_MAX_PAGE lines per page when
+    # not following, and queue up to LOG_STREAM_BUFFER_LINES lines for a slow client.
+    # At most LOG_STREAM_MAX_FOLLOWERS streams are open at once
+    LOG_STREAM_DEFAULT_TAIL = int(os.getenv('LOG_STREAM_DEFAULT_TAIL', 100))
+    LOG_STREAM_MAX_PAGE = int(os.getenv('LOG_STREAM_MAX_PAGE', 5000))
+    LOG_STREAM_BUFFER_LINES = int(os.getenv('LOG_STREAM_BUFFER_LINES', 1000))
+    LOG_STREAM_MAX_FOLLOWERS = int(os.getenv('LOG_STREAM_MAX_FOLLOWERS', 20))
+
+    # Thresholds are checked against every ingested system sample from an in-memory copy
+    # that is reloaded every ALERT_THRESHOLD_REFRESH seconds (and on every change via the API)
+    ALERT_THRESHOLD_REFRESH = float(os.getenv('ALERT_THRESHOLD_REFRESH', 60))
+
+    # Verified bearer tokens are cached for up to AUTH_CACHE_TTL seconds (never past their
+    # expiry), at most AUTH_CACHE_SIZE of them; set either to 0 to verify every request.
+    # Each worker has its own cache and only drops a user's tokens when it made the change
+    # itself, so with several workers AUTH_CACHE_TTL is how long the tokens of a deleted or
+    # renamed user keep working on the others
+    AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 1024))
+    AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', 60))
+
+    # Bind mount sizes are recomputed in the background once older than VOLUME_SIZE_TTL;
+    # with the mtime check only changed directories are re-listed between full rescans
+    VOLUME_SIZE_TTL = float(os.getenv('VOLUME_SIZE_TTL', 60))
+    VOLUME_SIZE_FULL_RESCAN = float(os.getenv('VOLUME_SIZE_FULL_RESCAN', 3600))
+    VOLUME_SIZE_MTIME_CHECK = os.getenv('VOLUME_SIZE_MTIME_CHECK', 'true').lower() == 'true'
+
+    # Raw samples are rolled up into 1m/15m/1h tiers every RETENTION_INTERVAL seconds and
+    # each tier is expired after its retention (in hours, 0 keeps it forever). History
+    # queries read from the coarsest tier that still covers the requested range at the
+    # requested bucket, or at range / HISTORY_MAX_POINTS seconds when none is given
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'true').lower() == 'true'
+    RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', 60))
+    ROLLUP_GRACE_SECONDS = int(os.getenv('ROLLUP_GRACE_SECONDS', 60))
+    RAW_RETENTION_HOURS = float(os.getenv('RAW_RETENTION_HOURS', 48))
+    ROLLUP_1M_RETENTION_HOURS = float(os.getenv('ROLLUP_1M_RETENTION_HOURS', 8 * 24))
+    ROLLUP_15M_RETENTION_HOURS = float(os.getenv('ROLLUP_15M_RETENTION_HOURS', 90 * 24))
+    ROLLUP_1H_RETENTION_HOURS = float(os.getenv('ROLLUP_1H_RETENTION_HOURS', 2 * 365 * 24))
+    HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', 1000))
+
+    # Samples are written in batches: a flush happens once WRITE_BUFFER_FLUSH_ROWS rows are
+    # queued or every WRITE_BUFFER_FLUSH_INTERVAL seconds. At WRITE_BUFFER_CAPACITY rows,
+    # producers wait up to WRITE_BUFFER_PUT_TIMEOUT seconds before their rows are dropped.
+    WRITE_BUFFER_FLUSH_ROWS = int(os.getenv('WRITE_BUFFER_FLUSH_ROWS', 500))
+    WRITE_BUFFER_FLUSH_INTERVAL = float(os.getenv('WRITE_BUFFER_FLUSH_INTERVAL', 2))
+    WRITE_BUFFER_CAPACITY = int(os.getenv('WRITE_BUFFER_CAPACITY', 20000))
+    WRITE_BUFFER_PUT_TIMEOUT = float(os.getenv('WRITE_BUFFER_PUT_TIMEOUT', 1))
+
+    # Self-monitoring: request, collection-phase and SQL latency histograms served at
+    # /api/metrics in Prometheus text format. Set METRICS_TOKEN to require it as a bearer token
+    INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
+    # Logging: LOG_LEVEL and LOG_FORMAT (text or json). DEBUG records are kept with
+    # probability LOG_DEBUG_SAMPLE_RATE, and each message is logged at most
+    # LOG_RATE_LIMIT_BURST times per LOG_RATE_LIMIT_WINDOW seconds (0 turns the limit off)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 1))
+    LOG_RATE_LIMIT_BURST = int(os.getenv('LOG_RATE_LIMIT_BURST', 10))
+    LOG_RATE_LIMIT_WINDOW = float(os.getenv('LOG_RATE_LIMIT_WINDOW', 60))
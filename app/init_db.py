@@ -33,18 +33,103 @@ def init_db():
         ip_address TEXT NOT NULL UNIQUE
     );
     
-    CREATE TABLE metric (
-        m_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    CREATE TABLE metric_sample (
+        server_ip TEXT NOT NULL,
         metric_name TEXT NOT NULL,
-        metric_value REAL NOT NULL,
+        ts INTEGER NOT NULL,
+        cpu_percent REAL NOT NULL,
         memory_percent REAL,
+        memory_used REAL,
+        memory_total REAL,
+        memory_available REAL,
+        memory_free REAL,
         disk_percent REAL,
-        memory_info JSON,
-        disk_usage JSON,
-        timestamp DATETIME NOT NULL,
+        PRIMARY KEY (server_ip, metric_name, ts)
+    ) WITHOUT ROWID;
+    
+    CREATE INDEX ix_metric_sample_ts ON metric_sample (ts);
+    
+    CREATE TABLE disk_sample (
         server_ip TEXT NOT NULL,
-        FOREIGN KEY(server_ip) REFERENCES server(ip_address)
-    );
+        ts INTEGER NOT NULL,
+        mount TEXT NOT NULL,
+        total REAL NOT NULL,
+        used REAL NOT NULL,
+        free REAL NOT NULL,
+        percent REAL NOT NULL,
+        PRIMARY KEY (server_ip, ts, mount)
+    ) WITHOUT ROWID;
+    
+    CREATE INDEX ix_disk_sample_ts ON disk_sample (ts);
+    
+    CREATE TABLE metric_rollup_1m (
+        server_ip TEXT NOT NULL,
+        metric_name TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        cpu_min REAL NOT NULL,
+        cpu_avg REAL NOT NULL,
+        cpu_max REAL NOT NULL,
+        memory_min REAL,
+        memory_avg REAL,
+        memory_max REAL,
+        memory_used_min REAL,
+        memory_used_avg REAL,
+        memory_used_max REAL,
+        memory_total REAL,
+        disk_min REAL,
+        disk_avg REAL,
+        disk_max REAL,
+        PRIMARY KEY (server_ip, metric_name, ts)
+    ) WITHOUT ROWID;
+    
+    CREATE INDEX ix_metric_rollup_1m_ts ON metric_rollup_1m (ts);
+    
+    CREATE TABLE metric_rollup_15m (
+        server_ip TEXT NOT NULL,
+        metric_name TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        cpu_min REAL NOT NULL,
+        cpu_avg REAL NOT NULL,
+        cpu_max REAL NOT NULL,
+        memory_min REAL,
+        memory_avg REAL,
+        memory_max REAL,
+        memory_used_min REAL,
+        memory_used_avg REAL,
+        memory_used_max REAL,
+        memory_total REAL,
+        disk_min REAL,
+        disk_avg REAL,
+        disk_max REAL,
+        PRIMARY KEY (server_ip, metric_name, ts)
+    ) WITHOUT ROWID;
+    
+    CREATE INDEX ix_metric_rollup_15m_ts ON metric_rollup_15m (ts);
+    
+    CREATE TABLE metric_rollup_1h (
+        server_ip TEXT NOT NULL,
+        metric_name TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        cpu_min REAL NOT NULL,
+        cpu_avg REAL NOT NULL,
+        cpu_max REAL NOT NULL,
+        memory_min REAL,
+        memory_avg REAL,
+        memory_max REAL,
+        memory_used_min REAL,
+        memory_used_avg REAL,
+        memory_used_max REAL,
+        memory_total REAL,
+        disk_min REAL,
+        disk_avg REAL,
+        disk_max REAL,
+        PRIMARY KEY (server_ip, metric_name, ts)
+    ) WITHOUT ROWID;
+    
+    CREATE INDEX ix_metric_rollup_1h_ts ON metric_rollup_1h (ts);
     
     CREATE TABLE thresholds (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,9 +137,42 @@ def init_db():
         cpu_threshold REAL DEFAULT 80,
         memory_threshold REAL DEFAULT 80,
         disk_threshold REAL DEFAULT 80,
+        duration_seconds INTEGER NOT NULL DEFAULT 0,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
     );
+    
+    CREATE TABLE alert (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        server_ip TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        duration_seconds INTEGER NOT NULL DEFAULT 0,
+        value REAL NOT NULL,
+        peak REAL NOT NULL,
+        started_at INTEGER NOT NULL,
+        fired_at INTEGER NOT NULL,
+        resolved_at INTEGER
+    );
+    
+    CREATE INDEX ix_alert_server_ip_started_at ON alert (server_ip, started_at);
+    CREATE INDEX ix_alert_started_at ON alert (started_at);
+    
+    CREATE TABLE server_snapshot (
+        server_ip TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        data TEXT,
+        error TEXT,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (server_ip, kind)
+    );
+    
+    CREATE TABLE rollup_backfill (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        start_ts INTEGER NOT NULL,
+        end_ts INTEGER NOT NULL,
+        requested_at INTEGER NOT NULL
+    );
     """)
     
     # Create admin user
@@ -0,0 +1,219 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+
+# Latency buckets in seconds, from a sub-millisecond SQL query to a slow remote fetch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative latency histogram per label set, rendered in Prometheus text format.
+
+    Each label set keeps one count per bucket plus a sum and a count, so an observation
+    is a bisect and three additions under a lock.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = _labels(self.labels, label_values, [f'le="{_number(bound)}"'])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            le = _labels(self.labels, label_values, ['le="+Inf"'])
+            lines.append(f'{self.name}_bucket{le} {values[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, label_values)} {_number(values[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.labels, label_values)} {values[-1]}')
+        return lines
+
+
+class Gauge:
+    """Value read from ``read()`` at scrape time: a number, or a dict of label value tuples to numbers."""
+
+    def __init__(self, name, help, read, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        try:
+            value = self.read()
+        except Exception:
+            return lines
+        values = value if isinstance(value, dict) else {(): value}
+        for label_values, number in sorted(values.items()):
+            if number is not None:
+                lines.append(f'{self.name}{_labels(self.labels, label_values)} {_number(number)}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label_values', 'started')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+_DISABLED = nullcontext()
+
+
+class Registry:
+    """Every instrument of the process; ``render`` produces the Prometheus exposition text.
+
+    While ``enabled`` is off, timers don't read the clock and nothing is recorded.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._metrics = {}
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, read, labels=(), kind='gauge'):
+        """Register (or replace) a metric read at scrape time; ``kind='counter'`` for running totals."""
+        metric = self._metrics[name] = Gauge(name, help, read, labels, kind)
+        return metric
+
+    def timer(self, histogram, *label_values):
+        """Context manager that observes its block's duration; a shared no-op while disabled."""
+        return _Timer(histogram, label_values) if self.enabled else _DISABLED
+
+    def render(self):
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'metricly_http_request_duration_seconds',
+    'Time to produce an API response (until the body starts for streams).',
+    labels=('method', 'route', 'status'),
+)
+phase_duration = registry.histogram(
+    'metricly_collector_phase_duration_seconds',
+    'Time spent in each collection phase.',
+    labels=('phase',),
+)
+sql_duration = registry.histogram(
+    'metricly_sql_query_duration_seconds',
+    'Time to execute a SQL statement, by statement type and database bind.',
+    labels=('operation', 'bind'),
+)
+
+
+def phase(name):
+    """Time a collection phase, e.g. ``with phase('docker_stats'): ...``."""
+    return registry.timer(phase_duration, name)
+
+
+def _statement_operation(statement):
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    return word if word in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'PRAGMA') else 'OTHER'
+
+
+def _instrument_engine(engine, bind):
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_started')
+        if started:
+            sql_duration.observe(time.perf_counter() - started.pop(), _statement_operation(statement), bind)
+
+    def failed(context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    event.listen(engine, 'before_cursor_execute', before)
+    event.listen(engine, 'after_cursor_execute', after)
+    event.listen(engine, 'handle_error', failed)
+
+
+def init_app(app, db):
+    """Time every request and SQL statement, unless INSTRUMENTATION_ENABLED is off.
+
+    Flask and SQLAlchemy are only imported here, so collection code can use ``phase``
+    without them.
+    """
+    from flask import g, request
+
+    registry.enabled = app.config.get('INSTRUMENTATION_ENABLED', True)
+    app.extensions['instrumentation'] = registry
+    if not registry.enabled:
+        return
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            request_duration.observe(
+                time.perf_counter() - started, request.method, route, str(response.status_code)
+            )
+        return response
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            _instrument_engine(engine, key or 'default')
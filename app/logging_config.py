@@ -0,0 +1,104 @@
+import json
+import logging
+import random
+import sys
+import threading
+import time
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any ``extra=`` fields."""
+
+    converter = time.gmtime
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain ``time level logger: message key=value ...`` lines for a terminal."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = [
+            f'{key}={value}' for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_')
+        ]
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps repetitive logging cheap and readable.
+
+    DEBUG records are kept with probability ``debug_sample_rate``. Every other message
+    (keyed by logger and format string, not the formatted text) is let through at most
+    ``burst`` times per ``window`` seconds; the next record let through after a quiet
+    spell carries a ``suppressed`` count of what was dropped.
+    """
+
+    def __init__(self, debug_sample_rate=1.0, burst=10, window=60.0):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+        self.burst = burst
+        self.window = window
+        self._windows = {}  # (logger, msg) -> [window start, records passed, records dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1.0:
+            return random.random() < self.debug_sample_rate
+        if self.burst <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state is not None else 0
+                if len(self._windows) > 10000:
+                    self._windows.clear()  # Don't let one-off messages pile up forever
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+def configure_logging(app):
+    """Route the ``app`` loggers to stderr at LOG_LEVEL, as LOG_FORMAT (text or json) lines."""
+    logger = logging.getLogger('app')
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO').upper())
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if app.config.get('LOG_FORMAT', 'text') == 'json' else TextFormatter())
+    handler.addFilter(SamplingFilter(
+        debug_sample_rate=app.config.get('LOG_DEBUG_SAMPLE_RATE', 1.0),
+        burst=app.config.get('LOG_RATE_LIMIT_BURST', 10),
+        window=app.config.get('LOG_RATE_LIMIT_WINDOW', 60.0),
+    ))
+    logger.addHandler(handler)
+    logger.propagate = False
@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import select, update
+
+from app.models.database import Alert, Threshold, db
+from app.models.sqlite_tuning import read
+from app.models.timeseries import format_ts
+
+log = logging.getLogger(__name__)
+
+# Threshold name -> metric_sample column it is checked against
+ALERT_METRICS = {'cpu': 'cpu_percent', 'memory': 'memory_percent', 'disk': 'disk_percent'}
+
+# Thresholds applied to servers that have none saved, as the thresholds endpoint reports them
+DEFAULT_THRESHOLDS = {'cpu': 80, 'memory': 80, 'disk': 80, 'duration': 0}
+
+Rule = namedtuple('Rule', ['cpu', 'memory', 'disk', 'duration'])
+
+
+def rule_from(thresholds):
+    """``Rule`` from a thresholds dict as returned by ``Threshold.to_dict``; missing values use the defaults."""
+    return Rule(*(
+        default if thresholds.get(name) is None else thresholds[name]
+        for name, default in DEFAULT_THRESHOLDS.items()
+    ))
+
+
+class _Breach:
+    """Rolling state of one (server, metric): when the current breach began and its alert, if fired."""
+
+    __slots__ = ('since', 'alert')
+
+    def __init__(self, since, alert=None):
+        self.since = since
+        self.alert = alert
+
+
+class AlertEngine:
+    """Evaluates each server's thresholds against its system samples as they are ingested.
+
+    Thresholds are loaded for every server in one query and cached; the cache is reloaded
+    every ``refresh_interval`` seconds and updated directly when thresholds change through
+    the API, so no sample triggers a query. Each (server, metric) only remembers when its
+    current breach began, which makes "CPU > 80 for 2m" a constant-time check per sample
+    whatever the duration. An alert fires once a breach has lasted the duration and
+    resolves on the first sample back at or under the threshold; only these transitions
+    are written to the alert table.
+
+    Samples pushed by agents can arrive late or out of order (see /api/ingest); a sample no
+    newer than the last one evaluated for its server is skipped.
+
+    Only the collecting process evaluates; the others read active alerts from the table.
+    """
+
+    def __init__(self, refresh_interval=60.0):
+        self.refresh_interval = refresh_interval
+        self.evaluating = True
+        self._app = None
+        self._rules = None  # server ip -> Rule, None until first loaded
+        self._loaded_at = 0.0
+        self._alerts_loaded = False
+        self._breaches = {}  # (server ip, metric) -> _Breach
+        self._evaluated_ts = {}  # server ip -> ts of the newest sample evaluated
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.refresh_interval = app.config.get('ALERT_THRESHOLD_REFRESH', self.refresh_interval)
+        app.extensions['alert_engine'] = self
+
+    def evaluate(self, sample):
+        """Check one metric_sample row dict (as built by ``system_sample_rows``) against its thresholds."""
+        if sample.get('metric_name') != 'system':
+            return
+        ip, ts = sample['server_ip'], sample['ts']
+        rule = self._rule(ip)
+        transitions = []
+        with self._lock:
+            if ts <= self._evaluated_ts.get(ip, float('-inf')):
+                return
+            self._evaluated_ts[ip] = ts
+            for metric, column in ALERT_METRICS.items():
+                value = sample.get(column)
+                if value is None:
+                    continue
+                key = (ip, metric)
+                breach = self._breaches.get(key)
+                limit = getattr(rule, metric)
+                if value > limit:
+                    if breach is None:
+                        breach = self._breaches[key] = _Breach(ts)
+                    if breach.alert is not None:
+                        breach.alert['peak'] = max(breach.alert['peak'], value)
+                    elif ts - breach.since >= rule.duration:
+                        breach.alert = {
+                            'id': None, 'server_ip': ip, 'metric': metric, 'threshold': limit,
+                            'duration': rule.duration, 'value': value, 'peak': value,
+                            'started_at': breach.since, 'fired_at': ts, 'resolved_at': None,
+                        }
+                        transitions.append(('fire', breach.alert))
+                elif breach is not None:
+                    del self._breaches[key]
+                    if breach.alert is not None:
+                        breach.alert['resolved_at'] = ts
+                        transitions.append(('resolve', breach.alert))
+        self._persist(transitions)
+
+    def evaluated_ts(self, server_ip):
+        """Timestamp of the newest sample evaluated for ``server_ip``, or None."""
+        with self._lock:
+            return self._evaluated_ts.get(server_ip)
+
+    def set_evaluating(self, evaluating):
+        """Start or stop treating this process as the one that evaluates samples.
+
+        Breach state is dropped either way; a process that starts evaluating reloads the
+        alerts left active in the table so they can still resolve.
+        """
+        with self._load_lock, self._lock:
+            self.evaluating = evaluating
+            self._breaches.clear()
+            self._evaluated_ts.clear()
+            self._alerts_loaded = False
+            self._rules = None
+
+    def set_thresholds(self, server_ip, thresholds):
+        """Apply a server's new thresholds to the next sample; breaches in progress keep their start."""
+        self._rule(server_ip)
+        with self._lock:
+            self._rules[server_ip] = rule_from(thresholds)
+
+    def forget_server(self, server_ip, now=None):
+        """Drop a removed server's thresholds and resolve its active alerts."""
+        now = int(now or time.time())
+        transitions = []
+        with self._lock:
+            if self._rules is not None:
+                self._rules.pop(server_ip, None)
+            self._evaluated_ts.pop(server_ip, None)
+            for key in [key for key in self._breaches if key[0] == server_ip]:
+                breach = self._breaches.pop(key)
+                if breach.alert is not None:
+                    breach.alert['resolved_at'] = now
+                    transitions.append(('resolve', breach.alert))
+        self._persist(transitions)
+
+    def active(self, server_ip=None):
+        """Currently firing alerts, newest first, optionally for one server."""
+        if not self.evaluating:
+            query = select(Alert.__table__).where(Alert.resolved_at.is_(None))
+            if server_ip:
+                query = query.where(Alert.server_ip == server_ip)
+            return [alert_dict(row) for row in read(query.order_by(Alert.fired_at.desc()))]
+        self._rule(server_ip)  # Loads alerts left active by a previous run
+        with self._lock:
+            alerts = [
+                format_alert(breach.alert) for (ip, _), breach in self._breaches.items()
+                if breach.alert is not None and server_ip in (None, ip)
+            ]
+        return sorted(alerts, key=lambda alert: alert['fired_at'], reverse=True)
+
+    def resolved(self, server_ip=None, limit=100):
+        """Most recently started resolved alerts, read from the alert table."""
+        query = select(Alert.__table__).where(Alert.resolved_at.isnot(None))
+        if server_ip:
+            query = query.where(Alert.server_ip == server_ip)
+        rows = read(query.order_by(Alert.started_at.desc()).limit(limit))
+        return [alert_dict(row) for row in rows]
+
+    def _rule(self, server_ip):
+        if self._rules is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+            # One thread reloads; the others keep using the cached rules meanwhile
+            if self._load_lock.acquire(blocking=self._rules is None):
+                try:
+                    if self._rules is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+                        self._load()
+                finally:
+                    self._load_lock.release()
+        rules = self._rules or {}
+        return rules.get(server_ip) or rule_from(DEFAULT_THRESHOLDS)
+
+    def _load(self):
+        try:
+            with self._app.app_context():
+                rules = {
+                    row.server_ip: rule_from({
+                        'cpu': row.cpu_threshold, 'memory': row.memory_threshold,
+                        'disk': row.disk_threshold, 'duration': row.duration_seconds,
+                    })
+                    for row in Threshold.query.all()
+                }
+                open_alerts = [] if self._alerts_loaded else Alert.query.filter(Alert.resolved_at.is_(None)).all()
+                with self._lock:
+                    self._rules = rules
+                    # Pick up alerts a previous run left active so they can still resolve
+                    for row in open_alerts:
+                        alert = alert_dict(row, epoch=True)
+                        self._breaches.setdefault((row.server_ip, row.metric), _Breach(row.started_at, alert))
+                    self._alerts_loaded = True
+        except Exception as e:
+            log.error("Error loading alert thresholds: %s", e)
+        finally:
+            # Failed loads are retried after the next interval, with defaults in the meantime
+            self._loaded_at = time.monotonic()
+            if self._rules is None:
+                self._rules = {}
+
+    def _persist(self, transitions):
+        if not transitions:
+            return
+        with self._persist_lock, self._app.app_context():
+            try:
+                for kind, alert in transitions:
+                    if kind == 'fire':
+                        row = Alert(
+                            server_ip=alert['server_ip'], metric=alert['metric'],
+                            threshold=alert['threshold'], duration_seconds=alert['duration'],
+                            value=alert['value'], peak=alert['peak'],
+                            started_at=alert['started_at'], fired_at=alert['fired_at']
+                        )
+                        db.session.add(row)
+                        db.session.flush()
+                        alert['id'] = row.id
+                    elif alert['id'] is not None:
+                        db.session.execute(
+                            update(Alert).where(Alert.id == alert['id'])
+                            .values(resolved_at=alert['resolved_at'], peak=alert['peak'])
+                        )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                log.error("Error saving %d alert transitions: %s", len(transitions), e)
+
+
+def alert_dict(row, epoch=False):
+    """API form of an alert row (or of a row-like object); timestamps are ISO 8601 unless ``epoch``."""
+    alert = {
+        'id': row.id, 'server_ip': row.server_ip, 'metric': row.metric,
+        'threshold': row.threshold, 'duration': row.duration_seconds,
+        'value': row.value, 'peak': row.peak,
+        'started_at': row.started_at, 'fired_at': row.fired_at, 'resolved_at': row.resolved_at,
+    }
+    return alert if epoch else format_alert(alert)
+
+
+def format_alert(alert):
+    """Copy of an in-memory alert with ISO 8601 timestamps."""
+    return {
+        **alert,
+        **{key: format_ts(alert[key]) if alert[key] is not None else None
+           for key in ('started_at', 'fired_at', 'resolved_at')},
+    }
+
+
+alert_engine = AlertEngine()
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+
+
+class Subscription:
+    """One live-stream subscriber: the newest pending event per server, waiting to be sent.
+
+    Events for a server that arrive before the previous one was sent replace it, so a
+    slow client only ever receives the latest state instead of a growing backlog.
+    """
+
+    def __init__(self, servers=None, min_interval=0.0):
+        self.servers = set(servers) if servers else None
+        self.min_interval = min_interval
+        self.closed = False
+        self._pending = {}  # ip -> encoded event
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._last_sent = 0.0
+
+    def wants(self, ip):
+        return self.servers is None or ip in self.servers
+
+    def offer(self, ip, event):
+        with self._lock:
+            self._pending[ip] = event
+            self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    def next_batch(self, timeout):
+        """Wait up to ``timeout`` seconds for events and return them, oldest server first.
+
+        Returns an empty list on timeout, so the caller can send a keep-alive.
+        """
+        if not self._ready.wait(timeout) or self.closed:
+            return []
+        # Hold back until min_interval has passed since the last batch; newer events coalesce meanwhile
+        delay = self._last_sent + self.min_interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            events, self._pending = list(self._pending.values()), {}
+            self._ready.clear()
+        self._last_sent = time.monotonic()
+        return events
+
+
+class MetricsBroadcaster:
+    """Fans samples from the shared collector out to every live-stream subscriber.
+
+    Each sample is encoded once, however many subscribers receive it.
+    """
+
+    def __init__(self, max_subscribers=100):
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_subscribers = app.config.get('STREAM_MAX_SUBSCRIBERS', self.max_subscribers)
+        app.extensions['metrics_broadcaster'] = self
+
+    def subscribe(self, servers=None, min_interval=0.0):
+        """Register a subscriber, or return None when the subscriber limit has been reached."""
+        subscription = Subscription(servers, min_interval)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, ip, metrics=None, error=None):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.wants(ip)]
+        if not subscribers:
+            return
+        event = encode_event(ip, metrics, error)
+        for subscription in subscribers:
+            subscription.offer(ip, event)
+
+    def close(self):
+        """Wake every subscriber so its stream ends."""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+        for subscription in subscribers:
+            subscription.close()
+
+
+def encode_event(ip, metrics=None, error=None):
+    """Encode one server's state as a Server-Sent Events ``metrics`` event."""
+    data = json.dumps({'ip_address': ip, 'metrics': metrics, 'error': error})
+    return f"event: metrics\ndata: {data}\n\n"
+
+
+broadcaster = MetricsBroadcaster()
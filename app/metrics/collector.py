@@ -0,0 +1,347 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics.alerts import alert_engine
+from app.metrics.broadcaster import broadcaster
+from app.metrics.docker_metrics import docker_metrics_cache, docker_metrics_for, drop_docker_metrics
+from app.metrics.volume_sizes import volume_size_cache
+from app.metrics.system_metrics import (
+    configure_remote_session,
+    get_root_disk_percent,
+    get_system_metrics,
+)
+from app.models.database import Server
+from app.models.recent_samples import recent_samples
+from app.models.timeseries import (
+    BYTES_PER_MB,
+    container_sample_row,
+    format_ts,
+    system_sample_rows,
+)
+from app.models.write_buffer import write_buffer
+
+log = logging.getLogger(__name__)
+
+LOCALHOST = "127.0.0.1"
+INGEST_SLICE_ROWS = 1000
+
+
+class MetricsCollector:
+    """Samples every registered server on its own cadence and keeps the latest snapshot in memory.
+
+    Each server has a nominal schedule of ``start + n * interval``. Deadlines are advanced
+    from the previous nominal time rather than from "now", so slow samples do not make the
+    schedule drift, and ticks that were missed entirely are skipped instead of bursting.
+    A random jitter is added on top of each deadline to keep servers from sampling in lockstep.
+
+    Due samples are handed to a bounded worker pool, so one slow remote host only occupies
+    one worker; a server whose previous sample is still running skips its next tick.
+
+    Servers running the agent push their samples instead (see ``ingest``); a server that
+    pushed within ``push_timeout`` seconds is not polled.
+    """
+
+    def __init__(self, interval=5.0, jitter=0.0, concurrency=10):
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.cpu_interval = None
+        self.remote_timeout = None
+        self.docker_remote = False
+        self.store_samples = True  # Off in processes that only mirror another's snapshots
+        self.push_timeout = 60.0
+        self._app = None
+        self._servers = {}  # ip -> (interval, registration generation)
+        self._generations = itertools.count()
+        self._latest = {}  # ip -> latest metrics dict
+        self._errors = {}  # ip -> last collection error, cleared on success
+        self._pushed = {}  # ip -> epoch seconds of the last batch its agent pushed
+        self._in_flight = set()
+        self._schedule = []  # heap of (fire_at, nominal_due, ip, generation)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def init_app(self, app):
+        self._app = app
+        self.interval = app.config.get('COLLECTION_INTERVAL', self.interval)
+        self.jitter = app.config.get('COLLECTION_JITTER', self.jitter)
+        self.concurrency = app.config.get('COLLECTION_CONCURRENCY', self.concurrency)
+        self.cpu_interval = app.config.get('CPU_SAMPLE_INTERVAL')
+        self.remote_timeout = (
+            app.config.get('REMOTE_CONNECT_TIMEOUT', 2),
+            app.config.get('REMOTE_READ_TIMEOUT', 5)
+        )
+        self.docker_remote = app.config.get('DOCKER_REMOTE_METRICS', self.docker_remote)
+        self.push_timeout = app.config.get('AGENT_PUSH_TIMEOUT', self.push_timeout)
+        configure_remote_session(self.concurrency)
+        docker_metrics_cache.on_refresh = self._store_containers
+        docker_metrics_cache.ttl = app.config.get('DOCKER_METRICS_TTL', docker_metrics_cache.ttl)
+        docker_metrics_cache.max_workers = app.config.get(
+            'DOCKER_STATS_CONCURRENCY', docker_metrics_cache.max_workers
+        )
+        volume_size_cache.ttl = app.config.get('VOLUME_SIZE_TTL', volume_size_cache.ttl)
+        volume_size_cache.full_rescan_interval = app.config.get(
+            'VOLUME_SIZE_FULL_RESCAN', volume_size_cache.full_rescan_interval
+        )
+        volume_size_cache.mtime_check = app.config.get('VOLUME_SIZE_MTIME_CHECK', volume_size_cache.mtime_check)
+        app.extensions['metrics_collector'] = self
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix='metrics-worker'
+            )
+            self._thread = threading.Thread(target=self._run, name='metrics-collector', daemon=True)
+            self._thread.start()
+            docker_metrics_cache.start()
+
+        with self._app.app_context():
+            ips = [LOCALHOST] + [s.ip_address for s in Server.query.all()]
+        for ip in ips:
+            self.add_server(ip)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        docker_metrics_cache.stop()
+        for ip in list(self._servers):
+            if ip != LOCALHOST and self.docker_remote:
+                docker_metrics_for(ip).stop()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def add_server(self, ip, interval=None):
+        """Register a server (or change its interval); it is first sampled within one jitter window."""
+        interval = interval or self.interval
+        token = next(self._generations)
+        now = time.monotonic()
+        with self._lock:
+            self._servers[ip] = (interval, token)
+            heapq.heappush(self._schedule, (now + self._jitter(), now, ip, token))
+        self._wakeup.set()
+        if ip != LOCALHOST and self.docker_remote and self._thread is not None:
+            # Remote engines are reached through the shared Docker client pool
+            docker_metrics_for(ip).start()
+
+    def remove_server(self, ip):
+        with self._lock:
+            self._servers.pop(ip, None)
+            self._latest.pop(ip, None)
+            self._errors.pop(ip, None)
+            self._pushed.pop(ip, None)
+        recent_samples.discard(ip)
+        drop_docker_metrics(ip)
+        alert_engine.forget_server(ip)
+
+    def sync_servers(self):
+        """Register servers added, and drop servers removed, through other processes."""
+        with self._app.app_context():
+            ips = {LOCALHOST} | {s.ip_address for s in Server.query.all()}
+        with self._lock:
+            known = set(self._servers)
+        for ip in ips - known:
+            self.add_server(ip)
+        for ip in known - ips:
+            self.remove_server(ip)
+
+    def mirror(self, ip, metrics=None, error=None, pushed_at=None):
+        """Take a snapshot collected by another process and pass it on to live streams.
+
+        ``pushed_at`` is set when the snapshot came from the server's agent.
+        """
+        with self._lock:
+            self._servers.setdefault(ip, (self.interval, None))
+            if pushed_at is not None:
+                self._pushed[ip] = pushed_at
+            if metrics is not None:
+                self._latest[ip] = metrics
+            if error:
+                self._errors[ip] = error
+            else:
+                self._errors.pop(ip, None)
+        broadcaster.publish(ip, metrics, error)
+
+    def ingest(self, ip, samples, min_ts=None):
+        """Store samples pushed by a server's agent; returns how many were accepted.
+
+        Each sample is ``{'ts', 'system'}`` (a ``get_system_metrics`` dict) or
+        ``{'ts', 'containers'}`` (a Docker metrics snapshot). Samples older than ``min_ts``
+        are skipped. Raises OverflowError if the write buffer has no room for them.
+        """
+        samples = sorted(
+            (sample for sample in samples if min_ts is None or sample['ts'] >= min_ts),
+            key=lambda sample: sample['ts']
+        )
+        rows, disks, latest, containers = [], [], None, None
+        for sample in samples:
+            ts = sample['ts']
+            if sample.get('system') is not None:
+                metrics = sample['system']
+                row, disk_rows = system_sample_rows(ip, metrics, ts, get_root_disk_percent(metrics))
+                rows.append(row)
+                disks.extend(disk_rows)
+                latest = (ts, metrics)
+            if sample.get('containers') is not None:
+                rows.extend(
+                    container_sample_row(
+                        ip, container['name'], ts, container.get('cpu_percent', 0),
+                        container.get('memory_usage_bytes', 0) / BYTES_PER_MB,
+                        container.get('memory_limit_bytes', 0) / BYTES_PER_MB
+                    )
+                    for container in sample['containers']
+                )
+                containers = (ts, sample['containers'])
+        if not rows:
+            return 0
+        # In slices, so a large spooled batch never needs more room than the buffer has.
+        # Rows are upserted, so a batch retried after a partial write isn't duplicated
+        for start in range(0, max(len(rows), len(disks)), INGEST_SLICE_ROWS):
+            if not write_buffer.add(rows[start:start + INGEST_SLICE_ROWS], disks[start:start + INGEST_SLICE_ROWS]):
+                raise OverflowError("Write buffer is full")
+
+        # Pushed batches can arrive out of order (an agent sends its live batch before
+        # its spool), so pushed series are always read from the database
+        recent_samples.discard(ip)
+        if alert_engine.evaluating:
+            for row in rows:
+                alert_engine.evaluate(row)
+
+        now = time.time()
+        with self._lock:
+            self._servers.setdefault(ip, (self.interval, None))
+            self._pushed[ip] = now
+            current = self._latest.get(ip)
+            if latest is not None and (current is None or current.get('timestamp', '') <= format_ts(latest[0])):
+                metrics = dict(latest[1], timestamp=format_ts(latest[0]), source='agent')
+                self._latest[ip] = metrics
+                self._errors.pop(ip, None)
+            else:
+                latest = None
+        if latest is not None:
+            broadcaster.publish(ip, metrics)
+        if containers is not None:
+            cache = docker_metrics_for(ip)
+            if cache.snapshot_ts is None or cache.snapshot_ts <= containers[0]:
+                cache.mirror(containers[1], containers[0])
+        return len(samples)
+
+    def last_push(self, ip):
+        """Epoch seconds of the last batch ``ip``'s agent pushed, or None."""
+        return self._pushed.get(ip)
+
+    def _recently_pushed(self, ip):
+        pushed_at = self._pushed.get(ip)
+        return pushed_at is not None and time.time() - pushed_at < self.push_timeout
+
+    def get_latest(self, ip):
+        """Return the most recent snapshot for a server, or None if it has not been sampled yet."""
+        return self._latest.get(ip)
+
+    def get_all_latest(self):
+        """Return ``(snapshot, last_error)`` for every registered server, keyed by IP."""
+        with self._lock:
+            return {ip: (self._latest.get(ip), self._errors.get(ip)) for ip in self._servers}
+
+    def collect_now(self, ip):
+        """Sample a server immediately, persist the sample and update its snapshot."""
+        try:
+            metrics = get_system_metrics(ip, cpu_interval=self.cpu_interval, timeout=self.remote_timeout)
+        except Exception as e:
+            with self._lock:
+                self._errors[ip] = str(e)
+            broadcaster.publish(ip, error=str(e))
+            raise
+        ts = int(time.time())
+        metrics['timestamp'] = format_ts(ts)
+        with self._lock:
+            self._latest[ip] = metrics
+            self._errors.pop(ip, None)
+        broadcaster.publish(ip, metrics)
+        if self.store_samples:
+            self._store(ip, metrics, ts)
+        return metrics
+
+    def _jitter(self):
+        return random.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            due = []
+            with self._lock:
+                while self._schedule and self._schedule[0][0] <= now:
+                    due.append(heapq.heappop(self._schedule))
+                timeout = self._schedule[0][0] - now if self._schedule else None
+
+                for fire_at, nominal, ip, token in due:
+                    interval, current = self._servers.get(ip, (None, None))
+                    if current != token:
+                        continue  # removed or re-registered since this entry was queued
+
+                    # Advance from the nominal deadline, skipping any ticks we are already late for
+                    next_due = nominal + interval
+                    if next_due <= now:
+                        next_due += ((now - next_due) // interval + 1) * interval
+                    heapq.heappush(self._schedule, (next_due + self._jitter(), next_due, ip, token))
+
+                    if ip in self._in_flight or self._recently_pushed(ip):
+                        continue
+                    self._in_flight.add(ip)
+                    self._executor.submit(self._collect, ip)
+
+            if not due:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+
+    def _collect(self, ip):
+        try:
+            self.collect_now(ip)
+        except Exception as e:
+            log.warning("Error collecting metrics for %s: %s", ip, e, extra={'server_ip': ip})
+        finally:
+            with self._lock:
+                self._in_flight.discard(ip)
+
+    def _store(self, ip, metrics, ts):
+        sample, disks = system_sample_rows(ip, metrics, ts, get_root_disk_percent(metrics))
+        alert_engine.evaluate(sample)
+        # Only buffer in memory what will be written, so recent reads agree with the store
+        if write_buffer.add([sample], disks):
+            recent_samples.add([sample])
+        else:
+            log.warning("Write buffer full, sample for %s not stored", ip, extra={'server_ip': ip})
+
+    def _store_containers(self, server_ip, containers, ts):
+        samples = [
+            container_sample_row(
+                server_ip, container['name'], ts, container.get('cpu_percent', 0),
+                container.get('memory_usage_bytes', 0) / BYTES_PER_MB,
+                container.get('memory_limit_bytes', 0) / BYTES_PER_MB
+            )
+            for container in containers
+        ]
+        if write_buffer.add(samples):
+            recent_samples.add(samples)
+        else:
+            log.warning("Write buffer full, container samples for %s not stored", server_ip,
+                        extra={'server_ip': server_ip})
+
+
+collector = MetricsCollector()
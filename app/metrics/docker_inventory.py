@@ -0,0 +1,136 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# Container events after which the cached details are re-read
+REFRESH_EVENTS = {'create', 'start', 'stop', 'die', 'kill', 'pause', 'unpause', 'restart', 'rename', 'update', 'oom'}
+
+
+class ContainerInfo:
+    """Static details of one container, read with a single inspect per lifecycle change."""
+
+    __slots__ = ('id', 'short_id', 'name', 'status', 'image', 'attrs')
+
+    def __init__(self, attrs, image):
+        self.id = attrs['Id']
+        self.short_id = attrs['Id'][:12]
+        self.name = attrs.get('Name', '').lstrip('/')
+        self.status = attrs.get('State', {}).get('Status', 'unknown')
+        self.image = image
+        self.attrs = attrs
+
+
+class ContainerInventory:
+    """Containers known to one Docker engine, kept current from its events stream.
+
+    Each container is inspected (and its image tags looked up) once when it appears and
+    again on lifecycle events such as start, die or rename; destroy removes it. Until the
+    event watcher is running, and after it reconnects, the inventory is reconciled against
+    one cheap container listing, which also only inspects containers it has not seen.
+    """
+
+    def __init__(self, get_client, reconnect_delay=5.0):
+        self.get_client = get_client
+        self.reconnect_delay = reconnect_delay
+        self._containers = {}  # container id -> ContainerInfo
+        self._image_tags = {}  # image id -> first tag, shared by containers of the same image
+        self._lock = threading.Lock()
+        self._events = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._synced = False
+
+    def running(self):
+        """``ContainerInfo`` for every running container."""
+        if not self._synced or self._thread is None:
+            self.sync()
+        with self._lock:
+            return [info for info in self._containers.values() if info.status == 'running']
+
+    def sync(self):
+        """Reconcile with the engine's container list, inspecting only new or changed containers."""
+        client = self.get_client()
+        summaries = {summary['Id']: summary for summary in client.api.containers(all=True)}
+        with self._lock:
+            known = dict(self._containers)
+        for container_id in known.keys() - summaries.keys():
+            self._forget(container_id)
+        for container_id, summary in summaries.items():
+            info = known.get(container_id)
+            if info is None or info.status != summary.get('State'):
+                self._inspect(client, container_id)
+        self._synced = True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='docker-events', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        events = self._events
+        if events is not None:
+            events.close()  # Unblocks the watcher's read
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def handle_event(self, event):
+        container_id = event.get('id') or event.get('Actor', {}).get('ID')
+        action = (event.get('Action') or event.get('status') or '').split(':')[0]
+        if not container_id:
+            return
+        if action == 'destroy':
+            self._forget(container_id)
+        elif action in REFRESH_EVENTS:
+            self._inspect(self.get_client(), container_id)
+
+    def _inspect(self, client, container_id):
+        try:
+            attrs = client.api.inspect_container(container_id)
+        except Exception as e:
+            # Most often the container was removed between the event and the inspect
+            log.info("Error inspecting container %s: %s", container_id[:12], e)
+            self._forget(container_id)
+            return
+        image = self._image_tag(client, attrs.get('Image'))
+        with self._lock:
+            self._containers[container_id] = ContainerInfo(attrs, image)
+
+    def _image_tag(self, client, image_id):
+        tag = self._image_tags.get(image_id)
+        if tag is not None:
+            return tag
+        try:
+            tags = client.api.inspect_image(image_id).get('RepoTags') or []
+        except Exception as e:
+            log.warning("Error reading image tags for %s: %s", image_id, e)
+            return "Unknown"
+        tag = self._image_tags[image_id] = tags[0] if tags else "Unknown"
+        return tag
+
+    def _forget(self, container_id):
+        with self._lock:
+            self._containers.pop(container_id, None)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                client = self.get_client()
+                self._events = client.events(decode=True, filters={'type': 'container'})
+                # Resync after subscribing so nothing between the listing and the stream is lost
+                self.sync()
+                for event in self._events:
+                    if self._stop.is_set():
+                        break
+                    self.handle_event(event)
+            except Exception as e:
+                if not self._stop.is_set():
+                    log.warning("Docker events stream failed, reconnecting: %s", e)
+            finally:
+                self._events = None
+                self._synced = False
+            self._stop.wait(self.reconnect_delay)
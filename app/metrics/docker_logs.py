@@ -0,0 +1,188 @@
+import calendar
+import json
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Most lines sent in one SSE event; more are left for the next event
+MAX_LINES_PER_EVENT = 500
+
+_END = object()
+
+
+def parse_log_timestamp(ts):
+    """Sortable ``(seconds, nanoseconds)`` key of a Docker RFC 3339 log timestamp, or None.
+
+    Docker trims trailing zeros from the fraction, so the strings themselves don't sort.
+    """
+    try:
+        seconds = calendar.timegm(time.strptime(ts[:19], '%Y-%m-%dT%H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+    fraction = ts[20:].rstrip('Z') if ts[19:20] == '.' else ''
+    if not fraction.isdigit() and fraction:
+        return None
+    return seconds, int(fraction.ljust(9, '0')[:9] or 0)
+
+
+def split_lines(chunks):
+    """Yield complete, decoded lines from a stream of byte chunks that may split lines anywhere."""
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            yield line.decode('utf-8', errors='replace')
+    if pending:
+        yield pending.decode('utf-8', errors='replace')
+
+
+class LogStream:
+    """Lines of one container's log, read on a background thread into a bounded queue.
+
+    ``open_stream(since, tail)`` opens a timestamped Docker log stream. Each line's
+    timestamp becomes the cursor, and lines at or before the starting ``cursor`` are
+    skipped (Docker's ``since`` is coarser than the timestamps it prints). When following,
+    a stream that ends while ``is_running()`` is still true (the client's read timed out)
+    is reopened from the last line read. After ``limit`` lines the stream ends with
+    ``more`` set. A slow reader blocks the thread once ``buffer_lines`` are queued, which
+    in turn stops reading from Docker, so nothing is buffered beyond that.
+    """
+
+    def __init__(self, open_stream, cursor=None, since=None, tail='all', follow=False,
+                 is_running=None, limit=None, buffer_lines=1000):
+        self.open_stream = open_stream
+        self.is_running = is_running
+        self.follow = follow
+        self.limit = limit
+        self.cursor = cursor
+        self.more = False
+        self.error = None
+        self.finished = False
+        self.closed = False
+        self._since = since_for_cursor(cursor) if cursor else since
+        self._tail = 'all' if cursor else tail
+        self._resume = parse_log_timestamp(cursor) if cursor else None
+        self._stream = None
+        self._queue = queue.Queue(maxsize=buffer_lines)
+        self._thread = threading.Thread(target=self._read, name='docker-logs', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def next_lines(self, timeout):
+        """Wait up to ``timeout`` seconds for lines; returns those available, possibly none."""
+        lines = []
+        try:
+            item = self._queue.get(timeout=timeout)
+            while True:
+                if item is _END:
+                    self.finished = True
+                    break
+                lines.append(item)
+                if len(lines) >= MAX_LINES_PER_EVENT:
+                    break
+                item = self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        if lines:
+            self.cursor = lines[-1].split(' ', 1)[0]
+        return lines
+
+    def close(self):
+        self.closed = True
+        self._close_stream()
+
+    def _close_stream(self):
+        stream = self._stream
+        if stream is None:
+            return
+        try:
+            stream.close()  # Unblocks the reader if it waits on Docker
+        except Exception as e:
+            log.warning("Error closing container log stream: %s", e)
+
+    def _put(self, item):
+        while not self.closed:
+            try:
+                self._queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self):
+        sent = 0
+        try:
+            while not self.closed:
+                opened_at = int(time.time())
+                self._stream = self.open_stream(self._since, self._tail)
+                if self.closed:
+                    break
+                resume = self._resume
+                for line in split_lines(self._stream):
+                    key = parse_log_timestamp(line.split(' ', 1)[0])
+                    if resume is not None and key is not None:
+                        if key <= resume:
+                            continue
+                        resume = None  # Past the cursor; timestamps only grow from here
+                    if self.limit is not None and sent >= self.limit:
+                        self.more = True
+                        return
+                    if not self._put(line):
+                        return
+                    sent += 1
+                    if key is not None:
+                        self._resume = key
+                if not self.follow or self.closed or not (self.is_running and self.is_running()):
+                    break
+                # Pick up where the last stream stopped
+                self._close_stream()
+                self._since = max(self._resume[0], 1) if self._resume else opened_at
+                self._tail = 'all'
+        except Exception as e:
+            if not self.closed:
+                self.error = str(e)
+        finally:
+            self._close_stream()
+            self._put(_END)
+
+
+def since_for_cursor(cursor):
+    """Whole epoch seconds to pass to Docker as ``since`` for a cursor; later lines are skipped exactly."""
+    key = parse_log_timestamp(cursor)
+    if key is None:
+        raise ValueError("cursor must be a Docker log timestamp as sent in a previous event")
+    return max(key[0], 1)
+
+
+def encode_log_event(event, **payload):
+    """One Server-Sent Event; ``logs`` events carry the cursor as their id."""
+    event_id = f"id: {payload['cursor']}\n" if event == 'logs' and payload.get('cursor') else ''
+    return f"event: {event}\n{event_id}data: {json.dumps(payload)}\n\n"
+
+
+class StreamSlots:
+    """Counts open log streams so each one's reader thread and Docker connection stay bounded."""
+
+    def __init__(self):
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open = max(self.open - 1, 0)
+
+
+log_stream_slots = StreamSlots()
@@ -1,7 +1,18 @@
-import docker
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 
-client = docker.from_env()
+from app.instrumentation import phase
+from app.metrics.docker_inventory import ContainerInventory
+from app.metrics.docker_pool import LOCALHOST, docker_pool
+from app.metrics.volume_sizes import volume_size_cache
+
+log = logging.getLogger(__name__)
+
+DEFAULT_STATS_CONCURRENCY = 16
 
 def convert_bytes(size_bytes):
     """Convert bytes to human-readable format."""
@@ -14,27 +25,12 @@ def convert_bytes(size_bytes):
         i += 1
     return f"{round(size_bytes, 2)} {size_name[i]}"
 
-def get_directory_size(path):
-    """Calculate total size of a directory in bytes."""
-    total_size = 0
-    try:
-        import os
-        for dirpath, dirnames, filenames in os.walk(path):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                if os.path.exists(fp):
-                    total_size += os.path.getsize(fp)
-        return total_size
-    except Exception as e:
-        print(f"Error calculating directory size for {path}: {str(e)}")
-        return 0
-
 def get_uptime(container_info):
     """Calculate container uptime in a human-readable format."""
     try:
         created = container_info.get('Created', '')
         if not created:
-            print("No creation time found in container info")
+            log.debug("No creation time found in container info")
             return 'Unknown'
         
         # Parse the creation time
@@ -60,140 +56,272 @@ def get_uptime(container_info):
         else:
             return f"{seconds}s"
     except Exception as e:
-        print(f"Error calculating uptime: {str(e)}")
-        print(f"Container info: {container_info}")
+        log.warning("Error calculating uptime: %s", e)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Container info: %s", container_info)
         return 'Unknown'
 
-def get_docker_metrics():
-    container_metrics = []
-    for container in client.containers.list():
-        try:
-            stats = container.stats(stream=False)
-            
-            # Get container details
-            container_info = container.attrs
-            print(f"\nProcessing container: {container.name}")
-            print(f"Container info: {container_info}")
-            
-            # Calculate uptime
-            uptime = get_uptime(container_info)
-            print(f"Calculated uptime: {uptime}")
-            
-            # Get network stats
-            networks = stats.get('networks', {})
-            network_stats = {}
-            for network_name, network_data in networks.items():
-                network_stats[network_name] = {
-                    'rx_bytes': convert_bytes(network_data.get('rx_bytes', 0)),
-                    'tx_bytes': convert_bytes(network_data.get('tx_bytes', 0)),
-                    'rx_packets': network_data.get('rx_packets', 0),
-                    'tx_packets': network_data.get('tx_packets', 0),
-                    'rx_errors': network_data.get('rx_errors', 0),
-                    'tx_errors': network_data.get('tx_errors', 0),
-                    'rx_dropped': network_data.get('rx_dropped', 0),
-                    'tx_dropped': network_data.get('tx_dropped', 0)
-                }
+def get_container_metrics(container, server_ip=LOCALHOST):
+    """Collect live stats for a single container; its details come from the inventory."""
+    container_info = container.attrs
+    client = docker_pool.get(server_ip)
+    try:
+        with phase('docker_stats'):
+            stats = client.api.stats(container.id, stream=False)
+        
+        # Calculate uptime
+        uptime = get_uptime(container_info)
+        
+        # Get network stats
+        networks = stats.get('networks', {})
+        network_stats = {}
+        for network_name, network_data in networks.items():
+            network_stats[network_name] = {
+                'rx_bytes': convert_bytes(network_data.get('rx_bytes', 0)),
+                'tx_bytes': convert_bytes(network_data.get('tx_bytes', 0)),
+                'rx_packets': network_data.get('rx_packets', 0),
+                'tx_packets': network_data.get('tx_packets', 0),
+                'rx_errors': network_data.get('rx_errors', 0),
+                'tx_errors': network_data.get('tx_errors', 0),
+                'rx_dropped': network_data.get('rx_dropped', 0),
+                'tx_dropped': network_data.get('tx_dropped', 0)
+            }
 
-            # Get volume information with actual sizes
-            volumes = []
-            mounts = container_info.get('Mounts', [])
-            print(f"Found {len(mounts)} mounts for container {container.name}")
-            
-            for mount in mounts:
-                try:
-                    print(f"\nProcessing mount for {container.name}:")
-                    print(f"Mount details: {mount}")
-                    
-                    # Get volume size
-                    volume_size = 0
-                    mount_type = mount.get('Type', '')
-                    source = mount.get('Source', '')
-                    
-                    if mount_type == 'bind' and source:
-                        print(f"Calculating size for bind mount: {source}")
-                        volume_size = get_directory_size(source)
-                        print(f"Calculated size: {volume_size} bytes")
-                    elif mount_type == 'volume':
-                        volume_name = mount.get('Name')
-                        if volume_name:
-                            try:
+        # Get volume information with actual sizes
+        volumes = []
+        mounts = container_info.get('Mounts', [])
+        for mount in mounts:
+            try:
+                # Get volume size
+                volume_size = 0
+                mount_type = mount.get('Type', '')
+                source = mount.get('Source', '')
+                
+                if mount_type == 'bind' and source and server_ip != LOCALHOST:
+                    volume_size = None  # Bind mounts of remote engines live on that host
+                elif mount_type == 'bind' and source:
+                    # Last known size; the cache rescans in the background once stale
+                    volume_size = volume_size_cache.get(source)
+                elif mount_type == 'volume':
+                    volume_name = mount.get('Name')
+                    if volume_name:
+                        try:
+                            with phase('volume_sizing'):
                                 volume = client.volumes.get(volume_name)
-                                volume_info = volume.attrs
-                                if 'UsageData' in volume_info and volume_info['UsageData']:
-                                    volume_size = volume_info['UsageData'].get('Size', 0)
-                            except Exception as e:
-                                print(f"Error getting volume info: {str(e)}")
-
-                    volume_info = {
-                        'source': source,
-                        'destination': mount.get('Destination', 'Unknown'),
-                        'type': mount_type,
-                        'size': convert_bytes(volume_size)
-                    }
-                    print(f"Final volume info: {volume_info}")
-                    volumes.append(volume_info)
-                except Exception as e:
-                    print(f"Error processing mount for {container.name}: {str(e)}")
-                    volume_info = {
-                        'source': mount.get('Source', 'Unknown'),
-                        'destination': mount.get('Destination', 'Unknown'),
-                        'type': mount.get('Type', 'Unknown'),
-                        'size': 'Unknown'
-                    }
-                    volumes.append(volume_info)
-
-            # Safely get port mappings
-            ports = {}
-            network_settings = container_info.get('NetworkSettings', {})
-            if network_settings and 'Ports' in network_settings:
-                for port, mappings in network_settings['Ports'].items():
-                    if mappings:  # Only add if mappings exist
-                        ports[port] = mappings
-
-            # Calculate CPU percentage safely
-            cpu_usage = stats.get('cpu_stats', {}).get('cpu_usage', {}).get('total_usage', 0)
-            system_cpu = stats.get('cpu_stats', {}).get('system_cpu_usage', 0)
-            cpu_percent = round(cpu_usage / (system_cpu + 0.0001) * 100, 2) if system_cpu > 0 else 0
-
-            # Get memory stats safely
-            memory_stats = stats.get('memory_stats', {})
-            memory_usage = memory_stats.get('usage', 0)
-            memory_limit = memory_stats.get('limit', 0)
-
-            metrics = {
-                'name': container.name,
-                'id': container.short_id,
-                'status': container.status,
-                'cpu_percent': cpu_percent,
-                'memory_usage': convert_bytes(memory_usage),
-                'memory_limit': convert_bytes(memory_limit),
-                'network_stats': network_stats,
-                'ports': ports,
-                'size': convert_bytes(container_info.get('SizeRootFs', 0)),
-                'created': container_info.get('Created', ''),
-                'uptime': uptime,
-                'image': container.image.tags[0] if container.image.tags else "Unknown",
-                'volumes': volumes
-            }
-            print(f"Final metrics for {container.name}: {metrics}")
-            container_metrics.append(metrics)
-        except Exception as e:
-            print(f"Error fetching stats for container {container.name}: {str(e)}")
-            # Add basic container info even if stats fail
-            container_metrics.append({
-                'name': container.name,
-                'id': container.short_id,
-                'status': container.status,
-                'cpu_percent': 0,
-                'memory_usage': '0B',
-                'memory_limit': '0B',
-                'network_stats': {},
-                'ports': {},
-                'size': '0B',
-                'created': container_info.get('Created', ''),
-                'uptime': 'Unknown',
-                'image': container.image.tags[0] if container.image.tags else "Unknown",
-                'volumes': []
-            })
-
-    return container_metrics
+                            volume_info = volume.attrs
+                            if 'UsageData' in volume_info and volume_info['UsageData']:
+                                volume_size = volume_info['UsageData'].get('Size', 0)
+                        except Exception as e:
+                            log.warning("Error getting volume info for %s: %s", volume_name, e)
+
+                volume_info = {
+                    'source': source,
+                    'destination': mount.get('Destination', 'Unknown'),
+                    'type': mount_type,
+                    'size': convert_bytes(volume_size) if volume_size is not None else 'Unknown'
+                }
+                volumes.append(volume_info)
+            except Exception as e:
+                log.warning("Error processing mount for %s: %s", container.name, e)
+                volume_info = {
+                    'source': mount.get('Source', 'Unknown'),
+                    'destination': mount.get('Destination', 'Unknown'),
+                    'type': mount.get('Type', 'Unknown'),
+                    'size': 'Unknown'
+                }
+                volumes.append(volume_info)
+
+        # Safely get port mappings
+        ports = {}
+        network_settings = container_info.get('NetworkSettings', {})
+        if network_settings and 'Ports' in network_settings:
+            for port, mappings in network_settings['Ports'].items():
+                if mappings:  # Only add if mappings exist
+                    ports[port] = mappings
+
+        # Calculate CPU percentage safely
+        cpu_usage = stats.get('cpu_stats', {}).get('cpu_usage', {}).get('total_usage', 0)
+        system_cpu = stats.get('cpu_stats', {}).get('system_cpu_usage', 0)
+        cpu_percent = round(cpu_usage / (system_cpu + 0.0001) * 100, 2) if system_cpu > 0 else 0
+
+        # Get memory stats safely
+        memory_stats = stats.get('memory_stats', {})
+        memory_usage = memory_stats.get('usage', 0)
+        memory_limit = memory_stats.get('limit', 0)
+
+        metrics = {
+            'name': container.name,
+            'id': container.short_id,
+            'status': container.status,
+            'cpu_percent': cpu_percent,
+            'memory_usage': convert_bytes(memory_usage),
+            'memory_limit': convert_bytes(memory_limit),
+            'memory_usage_bytes': memory_usage,
+            'memory_limit_bytes': memory_limit,
+            'network_stats': network_stats,
+            'ports': ports,
+            'size': convert_bytes(container_info.get('SizeRootFs', 0)),
+            'created': container_info.get('Created', ''),
+            'uptime': uptime,
+            'image': container.image,
+            'volumes': volumes
+        }
+        log.debug("Collected metrics for %s", container.name, extra={'server_ip': server_ip})
+        return metrics
+    except Exception as e:
+        log.warning("Error fetching stats for container %s: %s", container.name, e, extra={'server_ip': server_ip})
+        # Add basic container info even if stats fail
+        return {
+            'name': container.name,
+            'id': container.short_id,
+            'status': container.status,
+            'cpu_percent': 0,
+            'memory_usage': '0B',
+            'memory_limit': '0B',
+            'memory_usage_bytes': 0,
+            'memory_limit_bytes': 0,
+            'network_stats': {},
+            'ports': {},
+            'size': '0B',
+            'created': container_info.get('Created', ''),
+            'uptime': 'Unknown',
+            'image': container.image,
+            'volumes': []
+        }
+
+def get_docker_metrics(inventory, server_ip=LOCALHOST, max_workers=DEFAULT_STATS_CONCURRENCY):
+    """Collect metrics for every running container, fetching stats concurrently.
+
+    Containers come from the events-driven inventory, so only their stats are fetched here.
+    The stats call waits for Docker to take two samples, so each call takes a second or
+    two; running them in parallel bounds the crawl by the slowest container.
+    """
+    containers = inventory.running()
+    if not containers:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(containers))) as executor:
+        return list(executor.map(partial(get_container_metrics, server_ip=server_ip), containers))
+
+
+class DockerMetricsCache:
+    """Short-TTL snapshot of :func:`get_docker_metrics` for one Docker engine.
+
+    Once started, a background thread refreshes the snapshot every ``ttl`` seconds so
+    readers never wait on a crawl. Without the refresher, a stale snapshot is refreshed
+    on read, with concurrent readers sharing a single crawl. ``on_refresh`` is called
+    with the server IP, each new snapshot and its epoch timestamp.
+    """
+
+    def __init__(self, server_ip=LOCALHOST, ttl=5.0, max_workers=DEFAULT_STATS_CONCURRENCY):
+        self.server_ip = server_ip
+        self.inventory = ContainerInventory(lambda: docker_pool.get(server_ip))
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.on_refresh = None
+        self.mirrored = False  # Fed by another process's crawls instead of crawling on read
+        self.snapshot_ts = None  # epoch seconds the snapshot was taken at
+        self._snapshot = None
+        self._refreshed_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self):
+        if self._snapshot is None or (
+            self._thread is None and not self.mirrored and time.monotonic() - self._refreshed_at > self.ttl
+        ):
+            self.refresh(if_older_than=self.ttl)
+        return self._snapshot
+
+    def peek(self):
+        """Return the current snapshot without refreshing it, or None before the first crawl."""
+        return self._snapshot
+
+    def refresh(self, if_older_than=None):
+        with self._refresh_lock:
+            # Another caller may have refreshed while we waited for the lock
+            if (if_older_than is not None and self._snapshot is not None
+                    and time.monotonic() - self._refreshed_at <= if_older_than):
+                return self._snapshot
+            snapshot = get_docker_metrics(self.inventory, self.server_ip, self.max_workers)
+            self._snapshot, self.snapshot_ts = snapshot, int(time.time())
+            self._refreshed_at = time.monotonic()
+        if self.on_refresh is not None:
+            try:
+                self.on_refresh(self.server_ip, snapshot, self.snapshot_ts)
+            except Exception as e:
+                log.exception("Error handling Docker metrics refresh")
+        return snapshot
+
+    def mirror(self, snapshot, snapshot_ts):
+        """Take a snapshot crawled by another process; from then on reads no longer crawl."""
+        self._snapshot, self.snapshot_ts = snapshot, snapshot_ts
+        self._refreshed_at = time.monotonic()
+        self.mirrored = True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.inventory.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='docker-metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.inventory.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.refresh()
+            except Exception as e:
+                log.warning("Error refreshing Docker metrics for %s: %s", self.server_ip, e)
+            self._stop.wait(max(self.ttl - (time.monotonic() - started), 0))
+
+
+# The local engine's cache; remote engines get theirs from docker_metrics_for()
+docker_metrics_cache = DockerMetricsCache()
+_remote_caches = {}
+_remote_caches_lock = threading.Lock()
+
+
+def docker_metrics_for(server_ip):
+    """Docker metrics cache for ``server_ip``, created on first use with the local cache's settings."""
+    if server_ip == LOCALHOST:
+        return docker_metrics_cache
+    with _remote_caches_lock:
+        cache = _remote_caches.get(server_ip)
+        if cache is None:
+            cache = _remote_caches[server_ip] = DockerMetricsCache(
+                server_ip, docker_metrics_cache.ttl, docker_metrics_cache.max_workers
+            )
+            cache.on_refresh = docker_metrics_cache.on_refresh
+        return cache
+
+
+def find_docker_metrics(server_ip):
+    """Existing Docker metrics cache for ``server_ip``, or None; unlike docker_metrics_for() it never creates one."""
+    if server_ip == LOCALHOST:
+        return docker_metrics_cache
+    with _remote_caches_lock:
+        return _remote_caches.get(server_ip)
+
+
+def docker_metrics_caches():
+    """Every Docker metrics cache created so far, keyed by server IP."""
+    with _remote_caches_lock:
+        return {LOCALHOST: docker_metrics_cache, **_remote_caches}
+
+
+def drop_docker_metrics(server_ip):
+    """Stop and forget a remote engine's cache and pooled client."""
+    with _remote_caches_lock:
+        cache = _remote_caches.pop(server_ip, None)
+    if cache is not None:
+        cache.stop()
+    docker_pool.discard(server_ip)
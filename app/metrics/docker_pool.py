@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+
+import docker
+
+log = logging.getLogger(__name__)
+
+LOCALHOST = "127.0.0.1"
+
+
+class _PooledClient:
+    __slots__ = ('client', 'last_used', 'last_checked')
+
+    def __init__(self, client, now):
+        self.client = client
+        self.last_used = now
+        self.last_checked = now
+
+
+class DockerClientPool:
+    """Long-lived Docker clients keyed by server, shared by every Docker-touching caller.
+
+    The local engine is reached through the environment (socket), remote engines over
+    ``tcp://<ip>:<remote_port>``. A client is pinged before reuse once ``health_interval``
+    seconds have passed since its last check and is rebuilt if the ping fails; clients
+    unused for ``idle_timeout`` seconds are closed. Each client keeps its own HTTP
+    connection pool of up to ``max_pool_size`` connections.
+    """
+
+    def __init__(self, remote_port=2375, timeout=10, max_pool_size=10, idle_timeout=300.0, health_interval=30.0):
+        self.remote_port = remote_port
+        self.timeout = timeout
+        self.max_pool_size = max_pool_size
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._clients = {}  # server ip -> _PooledClient
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.remote_port = app.config.get('DOCKER_REMOTE_PORT', self.remote_port)
+        self.timeout = app.config.get('DOCKER_CLIENT_TIMEOUT', self.timeout)
+        self.max_pool_size = app.config.get('DOCKER_CLIENT_POOL_SIZE', self.max_pool_size)
+        self.idle_timeout = app.config.get('DOCKER_CLIENT_IDLE_TIMEOUT', self.idle_timeout)
+        self.health_interval = app.config.get('DOCKER_HEALTH_CHECK_INTERVAL', self.health_interval)
+        app.extensions['docker_pool'] = self
+
+    def get(self, server_ip=LOCALHOST):
+        """Return a healthy client for ``server_ip``, creating or rebuilding it as needed."""
+        now = time.monotonic()
+        self.evict_idle(now)
+        with self._lock:
+            pooled = self._clients.get(server_ip)
+            if pooled is None:
+                pooled = self._clients[server_ip] = _PooledClient(self._connect(server_ip), now)
+                return pooled.client
+            pooled.last_used = now
+            needs_check = now - pooled.last_checked >= self.health_interval
+
+        if needs_check:
+            try:
+                pooled.client.ping()
+                pooled.last_checked = now
+            except Exception as e:
+                log.warning("Docker client for %s failed its health check, reconnecting: %s", server_ip, e)
+                self.discard(server_ip)
+                return self.get(server_ip)
+        return pooled.client
+
+    def discard(self, server_ip):
+        with self._lock:
+            pooled = self._clients.pop(server_ip, None)
+        if pooled is not None:
+            self._close(pooled.client)
+
+    def evict_idle(self, now=None):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            idle = [ip for ip, pooled in self._clients.items() if now - pooled.last_used > self.idle_timeout]
+            evicted = [self._clients.pop(ip) for ip in idle]
+        for pooled in evicted:
+            self._close(pooled.client)
+
+    def close_all(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for pooled in clients:
+            self._close(pooled.client)
+
+    def _connect(self, server_ip):
+        if server_ip == LOCALHOST:
+            return docker.from_env(timeout=self.timeout, max_pool_size=self.max_pool_size)
+        return docker.DockerClient(
+            base_url=f"tcp://{server_ip}:{self.remote_port}",
+            timeout=self.timeout, max_pool_size=self.max_pool_size
+        )
+
+    def _close(self, client):
+        try:
+            client.close()
+        except Exception as e:
+            log.warning("Error closing Docker client: %s", e)
+
+
+docker_pool = DockerClientPool()
@@ -0,0 +1,359 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, insert, select
+
+from app.metrics.alerts import alert_engine
+from app.metrics.broadcaster import broadcaster
+from app.metrics.collector import collector
+from app.metrics.docker_metrics import (
+    docker_metrics_caches,
+    docker_metrics_for,
+    drop_docker_metrics,
+    find_docker_metrics,
+)
+from app.metrics.docker_pool import docker_pool
+from app.metrics.system_metrics import get_root_disk_percent
+from app.models.database import MetricSample, ServerSnapshot, db
+from app.models.retention import retention_engine
+from app.models.sqlite_tuning import read
+from app.models.timeseries import system_sample_rows
+from app.models.write_buffer import write_buffer
+
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): every process collects, as with a single dev server
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+SYSTEM_SNAPSHOT = 'system'
+DOCKER_SNAPSHOT = 'docker'
+
+
+class LeaderLock:
+    """Exclusive advisory lock on a file, released by the OS when its holder exits.
+
+    A crashed leader therefore never keeps the others from taking over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.held = False
+        self._file = None
+
+    def acquire(self):
+        """Take the lock without waiting; True if this process holds it."""
+        if self.held:
+            return True
+        if fcntl is None:
+            self.held = True
+            return True
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{os.getpid()}\n")
+        lock_file.flush()
+        self._file, self.held = lock_file, True
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self.held = False
+
+
+class CollectionCoordinator:
+    """Makes sure exactly one process collects, however many serve the API.
+
+    Every process competes for ``lock``; its holder is the leader and runs the collector
+    and the retention engine. Every ``relay_interval`` seconds the leader picks up servers
+    added or removed through other processes and publishes its changed system and Docker
+    snapshots to the server_snapshot table. The other processes are followers: they mirror
+    those snapshots into their own collector, Docker caches and live streams, read active
+    alerts from the alert table and retry the lock, so one of them takes over within an
+    interval if the leader exits.
+
+    Agents push to whichever process serves their request. A follower that ingests a batch
+    writes the batch out and the server's new snapshots to the table itself (``relay``); the
+    leader applies them like a follower would, and evaluates alerts on every system sample
+    the batch stored.
+    """
+
+    def __init__(self, relay_interval=5.0):
+        self.relay_interval = relay_interval
+        self.role = 'auto'
+        self.collect = True
+        self.retain = True
+        self.lock = None
+        self.is_leader = False
+        self._republish = False
+        self._app = None
+        self._published = {}  # (server ip, kind) -> version of the snapshot last published for it
+        self._applied = {}  # (server ip, kind) -> updated_at of the row last written or applied
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self._app = app
+        self.role = app.config.get('COLLECTOR_ROLE', self.role)
+        self.relay_interval = app.config.get('SNAPSHOT_RELAY_INTERVAL', self.relay_interval)
+        self.collect = app.config.get('COLLECTOR_ENABLED', True)
+        self.retain = app.config.get('RETENTION_ENABLED', True)
+        self.lock = LeaderLock(app.config.get('COLLECTOR_LOCK_FILE') or os.path.join(app.instance_path, 'collector.lock'))
+        app.extensions['collection_coordinator'] = self
+
+        if self.collect or self.retain:
+            # Started lazily so the werkzeug reloader's watcher process never collects
+            app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            if self.role != 'follower' and self.lock.acquire():
+                self._lead()
+            else:
+                self._follow()
+            self._thread = threading.Thread(target=self._run, name='collection-coordinator', daemon=True)
+            self._thread.start()
+
+    def begin_shutdown(self):
+        """End live streams, so a worker being stopped isn't kept waiting for them to close."""
+        broadcaster.close()
+
+    def stop(self):
+        """Stop collecting and relaying, write out buffered samples and give up the lock."""
+        self._stop.set()
+        broadcaster.close()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self.is_leader:
+            collector.stop()
+            retention_engine.stop()
+            self.is_leader = False
+        write_buffer.close()
+        docker_pool.close_all()
+        if self.lock is not None:
+            self.lock.release()
+
+    def _lead(self):
+        self.is_leader = True
+        self._published.clear()
+        self._applied.clear()
+        self._republish = True  # Also clears rows of servers a previous leader published
+        collector.store_samples = True
+        alert_engine.set_evaluating(True)
+        if self.collect:
+            collector.ensure_started()
+        if self.retain:
+            retention_engine.ensure_started()
+        log.info("Collecting in this process (pid %d)", os.getpid())
+
+    def _follow(self):
+        self.is_leader = False
+        collector.store_samples = False
+        alert_engine.set_evaluating(False)
+        log.info("Mirroring snapshots of the collecting process (pid %d)", os.getpid())
+
+    def _run(self):
+        while not self._stop.wait(self.relay_interval):
+            try:
+                if not self.is_leader and self.role != 'follower' and self.lock.acquire():
+                    self._lead()
+                with self._app.app_context():
+                    if self.is_leader:
+                        self.mirror(remove=False)  # snapshots relayed by followers
+                        self.publish()
+                    else:
+                        self.mirror()
+            except Exception as e:
+                log.warning("Error relaying collector snapshots: %s", e)
+
+    def publish(self):
+        """Write the snapshots that changed since the last call, and drop those of removed servers.
+
+        Like ``mirror``, runs inside an app context.
+        """
+        if not self.collect:
+            return
+        collector.sync_servers()
+        now = time.time()
+        rows, current = [], set()
+        for ip, (metrics, error) in collector.get_all_latest().items():
+            current.add((ip, SYSTEM_SNAPSHOT))
+            version = ((metrics or {}).get('timestamp'), error)
+            if self._published.get((ip, SYSTEM_SNAPSHOT)) != version and (metrics or error):
+                self._published[(ip, SYSTEM_SNAPSHOT)] = version
+                rows.append(snapshot_row(ip, SYSTEM_SNAPSHOT, metrics, error, now))
+        for ip, cache in docker_metrics_caches().items():
+            snapshot = cache.peek()
+            if snapshot is None:
+                continue
+            current.add((ip, DOCKER_SNAPSHOT))
+            if self._published.get((ip, DOCKER_SNAPSHOT)) != cache.snapshot_ts:
+                self._published[(ip, DOCKER_SNAPSHOT)] = cache.snapshot_ts
+                data = {'ts': cache.snapshot_ts, 'containers': snapshot}
+                rows.append(snapshot_row(ip, DOCKER_SNAPSHOT, data, None, now))
+        removed = self._published.keys() - current
+        for key in removed:
+            del self._published[key]
+            self._applied.pop(key, None)
+        t = ServerSnapshot.__table__
+        if self._republish:
+            removed |= {tuple(row) for row in read(select(t.c.server_ip, t.c.kind))} - current
+
+        if not rows and not removed:
+            return
+        try:
+            if rows:
+                db.session.execute(insert(t).prefix_with('OR REPLACE', dialect='sqlite'), rows)
+            for ip, kind in removed:
+                db.session.execute(delete(t).where(t.c.server_ip == ip, t.c.kind == kind))
+            db.session.commit()
+            self._republish = False
+        except Exception:
+            db.session.rollback()
+            self._published.clear()  # Republish everything next time
+            raise
+        for row in rows:
+            self._applied[(row['server_ip'], row['kind'])] = now
+
+    def relay(self, ip):
+        """Write the snapshots of a server whose agent pushed to this process, if it is a follower.
+
+        The leader publishes them on its next pass anyway. Runs in the caller's session.
+        """
+        if self.is_leader:
+            return
+        # Written out first, so the leader finds every sample of the batch to evaluate
+        write_buffer.flush()
+        now = time.time()
+        metrics, error = collector.get_all_latest().get(ip, (None, None))
+        rows = [snapshot_row(ip, SYSTEM_SNAPSHOT, metrics, error, now)] if metrics else []
+        cache = find_docker_metrics(ip)
+        if cache is not None and cache.peek() is not None:
+            data = {'ts': cache.snapshot_ts, 'containers': cache.peek()}
+            rows.append(snapshot_row(ip, DOCKER_SNAPSHOT, data, None, now))
+        if not rows:
+            return
+        db.session.execute(insert(ServerSnapshot.__table__).prefix_with('OR REPLACE', dialect='sqlite'), rows)
+        db.session.commit()
+        for row in rows:
+            self._applied[(ip, row['kind'])] = now
+
+    def mirror(self, remove=True):
+        """Apply the snapshots other processes wrote since the last call.
+
+        Followers apply the leader's, and with ``remove`` drop servers it no longer
+        publishes. The leader applies those followers relayed from agents, evaluating
+        alerts on them and marking them published so they aren't written back.
+        """
+        rows = read(select(ServerSnapshot.__table__))
+        current = set()
+        for row in rows:
+            key = (row.server_ip, row.kind)
+            current.add(key)
+            if self._applied.get(key) == row.updated_at:
+                continue
+            self._applied[key] = row.updated_at
+            data = json.loads(row.data) if row.data else None
+            if row.kind == SYSTEM_SNAPSHOT:
+                pushed = data is not None and data.get('source') == 'agent'
+                collector.mirror(row.server_ip, data, row.error, pushed_at=row.updated_at if pushed else None)
+                if self.is_leader:
+                    self._published[key] = ((data or {}).get('timestamp'), row.error)
+                    if pushed:
+                        self._evaluate(row.server_ip, data)
+            elif row.kind == DOCKER_SNAPSHOT and data:
+                docker_metrics_for(row.server_ip).mirror(data['containers'], data['ts'])
+                if self.is_leader:
+                    self._published[key] = data['ts']
+
+        if not remove:
+            return
+        for ip, kind in self._applied.keys() - current:
+            del self._applied[(ip, kind)]
+            if kind == SYSTEM_SNAPSHOT:
+                collector.remove_server(ip)
+            else:
+                drop_docker_metrics(ip)
+
+    def _evaluate(self, ip, metrics):
+        """Check every system sample stored for ``ip`` since the last one evaluated, up to ``metrics``.
+
+        A relayed snapshot is only the newest sample of its batch; the others are read back
+        from metric_sample, which the follower flushed before relaying. With nothing evaluated
+        for ``ip`` yet, samples are read back at most AGENT_PUSH_TIMEOUT seconds.
+        """
+        until = int(datetime.fromisoformat(metrics['timestamp']).timestamp())
+        since = alert_engine.evaluated_ts(ip)
+        if since is None:
+            since = until - self._app.config.get('AGENT_PUSH_TIMEOUT', 60)
+        t = MetricSample.__table__
+        rows = read(
+            select(t).where(t.c.server_ip == ip, t.c.metric_name == 'system', t.c.ts > since, t.c.ts <= until)
+            .order_by(t.c.ts)
+        )
+        for row in rows:
+            alert_engine.evaluate(dict(row._mapping))
+        if not rows or rows[-1].ts < until:
+            # The follower's flush failed; the snapshot is all there is to go on
+            sample, _ = system_sample_rows(ip, metrics, until, get_root_disk_percent(metrics))
+            alert_engine.evaluate(sample)
+
+
+def snapshot_row(ip, kind, data, error, updated_at):
+    return {
+        'server_ip': ip,
+        'kind': kind,
+        'data': json.dumps(data) if data is not None else None,
+        'error': error,
+        'updated_at': updated_at,
+    }
+
+
+coordinator = CollectionCoordinator()
+
+
+@click.command('collect')
+@with_appcontext
+def collect_command():
+    """Collect in the foreground without serving the API, e.g. as a sidecar.
+
+    Pair with web workers started with COLLECTOR_ROLE=follower. If another process is
+    collecting, this one waits to take over. Stops on SIGTERM or Ctrl+C, flushing buffered
+    samples first.
+    """
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stopping.set())
+
+    coordinator.role = 'auto'
+    coordinator.ensure_started()
+    if not coordinator.is_leader:
+        click.echo(f"Another process holds {coordinator.lock.path}; waiting to take over")
+    while not stopping.wait(1):
+        pass
+    coordinator.stop()
+    click.echo(f"Collector stopped ({len(write_buffer)} rows left unwritten)")
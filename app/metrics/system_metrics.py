@@ -1,7 +1,15 @@
-from datetime import datetime
+import logging
+import threading
 import psutil
 import requests
-from app.models.database import Metric, db
+from requests.adapters import HTTPAdapter
+
+from app.instrumentation import phase
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_REMOTE_TIMEOUT = (2, 5)  # (connect, read) seconds
 
 def convert_bytes(num_bytes):
     """Convert bytes to human readable format."""
@@ -12,66 +20,144 @@ def convert_bytes(num_bytes):
         num_bytes /= 1024.0
     return f"{num_bytes:.2f}"  # Return just the number
 
-def get_system_metrics(current_server_ip):
+def _busy_and_total(times):
+    """Split a cpu_times reading into busy and total jiffies, the way psutil.cpu_percent does."""
+    total = sum(times)
+    # guest time is already accounted for in user/nice on Linux
+    total -= getattr(times, 'guest', 0) + getattr(times, 'guest_nice', 0)
+    idle = times.idle + getattr(times, 'iowait', 0)
+    return total - idle, total
+
+def _busy_percent(previous, current):
+    busy, total = _busy_and_total(current)
+    if previous is not None:
+        prev_busy, prev_total = _busy_and_total(previous)
+        busy, total = busy - prev_busy, total - prev_total
+    if total <= 0:
+        return 0.0
+    return round(min(max(busy / total * 100, 0.0), 100.0), 1)
+
+class CpuSampler:
+    """Non-blocking CPU utilisation computed from the delta between consecutive cpu_times readings.
+
+    The first sample has no previous reading and reports the average since boot.
+    """
+
+    def __init__(self):
+        self._previous = None
+        self._previous_per_cpu = None
+        self._lock = threading.Lock()
+
+    def sample(self):
+        current = psutil.cpu_times()
+        current_per_cpu = psutil.cpu_times(percpu=True)
+        with self._lock:
+            previous, previous_per_cpu = self._previous, self._previous_per_cpu
+            self._previous, self._previous_per_cpu = current, current_per_cpu
+
+        if previous_per_cpu is None or len(previous_per_cpu) != len(current_per_cpu):
+            previous_per_cpu = [None] * len(current_per_cpu)
+        per_core = [_busy_percent(p, c) for p, c in zip(previous_per_cpu, current_per_cpu)]
+        return _busy_percent(previous, current), per_core
+
+cpu_sampler = CpuSampler()
+
+def get_load_average():
+    try:
+        return [round(load, 2) for load in psutil.getloadavg()]
+    except (AttributeError, OSError):
+        return None
+
+def _create_session(pool_size=DEFAULT_POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Shared keep-alive pool so polling a remote server reuses its connection
+remote_session = _create_session()
+
+def configure_remote_session(pool_size):
+    """Resize the shared connection pool, e.g. to match the collector's concurrency."""
+    global remote_session
+    remote_session = _create_session(pool_size)
+
+def get_remote_metrics(ip, timeout=DEFAULT_REMOTE_TIMEOUT):
+    """Fetch the latest metrics a remote Metricly instance has collected about itself."""
+    response = remote_session.get(
+        f"http://{ip}:5000/api/system",
+        params={'server': '127.0.0.1'},
+        timeout=timeout
+    )
+    if not response.ok:
+        raise Exception(f"Failed to fetch metrics from remote server: {response.status_code} {response.reason}")
+    return response.json()
+
+def get_system_metrics(current_server_ip, cpu_interval=None, timeout=DEFAULT_REMOTE_TIMEOUT):
+    """Collect system metrics for a server.
+
+    For localhost, CPU usage comes from the delta sampler unless ``cpu_interval`` is given,
+    in which case psutil blocks for that many seconds to measure it.
+    """
     try:
         # If it's localhost, use psutil directly
         if current_server_ip == "127.0.0.1":
-            system_metrics = {
-                'cpu_percent': psutil.cpu_percent(interval=1),
-                'cpu_count': psutil.cpu_count(),
-                'memory_info': {
-                    'total': float(psutil.virtual_memory().total),
-                    'available': float(psutil.virtual_memory().available),
-                    'percent': psutil.virtual_memory().percent,
-                    'used': float(psutil.virtual_memory().used),
-                    'free': float(psutil.virtual_memory().free)
-                },
-                'disk_usage': {}
-            }
-
-            # Get all disk partitions
-            for partition in psutil.disk_partitions():
-                try:
-                    usage = psutil.disk_usage(partition.mountpoint)
-                    system_metrics['disk_usage'][partition.mountpoint] = {
-                        'total': float(usage.total),
-                        'used': float(usage.used),
-                        'free': float(usage.free),
-                        'percent': usage.percent
-                    }
-                except Exception as e:
-                    print(f"Error getting disk usage for {partition.mountpoint}: {e}")
-                    continue
+            with phase('psutil_sample'):
+                system_metrics = _local_metrics(cpu_interval)
         else:
-            # For remote servers, fetch metrics from their API
-            response = requests.get(f"http://{current_server_ip}:5000/api/system", timeout=5)
-            if not response.ok:
-                raise Exception(f"Failed to fetch metrics from remote server: {response.status_text}")
-            system_metrics = response.json()
-
-        # Get root partition disk usage percentage
-        root_disk_percent = next(
-            (usage['percent'] for mount, usage in system_metrics['disk_usage'].items() if mount == '/'),
-            system_metrics['disk_usage'].get(list(system_metrics['disk_usage'].keys())[0], {}).get('percent', 0)
-            if system_metrics['disk_usage'] else 0
-        )
-
-        # Store metric in database
-        new_metric = Metric(
-            metric_name='system',
-            metric_value=system_metrics['cpu_percent'],
-            memory_percent=system_metrics['memory_info']['percent'],
-            disk_percent=root_disk_percent,
-            memory_info=system_metrics['memory_info'],
-            disk_usage=system_metrics['disk_usage'],
-            timestamp=datetime.now(),
-            server_ip=current_server_ip
-        )
-
-        db.session.add(new_metric)
-        db.session.commit()
+            with phase('remote_fetch'):
+                system_metrics = get_remote_metrics(current_server_ip, timeout=timeout)
 
         return system_metrics
     except Exception as e:
-        print(f"Error collecting system metrics: {str(e)}")
+        log.debug("Error collecting system metrics for %s: %s", current_server_ip, e)
         raise
+
+def _local_metrics(cpu_interval):
+    """Sample this host with psutil."""
+    if cpu_interval:
+        cpu_percent = psutil.cpu_percent(interval=cpu_interval)
+        cpu_per_core = psutil.cpu_percent(percpu=True)
+    else:
+        cpu_percent, cpu_per_core = cpu_sampler.sample()
+
+    memory = psutil.virtual_memory()
+    system_metrics = {
+        'cpu_percent': cpu_percent,
+        'cpu_per_core': cpu_per_core,
+        'cpu_count': len(cpu_per_core),
+        'load_average': get_load_average(),
+        'memory_info': {
+            'total': float(memory.total),
+            'available': float(memory.available),
+            'percent': memory.percent,
+            'used': float(memory.used),
+            'free': float(memory.free)
+        },
+        'disk_usage': {}
+    }
+
+    # Get all disk partitions
+    for partition in psutil.disk_partitions():
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+            system_metrics['disk_usage'][partition.mountpoint] = {
+                'total': float(usage.total),
+                'used': float(usage.used),
+                'free': float(usage.free),
+                'percent': usage.percent
+            }
+        except Exception as e:
+            log.warning("Error getting disk usage for %s: %s", partition.mountpoint, e)
+            continue
+    return system_metrics
+
+def get_root_disk_percent(system_metrics):
+    """Return the root partition usage, falling back to the first mount reported."""
+    disk_usage = system_metrics.get('disk_usage') or {}
+    if '/' in disk_usage:
+        return disk_usage['/'].get('percent', 0)
+    if disk_usage:
+        return next(iter(disk_usage.values())).get('percent', 0)
+    return 0
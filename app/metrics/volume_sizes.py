@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.instrumentation import phase
+
+log = logging.getLogger(__name__)
+
+
+class _DirNode:
+    __slots__ = ('mtime_ns', 'files_size', 'subdirs')
+
+    def __init__(self, mtime_ns, files_size, subdirs):
+        self.mtime_ns = mtime_ns
+        self.files_size = files_size
+        self.subdirs = subdirs
+
+
+class VolumeSizeCache:
+    """Directory sizes computed in the background and served from cache.
+
+    ``get`` always returns immediately with the last known size (None before the first scan
+    completes) and queues a rescan once the cached value is older than ``ttl`` seconds.
+
+    With ``mtime_check`` enabled, a rescan only lists and stats files in directories whose
+    mtime changed since the previous scan. A directory's mtime changes when entries are
+    added, removed or renamed, but not when an existing file grows, so a full rescan is
+    still forced every ``full_rescan_interval`` seconds to pick up in-place writes.
+    """
+
+    def __init__(self, ttl=60.0, full_rescan_interval=3600.0, mtime_check=True, max_workers=2):
+        self.ttl = ttl
+        self.full_rescan_interval = full_rescan_interval
+        self.mtime_check = mtime_check
+        self.max_workers = max_workers
+        self._sizes = {}  # path -> (size in bytes, scanned_at, last_full_scan_at)
+        self._trees = {}  # path -> {directory: _DirNode} from the last scan
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get(self, path):
+        """Return the last known size of ``path`` in bytes, scheduling a rescan if it is stale."""
+        cached = self._sizes.get(path)
+        if cached is None or time.monotonic() - cached[1] > self.ttl:
+            self._schedule(path)
+        return cached[0] if cached is not None else None
+
+    def _schedule(self, path):
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='volume-size'
+                )
+            self._executor.submit(self._refresh, path)
+
+    def _refresh(self, path):
+        try:
+            now = time.monotonic()
+            cached = self._sizes.get(path)
+            full = (
+                not self.mtime_check or cached is None
+                or now - cached[2] > self.full_rescan_interval
+            )
+            with phase('volume_sizing'):
+                size, tree = scan_directory(path, None if full else self._trees.get(path))
+            self._trees[path] = tree
+            self._sizes[path] = (size, now, now if full else cached[2])
+        except Exception as e:
+            log.warning("Error calculating directory size for %s: %s", path, e)
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+
+def scan_directory(root, previous=None):
+    """Sum the size of every regular file under ``root`` using ``os.scandir``.
+
+    ``previous`` is the directory map returned by an earlier scan; directories whose mtime
+    is unchanged reuse their recorded file total and subdirectories instead of being listed.
+    Returns ``(total_bytes, directory_map)``.
+    """
+    previous = previous or {}
+    tree = {}
+    total = 0
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+        except OSError:
+            continue
+
+        node = previous.get(path)
+        if node is None or node.mtime_ns != mtime_ns:
+            files_size = 0
+            subdirs = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                files_size += entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            node = _DirNode(mtime_ns, files_size, tuple(subdirs))
+
+        tree[path] = node
+        total += node.files_size
+        stack.extend(node.subdirs)
+    return total, tree
+
+
+volume_size_cache = VolumeSizeCache()
@@ -2,37 +2,86 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 import datetime
 from sqlalchemy import UniqueConstraint
+from sqlalchemy.orm import declared_attr
 
 db = SQLAlchemy()
 
-# ✅ Metrics Model
-class Metric(db.Model):
-    __tablename__ = 'metric'
-    
-    m_id = db.Column('m_id', db.Integer, primary_key=True)
-    metric_name = db.Column('metric_name', db.String(50), nullable=False)
-    metric_value = db.Column('metric_value', db.Float, nullable=False)  # CPU percentage
-    memory_percent = db.Column('memory_percent', db.Float, nullable=True)  # Memory percentage
-    disk_percent = db.Column('disk_percent', db.Float, nullable=True)  # Disk percentage
-    memory_info = db.Column('memory_info', db.JSON, nullable=True)  # Full memory info
-    disk_usage = db.Column('disk_usage', db.JSON, nullable=True)  # Full disk info
-    timestamp = db.Column('timestamp', db.DateTime, nullable=False)
-    server_ip = db.Column('server_ip', db.String(15), db.ForeignKey('server.ip_address'), nullable=False)
-    server = db.relationship('Server', backref='metrics')
-
-    # ✅ Convert SQLAlchemy Object to Dictionary
-    def to_dict(self):
-        return {
-            "m_id": self.m_id,
-            "metric_name": self.metric_name,
-            "cpu_percent": self.metric_value,
-            "memory_percent": self.memory_percent,
-            "disk_percent": self.disk_percent,
-            "memory_info": self.memory_info,
-            "disk_usage": self.disk_usage,
-            "timestamp": self.timestamp.isoformat(),  # ✅ Convert datetime to string
-            "server_ip": self.server_ip
-        }
+# ✅ Time-series sample: one narrow row per server, series and timestamp.
+# metric_name is 'system' for host samples or 'docker_<container>' for containers.
+class MetricSample(db.Model):
+    __tablename__ = 'metric_sample'
+    # History reads are served by the clustered primary key; ts alone is for expiry
+    __table_args__ = (
+        db.Index('ix_metric_sample_ts', 'ts'),
+        {'sqlite_with_rowid': False},
+    )
+
+    server_ip = db.Column('server_ip', db.String(45), primary_key=True)
+    metric_name = db.Column('metric_name', db.String(255), primary_key=True)
+    ts = db.Column('ts', db.Integer, primary_key=True, autoincrement=False)  # Unix epoch seconds
+    cpu_percent = db.Column('cpu_percent', db.Float, nullable=False)
+    memory_percent = db.Column('memory_percent', db.Float, nullable=True)
+    memory_used = db.Column('memory_used', db.Float, nullable=True)  # Bytes
+    memory_total = db.Column('memory_total', db.Float, nullable=True)  # Bytes (container limit for docker)
+    memory_available = db.Column('memory_available', db.Float, nullable=True)
+    memory_free = db.Column('memory_free', db.Float, nullable=True)
+    disk_percent = db.Column('disk_percent', db.Float, nullable=True)  # Root partition percentage
+
+    def __repr__(self):
+        return f'<MetricSample {self.server_ip} {self.metric_name} {self.ts}>'
+
+# ✅ Per-mount disk usage, recorded alongside each system sample
+class DiskSample(db.Model):
+    __tablename__ = 'disk_sample'
+    __table_args__ = (
+        db.Index('ix_disk_sample_ts', 'ts'),
+        {'sqlite_with_rowid': False},
+    )
+
+    server_ip = db.Column('server_ip', db.String(45), primary_key=True)
+    ts = db.Column('ts', db.Integer, primary_key=True, autoincrement=False)
+    mount = db.Column('mount', db.String(255), primary_key=True)
+    total = db.Column('total', db.Float, nullable=False)
+    used = db.Column('used', db.Float, nullable=False)
+    free = db.Column('free', db.Float, nullable=False)
+    percent = db.Column('percent', db.Float, nullable=False)
+
+# ✅ Rollups: min/avg/max of metric_sample per server, series and bucket.
+# ts is the bucket start; count is the number of raw samples folded into the bucket.
+class RollupColumns:
+    server_ip = db.Column('server_ip', db.String(45), primary_key=True)
+    metric_name = db.Column('metric_name', db.String(255), primary_key=True)
+    ts = db.Column('ts', db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column('count', db.Integer, nullable=False)
+    cpu_min = db.Column('cpu_min', db.Float, nullable=False)
+    cpu_avg = db.Column('cpu_avg', db.Float, nullable=False)
+    cpu_max = db.Column('cpu_max', db.Float, nullable=False)
+    memory_min = db.Column('memory_min', db.Float, nullable=True)
+    memory_avg = db.Column('memory_avg', db.Float, nullable=True)
+    memory_max = db.Column('memory_max', db.Float, nullable=True)
+    memory_used_min = db.Column('memory_used_min', db.Float, nullable=True)
+    memory_used_avg = db.Column('memory_used_avg', db.Float, nullable=True)
+    memory_used_max = db.Column('memory_used_max', db.Float, nullable=True)
+    memory_total = db.Column('memory_total', db.Float, nullable=True)
+    disk_min = db.Column('disk_min', db.Float, nullable=True)
+    disk_avg = db.Column('disk_avg', db.Float, nullable=True)
+    disk_max = db.Column('disk_max', db.Float, nullable=True)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            db.Index(f'ix_{cls.__tablename__}_ts', 'ts'),
+            {'sqlite_with_rowid': False},
+        )
+
+class MetricRollup1m(RollupColumns, db.Model):
+    __tablename__ = 'metric_rollup_1m'
+
+class MetricRollup15m(RollupColumns, db.Model):
+    __tablename__ = 'metric_rollup_15m'
+
+class MetricRollup1h(RollupColumns, db.Model):
+    __tablename__ = 'metric_rollup_1h'
 
 # ✅ Server Model
 class Server(db.Model):
@@ -76,6 +125,7 @@ class Threshold(db.Model):
     cpu_threshold = db.Column('cpu_threshold', db.Float, default=80)
     memory_threshold = db.Column('memory_threshold', db.Float, default=80)
     disk_threshold = db.Column('disk_threshold', db.Float, default=80)
+    duration_seconds = db.Column('duration_seconds', db.Integer, nullable=False, default=0, server_default='0')  # How long a breach must last
     created_at = db.Column('created_at', db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column('updated_at', db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -84,6 +134,57 @@ class Threshold(db.Model):
             'cpu': self.cpu_threshold,
             'memory': self.memory_threshold,
             'disk': self.disk_threshold,
+            'duration': self.duration_seconds or 0,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+
+# ✅ Threshold alerts raised by the alert engine; resolved_at stays NULL while the alert is active.
+# started_at is when the breach began, fired_at when it had lasted the threshold's duration.
+class Alert(db.Model):
+    __tablename__ = 'alert'
+    __table_args__ = (
+        db.Index('ix_alert_server_ip_started_at', 'server_ip', 'started_at'),
+        db.Index('ix_alert_started_at', 'started_at'),
+    )
+
+    id = db.Column('id', db.Integer, primary_key=True)
+    server_ip = db.Column('server_ip', db.String(45), nullable=False)
+    metric = db.Column('metric', db.String(16), nullable=False)  # cpu, memory or disk
+    threshold = db.Column('threshold', db.Float, nullable=False)
+    duration_seconds = db.Column('duration_seconds', db.Integer, nullable=False, default=0)
+    value = db.Column('value', db.Float, nullable=False)  # Value of the sample that fired it
+    peak = db.Column('peak', db.Float, nullable=False)
+    started_at = db.Column('started_at', db.Integer, nullable=False)  # Unix epoch seconds
+    fired_at = db.Column('fired_at', db.Integer, nullable=False)
+    resolved_at = db.Column('resolved_at', db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f'<Alert {self.server_ip} {self.metric} {self.started_at}>'
+
+# ✅ Latest snapshot of each server, published by the collecting process for the others.
+# kind is 'system' (the collector's metrics dict) or 'docker' (the container list and its timestamp)
+class ServerSnapshot(db.Model):
+    __tablename__ = 'server_snapshot'
+
+    server_ip = db.Column('server_ip', db.String(45), primary_key=True)
+    kind = db.Column('kind', db.String(16), primary_key=True)
+    data = db.Column('data', db.Text, nullable=True)  # JSON, NULL while the server only has an error
+    error = db.Column('error', db.Text, nullable=True)
+    updated_at = db.Column('updated_at', db.Float, nullable=False)  # Unix epoch seconds, when published
+
+    def __repr__(self):
+        return f'<ServerSnapshot {self.server_ip} {self.kind}>'
+
+# ✅ Spans of raw samples that arrived after their buckets were already rolled up, e.g. from
+# an agent's spool. The retention engine re-folds them into every tier and deletes the row
+class RollupBackfill(db.Model):
+    __tablename__ = 'rollup_backfill'
+
+    id = db.Column('id', db.Integer, primary_key=True)
+    start_ts = db.Column('start_ts', db.Integer, nullable=False)  # Unix epoch seconds
+    end_ts = db.Column('end_ts', db.Integer, nullable=False)  # inclusive
+    requested_at = db.Column('requested_at', db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<RollupBackfill {self.start_ts}-{self.end_ts}>'
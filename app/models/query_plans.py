@@ -0,0 +1,96 @@
+"""EXPLAIN QUERY PLAN checks for the history queries.
+
+Each history query is run once with its SQL captured, then re-run under
+``EXPLAIN QUERY PLAN``. A query passes when every step that touches a sample table
+is an index ``SEARCH`` and SQLite does not need a temporary b-tree to sort the rows.
+Downsampled queries may still group through a temporary b-tree, which only holds
+one entry per bucket and already yields rows in bucket order.
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from app.models.sqlite_tuning import history_engine
+from app.models.timeseries import (
+    get_container_history,
+    get_container_history_buckets,
+    get_system_history,
+    get_system_history_buckets,
+    bucket_rows,
+    ROLLUP_TIERS,
+)
+
+SAMPLE_TABLES = ('metric_sample', 'disk_sample', 'metric_rollup_')
+
+HISTORY_QUERIES = [
+    ('system history', get_system_history, ('127.0.0.1', 0), {}),
+    ('system history with disks', get_system_history, ('127.0.0.1', 0), {'include_disks': True}),
+    ('container history', get_container_history, ('127.0.0.1', 'metricly', 0), {}),
+    ('system history buckets', get_system_history_buckets, ('127.0.0.1', 0, 60), {'include_disks': True}),
+    ('container history buckets', get_container_history_buckets, ('127.0.0.1', 'metricly', 0, 60), {}),
+] + [
+    (f'{tier.name} rollup buckets', bucket_rows,
+     (tier.table, '127.0.0.1', 'system', 0, 3600, tier.resolution), {})
+    for tier in ROLLUP_TIERS
+]
+
+
+def capture_statements(fn, *args, **kwargs):
+    """Run ``fn`` and return the ``(statement, parameters)`` pairs it sent to the database."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = history_engine()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn(*args, **kwargs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def explain(statement, parameters):
+    """Return the detail column of each EXPLAIN QUERY PLAN step."""
+    with history_engine().connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in rows]
+
+
+def plan_problems(plan):
+    problems = []
+    for step in plan:
+        touches_samples = any(table in step for table in SAMPLE_TABLES)
+        if touches_samples and not step.startswith('SEARCH'):
+            problems.append(f"full scan: {step}")
+        if 'TEMP B-TREE FOR ORDER BY' in step:
+            problems.append(f"sort without index: {step}")
+    return problems
+
+
+def check_query_plans():
+    """Return ``(name, plan, problems)`` for every statement issued by the history queries."""
+    results = []
+    for name, fn, args, kwargs in HISTORY_QUERIES:
+        for statement, parameters in capture_statements(fn, *args, **kwargs):
+            plan = explain(statement, parameters)
+            results.append((name, plan, plan_problems(plan)))
+    return results
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """Fail if a history query scans a sample table instead of using an index."""
+    failed = False
+    for name, plan, problems in check_query_plans():
+        status = 'FAIL' if problems else 'ok'
+        click.echo(f"[{status}] {name}")
+        for step in plan:
+            click.echo(f"    {step}")
+        for problem in problems:
+            click.echo(f"    -> {problem}")
+        failed = failed or bool(problems)
+    if failed:
+        raise SystemExit(1)
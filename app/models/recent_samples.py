@@ -0,0 +1,188 @@
+import math
+import threading
+from array import array
+from collections import namedtuple
+
+# Value columns of a metric_sample row, in storage order
+VALUE_COLUMNS = (
+    'cpu_percent', 'memory_percent', 'memory_used', 'memory_total',
+    'memory_available', 'memory_free', 'disk_percent',
+)
+
+SampleRow = namedtuple('SampleRow', ('ts',) + VALUE_COLUMNS)
+
+# Rollup column name -> raw column it aggregates, as in timeseries.aggregate_columns
+AGGREGATED = {'cpu': 'cpu_percent', 'memory': 'memory_percent', 'memory_used': 'memory_used', 'disk': 'disk_percent'}
+
+BucketRow = namedtuple('BucketRow', ['bucket_ts', 'count', 'memory_total'] + [
+    f'{name}_{stat}' for name in AGGREGATED for stat in ('min', 'avg', 'max')
+])
+
+NAN = float('nan')
+
+
+class SeriesRing:
+    """Fixed-capacity ring of one series' samples, one flat array per column.
+
+    Missing values are stored as NaN. Samples must arrive in timestamp order; a sample
+    for the newest timestamp replaces it and older ones are ignored.
+    """
+
+    __slots__ = ('capacity', 'ts', 'values', 'head', 'size')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = array('q', bytes(8 * capacity))
+        self.values = [array('d', bytes(8 * capacity)) for _ in VALUE_COLUMNS]
+        self.head = 0  # index the next sample is written to
+        self.size = 0
+
+    def _index(self, i):
+        """Physical index of the ``i``-th oldest sample."""
+        return (self.head - self.size + i) % self.capacity
+
+    def newest(self):
+        return self.ts[self._index(self.size - 1)] if self.size else None
+
+    def oldest(self):
+        return self.ts[self._index(0)] if self.size else None
+
+    def append(self, ts, row):
+        newest = self.newest()
+        if newest is not None and ts < newest:
+            return False
+        if newest is not None and ts == newest:
+            slot = self._index(self.size - 1)
+        else:
+            slot = self.head
+            self.head = (self.head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+        self.ts[slot] = ts
+        for column, name in zip(self.values, VALUE_COLUMNS):
+            value = row.get(name)
+            column[slot] = NAN if value is None else value
+        return True
+
+    def rows(self, start_ts, end_ts=None):
+        """``SampleRow``s with ``start_ts <= ts < end_ts``, oldest first."""
+        # Binary search for the first sample at or after start_ts
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._index(mid)] < start_ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        for i in range(lo, self.size):
+            slot = self._index(i)
+            ts = self.ts[slot]
+            if end_ts is not None and ts >= end_ts:
+                break
+            result.append(SampleRow(ts, *(
+                None if math.isnan(column[slot]) else column[slot] for column in self.values
+            )))
+        return result
+
+    def nbytes(self):
+        return self.ts.itemsize * len(self.ts) + sum(c.itemsize * len(c) for c in self.values)
+
+
+class RecentSamples:
+    """Per-server, per-series ring buffers holding the last ``window`` seconds of raw samples.
+
+    Rings are sized from the collection interval, so memory is fixed per series, and at
+    most ``max_series`` series are kept; samples for any further series are only stored
+    in the database. Readers get the span a ring covers and go to the database for anything older.
+    """
+
+    def __init__(self, window=3600, interval=5.0, max_series=1000):
+        self.window = window
+        self.interval = interval
+        self.max_series = max_series
+        self.rejected = 0
+        self._rings = {}  # (server_ip, metric_name) -> SeriesRing
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.window = app.config.get('RING_BUFFER_SECONDS', self.window)
+        self.interval = app.config.get('COLLECTION_INTERVAL', self.interval)
+        self.max_series = app.config.get('RING_BUFFER_MAX_SERIES', self.max_series)
+        app.extensions['recent_samples'] = self
+
+    @property
+    def capacity(self):
+        # A little headroom so jitter never pushes the window's oldest sample out
+        return max(int(math.ceil(self.window / self.interval * 1.1)), 1) if self.window > 0 else 0
+
+    def add(self, samples):
+        """Append metric_sample row dicts (as built by ``system_sample_rows``) to their rings."""
+        if not self.capacity:
+            return
+        with self._lock:
+            for sample in samples:
+                key = (sample['server_ip'], sample['metric_name'])
+                ring = self._rings.get(key)
+                if ring is None:
+                    if len(self._rings) >= self.max_series:
+                        self.rejected += 1
+                        continue
+                    ring = self._rings[key] = SeriesRing(self.capacity)
+                ring.append(sample['ts'], sample)
+
+    def discard(self, server_ip):
+        with self._lock:
+            for key in [key for key in self._rings if key[0] == server_ip]:
+                del self._rings[key]
+
+    def covered_from(self, server_ip, metric_name):
+        """Oldest buffered timestamp of a series, or None when nothing is buffered for it."""
+        with self._lock:
+            ring = self._rings.get((server_ip, metric_name))
+            return ring.oldest() if ring is not None else None
+
+    def rows(self, server_ip, metric_name, start_ts, end_ts=None):
+        """Return ``(covered_from, rows)``: the buffered rows in range and the oldest buffered ts.
+
+        ``covered_from`` is None when nothing is buffered for the series; rows before it
+        have to come from the database.
+        """
+        with self._lock:
+            ring = self._rings.get((server_ip, metric_name))
+            if ring is None or not ring.size:
+                return None, []
+            return ring.oldest(), ring.rows(start_ts, end_ts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'series': len(self._rings),
+                'max_series': self.max_series,
+                'capacity_per_series': self.capacity,
+                'samples': sum(ring.size for ring in self._rings.values()),
+                'memory_bytes': sum(ring.nbytes() for ring in self._rings.values()),
+                'rejected_samples': self.rejected,
+            }
+
+
+def aggregate(rows, bucket):
+    """Fold ``SampleRow``s into ``BucketRow``s the way ``aggregate_columns`` does for raw samples."""
+    buckets = {}
+    for row in rows:
+        buckets.setdefault(row.ts // bucket * bucket, []).append(row)
+
+    result = []
+    for bucket_ts, members in sorted(buckets.items()):
+        fields = {'bucket_ts': bucket_ts, 'count': len(members)}
+        totals = [row.memory_total for row in members if row.memory_total is not None]
+        fields['memory_total'] = max(totals) if totals else None
+        for name, column in AGGREGATED.items():
+            values = [getattr(row, column) for row in members if getattr(row, column) is not None]
+            fields[f'{name}_min'] = min(values) if values else None
+            fields[f'{name}_avg'] = sum(values) / len(values) if values else None
+            fields[f'{name}_max'] = max(values) if values else None
+        result.append(BucketRow(**fields))
+    return result
+
+
+recent_samples = RecentSamples()
@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import func, insert, select
+
+from app.instrumentation import phase
+from app.models.database import DiskSample, RollupBackfill, db
+from app.models.timeseries import (
+    RAW_TIER,
+    ROLLUP_TIERS,
+    aggregate_columns,
+    rollup_watermark,
+    tier_retention,
+)
+
+log = logging.getLogger(__name__)
+
+# Largest span of source rows folded or deleted per transaction, to keep writer locks short
+CHUNK_SECONDS = 6 * 3600
+
+
+class RetentionEngine:
+    """Rolls raw samples up into the 1m/15m/1h tiers and expires data past each tier's retention.
+
+    Each pass folds every complete bucket newer than a tier's newest rollup from the tier
+    below it, then deletes rows older than the tier's retention window. A tier is never
+    expired past what the next tier has already rolled up, so no data is dropped before
+    it has been summarised.
+
+    Raw samples stored behind a tier's watermark (pushed late by an agent) are never
+    folded by that; ``request_backfill`` records their span and the next pass rolls it up
+    again in every tier.
+    """
+
+    def __init__(self, interval=60.0, grace=60):
+        self.interval = interval
+        self.grace = grace
+        self._app = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.interval = app.config.get('RETENTION_INTERVAL', self.interval)
+        self.grace = app.config.get('ROLLUP_GRACE_SECONDS', self.grace)
+        app.extensions['retention_engine'] = self
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='retention-engine', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def run_once(self, now=None):
+        now = int(now or time.time())
+        self.backfill(now)
+        self.roll_up(now)
+        self.expire(now)
+
+    def roll_up(self, now):
+        # Raw samples may still arrive for the last few seconds, so stop `grace` short of now
+        source, source_end = RAW_TIER, now - self.grace
+        for tier in ROLLUP_TIERS:
+            end = source_end // tier.resolution * tier.resolution
+            start = rollup_watermark(tier)
+            if start is None:
+                first = db.session.execute(select(func.min(source.table.c.ts))).scalar()
+                start = None if first is None else first // tier.resolution * tier.resolution
+
+            if start is not None:
+                chunk = max(CHUNK_SECONDS // tier.resolution, 1) * tier.resolution
+                while start < end:
+                    chunk_end = min(start + chunk, end)
+                    self._fold(source.table, tier, start, chunk_end)
+                    db.session.commit()
+                    start = chunk_end
+
+            source, source_end = tier, rollup_watermark(tier) or 0
+
+    def request_backfill(self, start_ts, end_ts, now=None):
+        """Have raw samples in ``[start_ts, end_ts]`` rolled up again if they may be behind the rollups.
+
+        Runs in the caller's session and commits it.
+        """
+        now = int(now or time.time())
+        # Anything older than `grace` may be rolled up before the write buffer stores it
+        if start_ts >= now - self.grace or rollup_watermark(ROLLUP_TIERS[0]) is None:
+            return False
+        db.session.add(RollupBackfill(start_ts=int(start_ts), end_ts=int(end_ts), requested_at=now))
+        db.session.commit()
+        return True
+
+    def backfill(self, now):
+        """Fold the spans requested at least ``grace`` seconds ago into every tier again."""
+        t = RollupBackfill.__table__
+        requests = db.session.execute(
+            select(t.c.id, t.c.start_ts, t.c.end_ts).where(t.c.requested_at <= now - self.grace)
+        ).all()
+        if not requests:
+            return
+
+        # Merge spans that share an hour bucket, so each bucket is folded once per pass
+        coarsest = ROLLUP_TIERS[-1].resolution
+        spans = []
+        for _, start, end in sorted(requests, key=lambda request: request.start_ts):
+            if spans and start < spans[-1][1] + coarsest:
+                spans[-1][1] = max(spans[-1][1], end + 1)
+            else:
+                spans.append([start, end + 1])
+
+        for span_start, span_end in spans:
+            source = RAW_TIER
+            for tier in ROLLUP_TIERS:
+                watermark = rollup_watermark(tier)
+                if watermark is None:
+                    break
+                # Whole buckets only, and none past the watermark: roll_up folds those
+                start = span_start // tier.resolution * tier.resolution
+                end = min(-(-span_end // tier.resolution) * tier.resolution, watermark)
+                chunk = max(CHUNK_SECONDS // tier.resolution, 1) * tier.resolution
+                while start < end:
+                    chunk_end = min(start + chunk, end)
+                    self._fold(source.table, tier, start, chunk_end)
+                    db.session.commit()
+                    start = chunk_end
+                source = tier
+
+        db.session.execute(t.delete().where(t.c.id.in_([request.id for request in requests])))
+        db.session.commit()
+        log.info("Rolled up %d late span(s) again", len(spans))
+
+    def _fold(self, source, tier, start, end):
+        columns = aggregate_columns(source)
+        bucket_ts = (source.c.ts // tier.resolution * tier.resolution).label('ts')
+        query = (
+            select(source.c.server_ip, source.c.metric_name, bucket_ts,
+                   *(expr.label(name) for name, expr in columns.items()))
+            .where(source.c.ts >= start, source.c.ts < end)
+            .group_by(source.c.server_ip, source.c.metric_name, bucket_ts)
+        )
+        db.session.execute(
+            insert(tier.table)
+            .prefix_with('OR REPLACE', dialect='sqlite')
+            .from_select(['server_ip', 'metric_name', 'ts', *columns], query)
+        )
+
+    def expire(self, now):
+        tiers = [RAW_TIER] + ROLLUP_TIERS
+        for tier, next_tier in zip(tiers, tiers[1:] + [None]):
+            retention = tier_retention(tier)
+            if retention == float('inf'):
+                continue
+            cutoff = now - int(retention)
+            if next_tier is not None:
+                cutoff = min(cutoff, rollup_watermark(next_tier) or 0)
+
+            tables = [tier.table] + ([DiskSample.__table__] if tier is RAW_TIER else [])
+            for table in tables:
+                oldest = db.session.execute(select(func.min(table.c.ts))).scalar()
+                while oldest is not None and oldest < cutoff:
+                    oldest = min(oldest + CHUNK_SECONDS, cutoff)
+                    db.session.execute(table.delete().where(table.c.ts < oldest))
+                    db.session.commit()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._app.app_context():
+                try:
+                    with phase('retention'):
+                        self.run_once()
+                except Exception as e:
+                    db.session.rollback()
+                    log.error("Error applying retention: %s", e)
+            self._stop.wait(self.interval)
+
+
+retention_engine = RetentionEngine()
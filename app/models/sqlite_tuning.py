@@ -0,0 +1,60 @@
+from sqlalchemy import event
+
+from app.models.database import db
+
+# Bind key of the engine that serves history reads
+HISTORY_BIND = 'history'
+
+
+def sqlite_pragmas(config, read_only=False):
+    """PRAGMA statements run on every new SQLite connection, in order."""
+    pragmas = [
+        f"PRAGMA journal_mode={config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA cache_size={int(config.get('SQLITE_CACHE_SIZE_KB', 65536)) * -1}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 268435456))}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def _on_connect(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def init_app(app):
+    """Apply the SQLite PRAGMAs to every engine; the history bind is opened query-only.
+
+    In WAL mode readers work from a snapshot and never wait on the writer, so history
+    queries served from the history bind don't stall behind ingestion commits.
+    """
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            pragmas = sqlite_pragmas(app.config, read_only=key == HISTORY_BIND)
+            event.listen(engine, 'connect', _on_connect(pragmas))
+
+
+def history_engine():
+    """Engine for history reads: the read-only history bind when configured, else the default.
+
+    There is no history bind for an in-memory database (see ``Config.SQLALCHEMY_BINDS``).
+    """
+    return db.engines.get(HISTORY_BIND, db.engine)
+
+
+def read(statement):
+    """Run a history query on its own pooled connection and return every row."""
+    with history_engine().connect() as conn:
+        return conn.execute(statement).all()
@@ -0,0 +1,414 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import case, func, insert, literal_column, select
+
+from app.models.database import (
+    DiskSample,
+    MetricRollup15m,
+    MetricRollup1h,
+    MetricRollup1m,
+    MetricSample,
+    db,
+)
+from app.models.downsample import lttb
+from app.models.recent_samples import VALUE_COLUMNS, SampleRow, aggregate, recent_samples
+from app.models.sqlite_tuning import read
+
+BYTES_PER_MB = 1024 * 1024
+
+SYSTEM_SERIES = 'system'
+
+# Grouping and ordering by the same output column lets SQLite skip the second sort
+BUCKET_KEY = literal_column('bucket_ts')
+
+# Storage tiers from finest to coarsest. The raw tier has no fixed resolution; each rollup
+# is built from the tier before it and is kept for its configured number of hours.
+Tier = namedtuple('Tier', 'name resolution table retention_setting')
+
+RAW_TIER = Tier('raw', 0, MetricSample.__table__, 'RAW_RETENTION_HOURS')
+ROLLUP_TIERS = [
+    Tier('1m', 60, MetricRollup1m.__table__, 'ROLLUP_1M_RETENTION_HOURS'),
+    Tier('15m', 900, MetricRollup15m.__table__, 'ROLLUP_15M_RETENTION_HOURS'),
+    Tier('1h', 3600, MetricRollup1h.__table__, 'ROLLUP_1H_RETENTION_HOURS'),
+]
+TIERS = [RAW_TIER] + ROLLUP_TIERS
+
+
+CONTAINER_PREFIX = 'docker_'
+
+
+def container_series(container_name):
+    return f"{CONTAINER_PREFIX}{container_name}"
+
+
+def format_ts(ts):
+    """Render an epoch timestamp as an ISO 8601 UTC string for API responses."""
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def system_sample_rows(ip, metrics, ts, root_disk_percent):
+    """Split a system metrics dict into a ``metric_sample`` row and its ``disk_sample`` rows."""
+    memory = metrics.get('memory_info') or {}
+    sample = {
+        'server_ip': ip,
+        'metric_name': SYSTEM_SERIES,
+        'ts': ts,
+        'cpu_percent': float(metrics.get('cpu_percent') or 0),
+        'memory_percent': memory.get('percent'),
+        'memory_used': memory.get('used'),
+        'memory_total': memory.get('total'),
+        'memory_available': memory.get('available'),
+        'memory_free': memory.get('free'),
+        'disk_percent': root_disk_percent,
+    }
+    disks = [
+        {
+            'server_ip': ip,
+            'ts': ts,
+            'mount': mount,
+            'total': usage.get('total', 0),
+            'used': usage.get('used', 0),
+            'free': usage.get('free', 0),
+            'percent': usage.get('percent', 0),
+        }
+        for mount, usage in (metrics.get('disk_usage') or {}).items()
+    ]
+    return sample, disks
+
+
+def container_sample_row(ip, container_name, ts, cpu_percent, memory_used_mb, memory_limit_mb):
+    return {
+        'server_ip': ip,
+        'metric_name': container_series(container_name),
+        'ts': ts,
+        'cpu_percent': float(cpu_percent or 0),
+        'memory_percent': (memory_used_mb / memory_limit_mb * 100) if memory_limit_mb else None,
+        'memory_used': memory_used_mb * BYTES_PER_MB,
+        'memory_total': memory_limit_mb * BYTES_PER_MB,
+        'memory_available': None,
+        'memory_free': None,
+        'disk_percent': None,
+    }
+
+
+def insert_samples(samples, disks=()):
+    """Insert sample rows in the current session; a repeat of an existing timestamp replaces it."""
+    if samples:
+        db.session.execute(insert(MetricSample.__table__).prefix_with('OR REPLACE', dialect='sqlite'), samples)
+    if disks:
+        db.session.execute(insert(DiskSample.__table__).prefix_with('OR REPLACE', dialect='sqlite'), disks)
+
+
+def raw_rows(ip, metric_name, start_ts, end_ts=None):
+    """Raw ``SampleRow``s of one series, from memory for the span the ring buffer covers.
+
+    Only samples older than the oldest buffered one are read from the database.
+    """
+    covered_from, recent = recent_samples.rows(ip, metric_name, start_ts, end_ts)
+    if covered_from is not None and covered_from <= start_ts:
+        return recent
+
+    stored_end = end_ts if covered_from is None else min(covered_from, end_ts or covered_from)
+    t = MetricSample.__table__
+    conditions = [t.c.server_ip == ip, t.c.metric_name == metric_name, t.c.ts >= start_ts]
+    if stored_end is not None:
+        conditions.append(t.c.ts < stored_end)
+    stored = read(select(t.c.ts, *(t.c[name] for name in VALUE_COLUMNS)).where(*conditions).order_by(t.c.ts))
+    return [SampleRow(*row) for row in stored] + recent
+
+
+def get_system_history(ip, start_ts, include_disks=False, max_points=None):
+    """Return raw system history points in the shape of the /api/system payload.
+
+    Only the root partition percentage is read unless ``include_disks`` is set, in which
+    case the per-mount rows are fetched from ``disk_sample`` as well. With ``max_points``,
+    the raw samples are thinned with LTTB over CPU usage.
+    """
+    rows = raw_rows(ip, SYSTEM_SERIES, start_ts)
+    rows = downsample_lttb(rows, max_points, x=lambda row: row.ts, y=lambda row: row.cpu_percent)
+
+    disks_by_ts = {}
+    if include_disks:
+        d = DiskSample.__table__
+        for ts, mount, total, used, free, percent in read(
+            select(d.c.ts, d.c.mount, d.c.total, d.c.used, d.c.free, d.c.percent)
+            .where(d.c.server_ip == ip, d.c.ts >= start_ts)
+        ):
+            disks_by_ts.setdefault(ts, {})[mount] = {
+                'total': total, 'used': used, 'free': free, 'percent': percent
+            }
+
+    return [
+        {
+            'timestamp': format_ts(row.ts),
+            'cpu_percent': row.cpu_percent,
+            'memory_info': {
+                'percent': row.memory_percent,
+                'used': row.memory_used,
+                'total': row.memory_total,
+                'available': row.memory_available,
+                'free': row.memory_free,
+            },
+            'disk_usage': disks_by_ts.get(row.ts, {}) if include_disks else {'/': {'percent': row.disk_percent}},
+        }
+        for row in rows
+    ]
+
+
+def tier_retention(tier):
+    """Seconds of data kept in ``tier``; a setting of 0 hours keeps it forever."""
+    hours = current_app.config.get(tier.retention_setting, 0)
+    return hours * 3600 if hours else float('inf')
+
+
+def pick_tier(range_seconds, bucket=None):
+    """Choose the coarsest tier that still covers ``range_seconds`` at ``bucket`` resolution.
+
+    Without a bucket the range is read at the resolution that gives HISTORY_MAX_POINTS
+    points, so short ranges keep returning raw samples and long ones come from rollups.
+    """
+    covering = [tier for tier in TIERS if tier_retention(tier) >= range_seconds]
+    if not covering:
+        return max(TIERS, key=tier_retention)
+    if not bucket:
+        bucket = range_seconds // current_app.config.get('HISTORY_MAX_POINTS', 1000)
+    fitting = [tier for tier in covering if tier.resolution <= bucket]
+    return fitting[-1] if fitting else covering[0]
+
+
+def rollup_watermark(tier):
+    """End of the newest bucket rolled into ``tier``, or None if it is still empty."""
+    latest = read(select(func.max(tier.table.c.ts)))[0][0]
+    return None if latest is None else latest + tier.resolution
+
+
+def aggregate_columns(source):
+    """Aggregate expressions folding rows of ``source`` (raw or a rollup) into rollup columns."""
+    c = source.c
+    if source is MetricSample.__table__:
+        return {
+            'count': func.count(),
+            'cpu_min': func.min(c.cpu_percent),
+            'cpu_avg': func.avg(c.cpu_percent),
+            'cpu_max': func.max(c.cpu_percent),
+            'memory_min': func.min(c.memory_percent),
+            'memory_avg': func.avg(c.memory_percent),
+            'memory_max': func.max(c.memory_percent),
+            'memory_used_min': func.min(c.memory_used),
+            'memory_used_avg': func.avg(c.memory_used),
+            'memory_used_max': func.max(c.memory_used),
+            'memory_total': func.max(c.memory_total),
+            'disk_min': func.min(c.disk_percent),
+            'disk_avg': func.avg(c.disk_percent),
+            'disk_max': func.max(c.disk_percent),
+        }
+
+    def weighted_avg(column):
+        # Weight each bucket's average by its sample count, ignoring buckets without a value
+        return func.sum(column * c.count) / func.sum(case((column.isnot(None), c.count)))
+
+    columns = {'count': func.sum(c.count), 'memory_total': func.max(c.memory_total)}
+    for name in ('cpu', 'memory', 'memory_used', 'disk'):
+        columns[f'{name}_min'] = func.min(c[f'{name}_min'])
+        columns[f'{name}_avg'] = weighted_avg(c[f'{name}_avg'])
+        columns[f'{name}_max'] = func.max(c[f'{name}_max'])
+    return columns
+
+
+def bucket_rows(source, ip, metric_name, start_ts, end_ts, bucket):
+    """Aggregate one series of ``source`` into ``bucket``-second rows labelled like rollup columns.
+
+    Raw buckets from the first whole bucket the ring buffer covers on are folded in memory.
+    """
+    if source is MetricSample.__table__:
+        covered_from = recent_samples.covered_from(ip, metric_name)
+        if covered_from is not None and (end_ts is None or covered_from < end_ts):
+            split = max(-(-covered_from // bucket) * bucket, start_ts)
+            recent = aggregate(recent_samples.rows(ip, metric_name, split, end_ts)[1], bucket)
+            if split <= start_ts:
+                return recent
+            return stored_bucket_rows(source, ip, metric_name, start_ts, split, bucket) + recent
+    return stored_bucket_rows(source, ip, metric_name, start_ts, end_ts, bucket)
+
+
+def stored_bucket_rows(source, ip, metric_name, start_ts, end_ts, bucket):
+    """:func:`bucket_rows` computed by SQLite alone."""
+    bucket_ts = (source.c.ts // bucket * bucket).label('bucket_ts')
+    conditions = [source.c.server_ip == ip, source.c.metric_name == metric_name, source.c.ts >= start_ts]
+    if end_ts is not None:
+        conditions.append(source.c.ts < end_ts)
+    return read(
+        select(bucket_ts, *(expr.label(name) for name, expr in aggregate_columns(source).items()))
+        .where(*conditions)
+        .group_by(BUCKET_KEY)
+        .order_by(BUCKET_KEY)
+    )
+
+
+def _tiered_bucket_rows(tier, ip, metric_name, start_ts, bucket):
+    """Bucket rows from ``tier``, with buckets it has not rolled up yet read from raw samples."""
+    if tier is RAW_TIER:
+        return bucket_rows(RAW_TIER.table, ip, metric_name, start_ts, None, bucket)
+    watermark = rollup_watermark(tier)
+    if watermark is None or watermark <= start_ts:
+        return bucket_rows(RAW_TIER.table, ip, metric_name, start_ts, None, bucket)
+    split = max(watermark // bucket * bucket, start_ts)
+    return (
+        bucket_rows(tier.table, ip, metric_name, start_ts, split, bucket)
+        + bucket_rows(RAW_TIER.table, ip, metric_name, split, None, bucket)
+    )
+
+
+def get_system_history_buckets(ip, start_ts, bucket, include_disks=False, tier=RAW_TIER):
+    """Return one point per ``bucket`` seconds with the average as the value and min/max alongside.
+
+    Points keep the /api/system shape (averages in ``cpu_percent``, ``memory_info`` and
+    ``disk_usage``) and add ``min``, ``max`` and ``count`` for the bucket. Per-mount disk
+    usage is only kept for raw samples, so ``include_disks`` has no effect on rollups.
+    """
+    rows = _tiered_bucket_rows(tier, ip, SYSTEM_SERIES, start_ts, bucket)
+    return _format_system_buckets(ip, rows, start_ts, bucket, include_disks and tier is RAW_TIER)
+
+
+def _format_system_buckets(ip, rows, start_ts, bucket, include_disks):
+    disks_by_bucket = {}
+    if include_disks:
+        d = DiskSample.__table__
+        disk_bucket = (d.c.ts // bucket * bucket).label('bucket_ts')
+        for bucket_start, mount, total, used, free, percent in read(
+            select(disk_bucket, d.c.mount, func.max(d.c.total), func.avg(d.c.used),
+                   func.avg(d.c.free), func.avg(d.c.percent))
+            .where(d.c.server_ip == ip, d.c.ts >= start_ts)
+            .group_by(BUCKET_KEY, d.c.mount)
+        ):
+            disks_by_bucket.setdefault(bucket_start, {})[mount] = {
+                'total': total, 'used': used, 'free': free, 'percent': percent
+            }
+
+    return [
+        {
+            'timestamp': format_ts(row.bucket_ts),
+            'cpu_percent': row.cpu_avg,
+            'memory_info': {
+                'percent': row.memory_avg,
+                'used': row.memory_used_avg,
+                'total': row.memory_total,
+                # Not aggregated; kept so bucketed points have the same keys as raw ones
+                'available': None,
+                'free': None,
+            },
+            'disk_usage': (
+                disks_by_bucket.get(row.bucket_ts, {}) if include_disks
+                else {'/': {'percent': row.disk_avg}}
+            ),
+            'min': {'cpu_percent': row.cpu_min, 'memory_percent': row.memory_min, 'disk_percent': row.disk_min},
+            'max': {'cpu_percent': row.cpu_max, 'memory_percent': row.memory_max, 'disk_percent': row.disk_max},
+            'count': row.count,
+        }
+        for row in rows
+    ]
+
+
+def query_system_history(ip, start_ts, range_seconds, mode='avg', bucket=None, points=None, include_disks=False):
+    """System history for the API: raw, bucketed or LTTB-thinned, from the coarsest fitting tier."""
+    tier = pick_tier(range_seconds, bucket)
+    if tier is RAW_TIER:
+        if bucket is None:
+            return get_system_history(ip, start_ts, include_disks=include_disks)
+        if mode == 'lttb':
+            return get_system_history(ip, start_ts, include_disks=include_disks, max_points=points)
+        return get_system_history_buckets(ip, start_ts, bucket, include_disks=include_disks)
+
+    # Rollups are read at their own resolution when LTTB or no bucket was asked for
+    if bucket is None or mode == 'lttb':
+        rows = _tiered_bucket_rows(tier, ip, SYSTEM_SERIES, start_ts, tier.resolution)
+        rows = downsample_lttb(rows, points, x=lambda row: row.bucket_ts, y=lambda row: row.cpu_avg)
+        return _format_system_buckets(ip, rows, start_ts, tier.resolution, False)
+    return get_system_history_buckets(ip, start_ts, bucket, tier=tier)
+
+
+def get_container_history(ip, container_name, start_ts):
+    """Return ``(ts, cpu_percent, memory_used_mb, memory_limit_mb)`` tuples for one container."""
+    return [
+        (row.ts, row.cpu_percent, (row.memory_used or 0) / BYTES_PER_MB, (row.memory_total or 0) / BYTES_PER_MB)
+        for row in raw_rows(ip, container_series(container_name), start_ts)
+    ]
+
+
+def container_names(ip, range_seconds, bucket=None):
+    """Names of the containers with samples for ``ip`` in the raw tier or the tier serving the range.
+
+    Walks the distinct series with one primary-key seek each, rather than scanning samples.
+    """
+    # Container series sort between 'docker_' and 'docker`', the next character after '_'
+    upper = CONTAINER_PREFIX[:-1] + chr(ord(CONTAINER_PREFIX[-1]) + 1)
+    tier = pick_tier(range_seconds, bucket)
+    names = set()
+    for tier in [RAW_TIER] + ([tier] if tier is not RAW_TIER else []):
+        t = tier.table
+        previous = CONTAINER_PREFIX
+        while True:
+            series = read(
+                select(func.min(t.c.metric_name))
+                .where(t.c.server_ip == ip, t.c.metric_name > previous, t.c.metric_name < upper)
+            )[0][0]
+            if series is None:
+                break
+            names.add(series[len(CONTAINER_PREFIX):])
+            previous = series
+    return sorted(names)
+
+
+def get_container_history_buckets(ip, container_name, start_ts, bucket, tier=RAW_TIER):
+    """Return ``(ts, cpu_avg, memory_used_mb_avg, memory_limit_mb, extremes)`` per bucket.
+
+    ``extremes`` holds the min/max CPU percentage and memory usage and the sample count.
+    """
+    rows = _tiered_bucket_rows(tier, ip, container_series(container_name), start_ts, bucket)
+    return _format_container_buckets(rows)
+
+
+def _format_container_buckets(rows):
+    return [
+        (
+            row.bucket_ts, row.cpu_avg, (row.memory_used_avg or 0) / BYTES_PER_MB,
+            (row.memory_total or 0) / BYTES_PER_MB,
+            {
+                'min': {'cpu_percent': row.cpu_min, 'memory_used': (row.memory_used_min or 0) / BYTES_PER_MB},
+                'max': {'cpu_percent': row.cpu_max, 'memory_used': (row.memory_used_max or 0) / BYTES_PER_MB},
+                'count': row.count,
+            }
+        )
+        for row in rows
+    ]
+
+
+def query_container_history(ip, container_name, start_ts, range_seconds, mode='avg', bucket=None, points=None):
+    """Container history for the API, picking the tier the same way as :func:`query_system_history`."""
+    tier = pick_tier(range_seconds, bucket)
+    if tier is RAW_TIER and (bucket is None or mode == 'lttb'):
+        return downsample_lttb(
+            get_container_history(ip, container_name, start_ts),
+            points, x=lambda row: row[0], y=lambda row: row[1]
+        )
+    if bucket is None or mode == 'lttb':
+        rows = _tiered_bucket_rows(tier, ip, container_series(container_name), start_ts, tier.resolution)
+        rows = downsample_lttb(rows, points, x=lambda row: row.bucket_ts, y=lambda row: row.cpu_avg)
+        return _format_container_buckets(rows)
+    return get_container_history_buckets(ip, container_name, start_ts, bucket, tier=tier)
+
+
+def delete_server_samples(ip):
+    for tier in TIERS:
+        db.session.execute(tier.table.delete().where(tier.table.c.server_ip == ip))
+    DiskSample.query.filter_by(server_ip=ip).delete()
+
+
+def downsample_lttb(rows, threshold, x, y):
+    """Keep ``threshold`` of the time-ordered ``rows``, chosen by LTTB over ``(x(row), y(row))``."""
+    if threshold is None or len(rows) <= threshold:
+        return rows
+    indices = lttb([x(row) for row in rows], [y(row) or 0 for row in rows], threshold)
+    return [rows[i] for i in indices]
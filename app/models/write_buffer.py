@@ -0,0 +1,125 @@
+import atexit
+import logging
+import threading
+import time
+
+from app.models.database import db
+from app.instrumentation import phase
+from app.models.timeseries import insert_samples
+
+log = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    """Write-behind buffer that batches sample rows into one transaction per flush.
+
+    Rows are flushed with a single executemany per table once ``flush_rows`` rows are
+    waiting or ``flush_interval`` seconds have passed. The buffer holds at most
+    ``capacity`` rows: a producer that finds it full waits up to ``put_timeout`` seconds
+    for a flush to make room, after which its rows are dropped and counted in ``dropped``.
+    """
+
+    def __init__(self, flush_rows=500, flush_interval=2.0, capacity=20000, put_timeout=1.0):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        self._app = None
+        self._samples = []
+        self._disks = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self._app = app
+        self.flush_rows = app.config.get('WRITE_BUFFER_FLUSH_ROWS', self.flush_rows)
+        self.flush_interval = app.config.get('WRITE_BUFFER_FLUSH_INTERVAL', self.flush_interval)
+        self.capacity = app.config.get('WRITE_BUFFER_CAPACITY', self.capacity)
+        self.put_timeout = app.config.get('WRITE_BUFFER_PUT_TIMEOUT', self.put_timeout)
+        app.extensions['write_buffer'] = self
+        atexit.register(self.close)
+
+    def __len__(self):
+        return len(self._samples) + len(self._disks)
+
+    def add(self, samples, disks=()):
+        """Queue rows for the next flush; returns False if they were dropped because the buffer stayed full."""
+        incoming = len(samples) + len(disks)
+        deadline = time.monotonic() + self.put_timeout
+        with self._cond:
+            while len(self) + incoming > self.capacity:
+                self._cond.notify_all()  # Wake the flusher early
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    self.dropped += incoming
+                    log.warning("Write buffer full, dropped %d rows (%d total)", incoming, self.dropped)
+                    return False
+            self._samples.extend(samples)
+            self._disks.extend(disks)
+            if len(self) >= self.flush_rows:
+                self._cond.notify_all()
+        self._ensure_started()
+        return True
+
+    def flush(self):
+        """Write every queued row in one transaction."""
+        with self._flush_lock:
+            with self._cond:
+                samples, self._samples = self._samples, []
+                disks, self._disks = self._disks, []
+                self._cond.notify_all()  # Room has been made for waiting producers
+            if not samples and not disks:
+                return
+
+            with self._app.app_context():
+                try:
+                    with phase('db_commit'):
+                        insert_samples(samples, disks)
+                        db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    log.error("Error flushing %d buffered rows: %s", len(samples) + len(disks), e)
+                    self._requeue(samples, disks)
+
+    def close(self):
+        """Stop the flusher and write whatever is still buffered."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self._app is not None:
+            self.flush()
+
+    def _requeue(self, samples, disks):
+        # Keep failed rows for the next flush as long as they fit; newer rows win
+        with self._cond:
+            room = self.capacity - len(self)
+            if len(samples) + len(disks) > room:
+                self.dropped += len(samples) + len(disks)
+                log.warning("Write buffer full, dropped %d rows after a failed flush", len(samples) + len(disks))
+                return
+            self._samples[:0] = samples
+            self._disks[:0] = disks
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stop.is_set():
+            return
+        with self._flush_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                if len(self) < self.flush_rows:
+                    self._cond.wait(self.flush_interval)
+            self.flush()
+
+
+write_buffer = WriteBuffer()
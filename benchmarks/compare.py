@@ -0,0 +1,70 @@
+"""Compare two benchmark result files and fail on regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Exits with status 1 if any result got worse by more than ``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report.get('meta', {}), {result['name']: result for result in report['results']}
+
+
+def change_percent(before, after):
+    if before == 0:
+        return 0.0 if after == 0 else float('inf')
+    return (after - before) / abs(before) * 100
+
+
+def compare(baseline, candidate, threshold):
+    """``(rows, regressions)``: one row per result present in both files, and the names that regressed."""
+    rows, regressions = [], []
+    for name, before in baseline.items():
+        after = candidate.get(name)
+        if after is None:
+            continue
+        change = change_percent(before['value'], after['value'])
+        worse = change if before.get('better', 'lower') == 'lower' else -change
+        regressed = worse > threshold
+        if regressed:
+            regressions.append(name)
+        rows.append((name, before['value'], after['value'], change, before['unit'], regressed))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent a result may get worse before it counts as a regression (default 10)')
+    parser.add_argument('--only', help='only compare results whose name starts with this prefix')
+    args = parser.parse_args(argv)
+
+    baseline_meta, baseline = load(args.baseline)
+    candidate_meta, candidate = load(args.candidate)
+    if args.only:
+        baseline = {name: result for name, result in baseline.items() if name.startswith(args.only)}
+
+    print(f"baseline {baseline_meta.get('commit')}  candidate {candidate_meta.get('commit')}")
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    for name, before, after, change, unit, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f'{name:<60} {before:>12.3f} -> {after:>12.3f} {unit:<10} {change:+7.1f}%{flag}')
+
+    missing = sorted(baseline.keys() - candidate.keys())
+    if missing:
+        print(f"missing from candidate: {', '.join(missing)}")
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.threshold:g}%')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
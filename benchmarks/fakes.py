@@ -0,0 +1,121 @@
+"""Deterministic stand-ins for psutil and the Docker SDK, so runs don't depend on the host."""
+import math
+import time
+from collections import namedtuple
+from contextlib import ExitStack
+from unittest import mock
+
+CpuTimes = namedtuple('CpuTimes', ['user', 'nice', 'system', 'idle', 'iowait'])
+VirtualMemory = namedtuple('VirtualMemory', ['total', 'available', 'percent', 'used', 'free'])
+DiskUsage = namedtuple('DiskUsage', ['total', 'used', 'free', 'percent'])
+Partition = namedtuple('Partition', ['device', 'mountpoint', 'fstype', 'opts'])
+
+GB = 1024 ** 3
+
+
+class FakePsutil:
+    """The psutil calls made by ``system_metrics``, with CPU times that advance on every read."""
+
+    def __init__(self, cores=8, mounts=('/', '/var', '/home')):
+        self.cores = cores
+        self.mounts = mounts
+        self._reads = 0
+
+    def cpu_times(self, percpu=False):
+        self._reads += 1
+        busy = 100.0 * self._reads * (1.5 + math.sin(self._reads / 10))
+        per_cpu = [CpuTimes(busy, 0.0, busy / 4, 400.0 * self._reads, 1.0) for _ in range(self.cores)]
+        if percpu:
+            return per_cpu
+        return CpuTimes(*(sum(column) for column in zip(*per_cpu)))
+
+    def cpu_percent(self, interval=None, percpu=False):
+        return [42.0] * self.cores if percpu else 42.0
+
+    def virtual_memory(self):
+        return VirtualMemory(16 * GB, 9 * GB, 43.75, 7 * GB, 6 * GB)
+
+    def disk_partitions(self):
+        return [Partition(f'/dev/sd{i}', mount, 'ext4', 'rw') for i, mount in enumerate(self.mounts)]
+
+    def disk_usage(self, mountpoint):
+        return DiskUsage(500 * GB, 200 * GB, 300 * GB, 40.0)
+
+    def getloadavg(self):
+        return (1.5, 1.2, 0.9)
+
+
+class FakeDockerAPI:
+    """Low-level API of one engine running ``containers`` containers; stats take ``stats_delay`` seconds."""
+
+    def __init__(self, containers=10, stats_delay=0.0):
+        self.stats_delay = stats_delay
+        self.calls = {}
+        self._containers = {
+            f'{i:012x}' * 5 + f'{i:04x}': {
+                'Id': f'{i:012x}' * 5 + f'{i:04x}',
+                'Name': f'/bench-{i}',
+                'State': {'Status': 'running', 'Running': True},
+                'Image': f'sha256:{i % 3:064x}',
+                'Created': '2024-01-01T00:00:00Z',
+                'Mounts': [{'Type': 'volume', 'Name': f'data-{i}', 'Source': '', 'Destination': '/data'}],
+                'NetworkSettings': {'Ports': {'80/tcp': [{'HostIp': '0.0.0.0', 'HostPort': str(8000 + i)}]}},
+            }
+            for i in range(containers)
+        }
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def containers(self, all=False):
+        self._count('containers')
+        return [{'Id': cid, 'State': attrs['State']['Status']} for cid, attrs in self._containers.items()]
+
+    def inspect_container(self, container_id):
+        self._count('inspect_container')
+        return dict(self._containers[container_id])
+
+    def inspect_image(self, image_id):
+        self._count('inspect_image')
+        return {'RepoTags': [f'bench/image-{image_id[-1]}:latest']}
+
+    def stats(self, container_id, stream=False):
+        self._count('stats')
+        if self.stats_delay:
+            time.sleep(self.stats_delay)
+        return {
+            'cpu_stats': {'cpu_usage': {'total_usage': 2_000_000}, 'system_cpu_usage': 100_000_000},
+            'memory_stats': {'usage': 256 * 1024 ** 2, 'limit': 2 * GB},
+            'networks': {'eth0': {'rx_bytes': 10 ** 6, 'tx_bytes': 2 * 10 ** 6}},
+        }
+
+
+class FakeVolume:
+    attrs = {'UsageData': {'Size': 5 * 1024 ** 2}}
+
+
+class FakeDockerClient:
+    def __init__(self, api):
+        self.api = api
+        self.volumes = mock.Mock(get=lambda name: FakeVolume())
+
+    def ping(self):
+        return True
+
+    def events(self, decode=True, filters=None):
+        return iter(())
+
+    def close(self):
+        pass
+
+
+def patched(psutil=None, docker_api=None):
+    """Context manager that routes psutil and every Docker client through the fakes."""
+    psutil = psutil or FakePsutil()
+    docker_api = docker_api or FakeDockerAPI()
+    client = FakeDockerClient(docker_api)
+    stack = ExitStack()
+    stack.enter_context(mock.patch('app.metrics.system_metrics.psutil', psutil))
+    stack.enter_context(mock.patch('docker.from_env', lambda **kwargs: client))
+    stack.enter_context(mock.patch('docker.DockerClient', lambda **kwargs: client))
+    return stack
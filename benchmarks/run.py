@@ -0,0 +1,238 @@
+"""Benchmark ingestion and history queries against a freshly seeded SQLite database.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.compare baseline.json results.json
+
+psutil and the Docker SDK are replaced by the deterministic fakes in ``benchmarks.fakes``,
+so no Docker engine is needed and runs on the same machine are comparable across commits.
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RANGES = ('1h', '24h', '7d')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Results:
+    def __init__(self):
+        self.results = []
+
+    def add(self, name, value, unit, better='lower'):
+        self.results.append({'name': name, 'value': round(value, 4), 'unit': unit, 'better': better})
+        print(f'{name:<60} {value:>14.3f} {unit}', file=sys.stderr)
+
+    def add_latencies(self, name, seconds):
+        ms = [s * 1000 for s in seconds]
+        self.add(f'{name}.mean', statistics.fmean(ms), 'ms')
+        self.add(f'{name}.p50', percentile(ms, 50), 'ms')
+        self.add(f'{name}.p95', percentile(ms, 95), 'ms')
+
+
+def bench_write_buffer(app, results, rows):
+    """Rows/s through WriteBuffer.add + flush, in collector-sized batches."""
+    from app.models.timeseries import system_sample_rows
+    from app.models.write_buffer import write_buffer
+
+    base = int(time.time()) - 30 * 86400  # Well behind the seeded history
+    batches = []
+    for i in range(rows):
+        sample, disks = system_sample_rows(f'192.168.{i % 50}.1', {
+            'cpu_percent': i % 100, 'memory_info': {'percent': 50.0, 'used': 1.0, 'total': 2.0},
+            'disk_usage': {'/': {'total': 2.0, 'used': 1.0, 'free': 1.0, 'percent': 50.0}},
+        }, base + i // 50, 50.0)
+        batches.append(([sample], disks))
+
+    started = time.perf_counter()
+    for samples, disks in batches:
+        write_buffer.add(samples, disks)
+    write_buffer.flush()
+    elapsed = time.perf_counter() - started
+    results.add('ingest.write_buffer.rows_per_second', rows * 2 / elapsed, 'rows/s', 'higher')
+
+
+def bench_collector(app, results, samples):
+    """Samples/s through the collector's local path: psutil sample, snapshot, alerts, ring and buffer."""
+    from app.metrics.collector import collector
+    from app.models.write_buffer import write_buffer
+
+    durations = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        collector.collect_now('127.0.0.1')
+        durations.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    write_buffer.flush()
+    flush = time.perf_counter() - started
+    results.add('ingest.collect_now.samples_per_second', samples / (sum(durations) + flush), 'samples/s', 'higher')
+    results.add_latencies('ingest.collect_now', durations)
+
+
+def bench_docker_refresh(app, results, repeat):
+    """Latency of one Docker metrics crawl of the fake engine, including storing its samples."""
+    from app.metrics.docker_metrics import docker_metrics_cache
+    from app.models.write_buffer import write_buffer
+
+    docker_metrics_cache.refresh()  # First crawl inspects every container
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        docker_metrics_cache.refresh()
+        durations.append(time.perf_counter() - started)
+    write_buffer.flush()
+    results.add_latencies('ingest.docker_refresh', durations)
+
+
+def bench_queries(client, headers, results, ip, repeat):
+    """Latency and response size of both history endpoints for every time range, raw and downsampled."""
+    endpoints = {
+        'server_metrics': f'/api/servers/{ip}/metrics',
+        'docker_metrics': f'/api/servers/{ip}/docker/metrics',
+    }
+    for endpoint, url in endpoints.items():
+        for time_range in RANGES:
+            for variant, extra in (('raw', ''), ('points300', '&points=300')):
+                name = f'query.{endpoint}.{time_range}.{variant}'
+                query = f'{url}?timeRange={time_range}{extra}'
+
+                response = client.get(query, headers=headers)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{query} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+                body = response.get_data()
+                results.add(f'{name}.bytes', len(body), 'bytes')
+                results.add(f'{name}.bytes_gzip', len(gzip.compress(body, 6)), 'bytes')
+
+                durations = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    client.get(query, headers=headers).get_data()
+                    durations.append(time.perf_counter() - started)
+                results.add_latencies(name, durations)
+
+
+def bench_lttb(results, repeat):
+    """LTTB over synthetic series thinned to 300 points, in plain Python and, if installed, NumPy."""
+    import random
+    from app.models import downsample
+
+    rng = random.Random(1)
+    for n in (17_280, 120_960):  # A day and a week of 5s samples
+        xs = list(range(0, n * 5, 5))
+        ys = [rng.random() * 100 for _ in range(n)]
+        variants = {'python': None}
+        if downsample.np is not None:
+            variants['numpy'] = downsample.np
+        for variant, np in variants.items():
+            downsample.np = np
+            durations = []
+            try:
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    downsample.lttb(xs, ys, 300)
+                    durations.append(time.perf_counter() - started)
+            finally:
+                downsample.np = variants.get('numpy')
+            results.add_latencies(f'downsample.lttb.{n}.{variant}', durations)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servers', type=int, default=3, help='seeded servers (default 3)')
+    parser.add_argument('--containers', type=int, default=5, help='containers per server (default 5)')
+    parser.add_argument('--days', type=float, default=7, help='days of seeded history (default 7)')
+    parser.add_argument('--step', type=int, default=60, help='seconds between seeded samples (default 60)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the synthetic data')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query (default 20)')
+    parser.add_argument('--ingest-rows', type=int, default=20000, help='rows pushed through the write buffer')
+    parser.add_argument('--collect-samples', type=int, default=500, help='collector samples to take')
+    parser.add_argument('--docker-containers', type=int, default=20, help='containers on the fake Docker engine')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='metricly-bench-')
+    # Configuration is read when the app package is imported, so it is set up first
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'COLLECTOR_ENABLED': 'false',
+        'RETENTION_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+    })
+    os.environ.pop('DATABASE_READ_URL', None)
+
+    from benchmarks import fakes
+    from benchmarks.seed import seed_history
+
+    with fakes.patched(docker_api=fakes.FakeDockerAPI(args.docker_containers)):
+        import jwt
+        from app import create_app
+        from app.api.routes import SECRET_KEY
+        from app.models.database import User, db
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', role='admin')
+            user.set_password('bench')
+            db.session.add(user)
+            db.session.commit()
+        token = jwt.encode({
+            'username': 'bench',
+            'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=6),
+        }, SECRET_KEY, algorithm='HS256')
+        headers = {'Authorization': f'Bearer {token}'}
+
+        results = Results()
+        started = time.perf_counter()
+        ips = seed_history(app, args.servers, args.containers, args.days, args.step, args.seed)
+        results.add('seed.seconds', time.perf_counter() - started, 's')
+
+        client = app.test_client()
+        bench_queries(client, headers, results, ips[0], args.repeat)
+        bench_write_buffer(app, results, args.ingest_rows)
+        bench_collector(app, results, args.collect_samples)
+        bench_docker_refresh(app, results, args.repeat)
+        bench_lttb(results, args.repeat)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': vars(args),
+        },
+        'results': results.results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
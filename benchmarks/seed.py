@@ -0,0 +1,74 @@
+"""Synthetic metric history: ``servers`` x ``containers`` series over ``days``, one sample every ``step`` seconds."""
+import math
+import random
+import time
+
+from app.models.database import Server, db
+from app.models.retention import retention_engine
+from app.models.timeseries import container_sample_row, insert_samples, system_sample_rows
+
+GB = 1024 ** 3
+
+# Rows per insert; a day of one server's series at a 60s step is ~8k rows
+CHUNK_SECONDS = 6 * 3600
+
+
+def server_ips(servers):
+    return [f'10.0.{i // 250}.{i % 250 + 1}' for i in range(servers)]
+
+
+def _system_metrics(rng, ts, phase):
+    cpu = 50 + 35 * math.sin(ts / 3600 + phase) + rng.uniform(-5, 5)
+    memory_percent = 60 + 10 * math.sin(ts / 86400 + phase)
+    return {
+        'cpu_percent': round(min(max(cpu, 0), 100), 1),
+        'memory_info': {
+            'total': 16.0 * GB,
+            'used': memory_percent / 100 * 16 * GB,
+            'available': (100 - memory_percent) / 100 * 16 * GB,
+            'free': (100 - memory_percent) / 200 * 16 * GB,
+            'percent': round(memory_percent, 1),
+        },
+        'disk_usage': {
+            mount: {'total': 500.0 * GB, 'used': 200.0 * GB, 'free': 300.0 * GB, 'percent': 40.0}
+            for mount in ('/', '/var')
+        },
+    }
+
+
+def seed_history(app, servers=3, containers=5, days=7, step=60, seed=1, now=None):
+    """Fill the database with deterministic samples ending at ``now`` and roll them up.
+
+    Every server is registered (the history endpoints 404 unknown ones) and gets a system
+    series plus ``containers`` container series. Returns the seeded server IPs.
+    """
+    rng = random.Random(seed)
+    now = int(now or time.time()) // step * step
+    start = now - int(days * 86400)
+    ips = server_ips(servers)
+    phases = {ip: rng.uniform(0, 2 * math.pi) for ip in ips}
+
+    with app.app_context():
+        for ip in ips:
+            if not Server.query.filter_by(ip_address=ip).first():
+                db.session.add(Server(ip_address=ip))
+        db.session.commit()
+
+        for chunk_start in range(start, now, CHUNK_SECONDS):
+            samples, disks = [], []
+            for ts in range(chunk_start, min(chunk_start + CHUNK_SECONDS, now), step):
+                for ip in ips:
+                    metrics = _system_metrics(rng, ts, phases[ip])
+                    sample, sample_disks = system_sample_rows(ip, metrics, ts, 40.0)
+                    samples.append(sample)
+                    disks.extend(sample_disks)
+                    for c in range(containers):
+                        samples.append(container_sample_row(
+                            ip, f'bench-{c}', ts, round(rng.uniform(0, 20), 2), 256 + 4 * c, 2048
+                        ))
+            insert_samples(samples, disks)
+            db.session.commit()
+
+        # Populate the 1m/15m/1h tiers the way the retention loop would have
+        retention_engine.roll_up(now)
+    return ips
@@ -1,10 +1,11 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useMemo } from "react";
 import { Box, Container, Grid, Typography, CircularProgress, Alert, IconButton, Tooltip } from "@mui/material";
 import { BrowserRouter as Router, Routes, Route, Navigate } from "react-router-dom";
 import { Sidebar } from "./components/Sidebar";
 import { SystemMetrics } from "./components/Metrics/SystemMetrics";
 import { DockerContainers } from "./components/Metrics/DockerContainers";
 import { MetricsHistory } from "./components/Metrics/MetricsHistory";
+import { useLiveMetrics, toDisplayMetrics } from "./hooks/useLiveMetrics";
 import Login from "./pages/login";
 import { ThemeProvider, useTheme } from "./theme/index.jsx";
 import Brightness4Icon from '@mui/icons-material/Brightness4';
@@ -17,12 +18,22 @@ const AppContent = () => {
   const [isLoading, setIsLoading] = useState(true);
   const [servers, setServers] = useState([]);
   const [currentServer, setCurrentServer] = useState(null);
-  const [metrics, setMetrics] = useState(null);
   const [docker, setDocker] = useState([]);
-  const [metricsLoading, setMetricsLoading] = useState(false);
+  const [dockerLoading, setDockerLoading] = useState(false);
   const [error, setError] = useState(null);
   const { toggleTheme, isDarkMode } = useTheme();
 
+  // System metrics arrive over the live stream; the collector pushes each new snapshot
+  const live = useLiveMetrics(isAuthenticated ? currentServer?.ip_address : null);
+  const metrics = useMemo(() => toDisplayMetrics(live.metrics), [live.metrics]);
+  const metricsLoading = Boolean(currentServer) && !metrics && !live.error;
+
+  useEffect(() => {
+    if (live.error) {
+      console.error("Error collecting metrics:", live.error);
+    }
+  }, [live.error]);
+
   const handleApiError = (error, context) => {
     console.error(`Error in ${context}:`, error);
     let errorMessage = "An unexpected error occurred";
@@ -67,7 +78,7 @@ const AppContent = () => {
 
   useEffect(() => {
     if (currentServer) {
-      fetchMetrics();
+      fetchDocker();
     }
   }, [currentServer]);
 
@@ -99,74 +110,28 @@ const AppContent = () => {
     }
   };
 
-  const fetchMetrics = async () => {
+  // Container list from the collector's Docker snapshot; system metrics come from the live stream
+  const fetchDocker = async () => {
     if (!currentServer) return;
 
-    setMetricsLoading(true);
+    setDockerLoading(true);
     try {
-      const [systemResponse, dockerResponse] = await Promise.all([
-        fetch(`/api/system?server=${currentServer.ip_address}`, {
-          headers: {
-            "Authorization": `Bearer ${localStorage.getItem("token")}`,
-          },
-        }),
-        fetch(`/api/docker?server=${currentServer.ip_address}`, {
-          headers: {
-            "Authorization": `Bearer ${localStorage.getItem("token")}`,
-          },
-        }),
-      ]);
+      const response = await fetch(`/api/docker?server=${currentServer.ip_address}`, {
+        headers: {
+          "Authorization": `Bearer ${localStorage.getItem("token")}`,
+        },
+      });
 
-      if (!systemResponse.ok || !dockerResponse.ok) {
-        throw new Error(
-          `Failed to fetch metrics: ${systemResponse.statusText || dockerResponse.statusText}`
-        );
+      if (!response.ok) {
+        throw new Error(`Failed to fetch Docker metrics: ${response.statusText}`);
       }
 
-      const [systemData, dockerData] = await Promise.all([
-        systemResponse.json(),
-        dockerResponse.json(),
-      ]);
-
-      // Helper function to convert human-readable size to bytes
-      const convertToBytes = (sizeStr) => {
-        if (!sizeStr || typeof sizeStr !== 'string') return 0;
-        const [value, unit] = sizeStr.split(' ');
-        const numValue = parseFloat(value);
-        const multipliers = {
-          'B': 1,
-          'KB': 1024,
-          'MB': 1024 * 1024,
-          'GB': 1024 * 1024 * 1024,
-          'TB': 1024 * 1024 * 1024 * 1024
-        };
-        return numValue * multipliers[unit] || 0;
-      };
-
-      // Process system metrics
-      const metrics = {
-        cpu_percent: systemData.cpu_percent || 0,
-        memory_percent: systemData.memory_info?.percent || 0,
-        memory_used: systemData.memory_info?.used || 0,
-        memory_total: systemData.memory_info?.total || 0,
-        disks: systemData.disk_usage ? Object.entries(systemData.disk_usage).map(([mount, usage]) => ({
-          mount,
-          percent: usage.percent,
-          used: usage.used,
-          total: usage.total
-        })) : [],
-        disk_percent: systemData.disk_usage?.root?.percent || 0,
-        disk_used: systemData.disk_usage?.root?.used || 0,
-        disk_total: systemData.disk_usage?.root?.total || 0
-      };
-
-      setMetrics(metrics);
-      setDocker(dockerData);
+      setDocker(await response.json());
       setError(null);
     } catch (error) {
-      handleApiError(error, "fetchMetrics");
+      handleApiError(error, "fetchDocker");
     } finally {
-      setMetricsLoading(false);
+      setDockerLoading(false);
     }
   };
 
@@ -191,7 +156,6 @@ const AppContent = () => {
       }
 
       if (updatedServers.length === 0) {
-        setMetrics(null);
         setDocker([]);
       }
       setError(null);
@@ -302,7 +266,7 @@ const AppContent = () => {
                         <Grid item xs={12}>
                           <DockerContainers
                             docker={docker}
-                            isLoading={metricsLoading}
+                            isLoading={dockerLoading}
                             currentServer={currentServer}
                           />
                         </Grid>
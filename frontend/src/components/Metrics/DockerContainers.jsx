@@ -28,7 +28,7 @@ import OpenInNewIcon from '@mui/icons-material/OpenInNew';
 import InfoIcon from '@mui/icons-material/Info';
 import TerminalIcon from '@mui/icons-material/Terminal';
 import EditIcon from '@mui/icons-material/Edit';
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip as ChartTooltip, ResponsiveContainer, Legend } from 'recharts';
 import RefreshIcon from '@mui/icons-material/Refresh';
 
@@ -135,17 +135,36 @@ export const DockerContainers = ({ docker = [], isLoading, currentServer }) => {
     }
   };
 
+  // Most log lines kept in the dialog; older ones are dropped as new ones stream in
+  const MAX_LOG_LINES = 2000;
+  const logsController = useRef(null);
+
+  // Stop following logs once the dialog closes
+  useEffect(() => {
+    if (!showLogs && logsController.current) {
+      logsController.current.abort();
+      logsController.current = null;
+    }
+  }, [showLogs]);
+
+  // ✅ Follow container logs over /logs/stream, appending lines as they arrive
   const fetchContainerLogs = async (containerName) => {
     if (!currentServer) return;
-    
+
+    if (logsController.current) logsController.current.abort();
+    const controller = new AbortController();
+    logsController.current = controller;
+
+    setLogs('');
     setIsLoadingLogs(true);
     try {
       const response = await fetch(
-        `/api/containers/${containerName}/logs?server=${currentServer.ip_address}`,
+        `/api/containers/${containerName}/logs/stream?server=${currentServer.ip_address}&follow=true`,
         {
           headers: {
             "Authorization": `Bearer ${localStorage.getItem("token")}`
-          }
+          },
+          signal: controller.signal
         }
       );
       
@@ -153,10 +172,30 @@ export const DockerContainers = ({ docker = [], isLoading, currentServer }) => {
         const data = await response.json();
         throw new Error(data.error || 'Failed to fetch logs');
       }
+      setIsLoadingLogs(false);
 
-      const data = await response.json();
-      setLogs(data.logs);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let lines = [];
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        const blocks = (buffer + decoder.decode(value, { stream: true })).split('\n\n');
+        buffer = blocks.pop();
+        for (const block of blocks) {
+          const data = block.split('\n').find((line) => line.startsWith('data: '));
+          if (!data) continue;
+          const event = JSON.parse(data.slice(6));
+          if (event.error) throw new Error(event.error);
+          if (event.lines) {
+            lines = lines.concat(event.lines).slice(-MAX_LOG_LINES);
+            setLogs(lines.join('\n'));
+          }
+        }
+      }
     } catch (error) {
+      if (controller.signal.aborted) return;
       console.error('Error fetching logs:', error);
       setAlertMessage({ 
         type: 'error', 
@@ -164,7 +203,7 @@ export const DockerContainers = ({ docker = [], isLoading, currentServer }) => {
         duration: 5000
       });
     } finally {
-      setIsLoadingLogs(false);
+      if (logsController.current === controller) setIsLoadingLogs(false);
     }
   };
 
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Card,
   CardContent,
@@ -37,6 +37,25 @@ import {
 import WarningIcon from '@mui/icons-material/Warning';
 import SettingsIcon from '@mui/icons-material/Settings';
 
+// Points requested per chart; the server aggregates longer ranges down to this many
+const HISTORY_POINTS = 300;
+
+// Seconds covered by each time range, used to drop points that scrolled out of the window
+const RANGE_SECONDS = { '1h': 3600, '24h': 86400, '7d': 604800 };
+
+// Replace points from the first incoming timestamp on, then trim to the window
+const mergeHistory = (previous, incoming, timeRange) => {
+  if (!incoming.length) return previous;
+  const firstNew = Date.parse(incoming[0].timestamp);
+  const windowStart = Date.now() - (RANGE_SECONDS[timeRange] || 3600) * 1000;
+  return previous
+    .filter(point => {
+      const ts = Date.parse(point.timestamp);
+      return ts < firstNew && ts >= windowStart;
+    })
+    .concat(incoming);
+};
+
 // Generate random color for containers
 const getRandomColor = () => {
   const letters = '0123456789ABCDEF';
@@ -52,7 +71,8 @@ export const MetricsHistory = ({ server, metrics }) => {
   const [thresholds, setThresholds] = useState({
     cpu: 80,
     memory: 80,
-    disk: 80
+    disk: 80,
+    duration: 0
   });
   const [showThresholdDialog, setShowThresholdDialog] = useState(false);
   const [alerts, setAlerts] = useState([]);
@@ -62,8 +82,13 @@ export const MetricsHistory = ({ server, metrics }) => {
   const [error, setError] = useState(null);
   const [refreshInterval, setRefreshInterval] = useState(null);
   const [containerColors, setContainerColors] = useState({});
+  // Timestamp of the newest point held; later refreshes only fetch points from there on
+  const systemCursor = useRef(null);
+  const dockerCursor = useRef(null);
 
   useEffect(() => {
+    systemCursor.current = null;
+    dockerCursor.current = null;
     if (server) {
       fetchHistoricalData();
       // Set up periodic refresh based on timeRange
@@ -98,12 +123,14 @@ export const MetricsHistory = ({ server, metrics }) => {
     setError(null);
     try {
       // Fetch system metrics history
+      const systemSince = systemCursor.current ? `&since=${encodeURIComponent(systemCursor.current)}` : '';
       const systemResponse = await fetch(
-        `/api/servers/${server.ip_address}/metrics?timeRange=${timeRange}`,
+        `/api/servers/${server.ip_address}/metrics?timeRange=${timeRange}&points=${HISTORY_POINTS}${systemSince}`,
         {
           headers: {
             "Authorization": `Bearer ${localStorage.getItem("token")}`
-          }
+          },
+          cache: 'no-cache'  // Revalidate with the ETag so unchanged history comes back as 304
         }
       );
       
@@ -123,15 +150,21 @@ export const MetricsHistory = ({ server, metrics }) => {
       }));
 
       console.log('Formatted historical data:', formattedData);
-      setHistoricalData(formattedData);
+      const isIncremental = systemCursor.current !== null;
+      setHistoricalData(prev => isIncremental ? mergeHistory(prev, formattedData, timeRange) : formattedData);
+      if (formattedData.length) {
+        systemCursor.current = formattedData[formattedData.length - 1].timestamp;
+      }
 
       // Fetch Docker metrics history
+      const dockerSince = dockerCursor.current ? `&since=${encodeURIComponent(dockerCursor.current)}` : '';
       const dockerResponse = await fetch(
-        `/api/servers/${server.ip_address}/docker/metrics?timeRange=${timeRange}`,
+        `/api/servers/${server.ip_address}/docker/metrics?timeRange=${timeRange}&points=${HISTORY_POINTS}${dockerSince}`,
         {
           headers: {
             "Authorization": `Bearer ${localStorage.getItem("token")}`
-          }
+          },
+          cache: 'no-cache'
         }
       );
 
@@ -141,7 +174,23 @@ export const MetricsHistory = ({ server, metrics }) => {
 
       const dockerData = await dockerResponse.json();
       console.log('Received Docker data:', dockerData);
-      setDockerHistoricalData(dockerData);
+      const dockerIncremental = dockerCursor.current !== null;
+      setDockerHistoricalData(prev => {
+        if (!dockerIncremental) return dockerData;
+        const merged = {};
+        Object.entries(dockerData).forEach(([name, points]) => {
+          merged[name] = mergeHistory(prev[name] || [], points, timeRange);
+        });
+        return merged;
+      });
+      // Containers share one cursor: the oldest of their newest points
+      const newest = Object.values(dockerData)
+        .filter(points => points.length)
+        .map(points => points[points.length - 1].timestamp)
+        .sort((a, b) => Date.parse(a) - Date.parse(b));
+      if (newest.length) {
+        dockerCursor.current = newest[0];
+      }
     } catch (error) {
       console.error('Error fetching historical data:', error);
       setError(error.message || 'Failed to load historical data');
@@ -185,35 +234,34 @@ export const MetricsHistory = ({ server, metrics }) => {
     }
   };
 
-  const checkAlerts = () => {
-    if (!metrics) return;
+  const ALERT_LABELS = { cpu: 'CPU usage', memory: 'Memory usage', disk: 'Disk usage' };
 
-    const newAlerts = [];
-    if (metrics.cpu_percent > thresholds.cpu) {
-      newAlerts.push({
-        type: 'cpu',
-        message: `CPU usage is above ${thresholds.cpu}% (Current: ${metrics.cpu_percent.toFixed(1)}%)`,
-        value: metrics.cpu_percent,
-        timestamp: new Date()
-      });
-    }
-    if (metrics.memory_percent > thresholds.memory) {
-      newAlerts.push({
-        type: 'memory',
-        message: `Memory usage is above ${thresholds.memory}% (Current: ${metrics.memory_percent.toFixed(1)}%)`,
-        value: metrics.memory_percent,
-        timestamp: new Date()
-      });
-    }
-    if (metrics.disk_percent > thresholds.disk) {
-      newAlerts.push({
-        type: 'disk',
-        message: `Disk usage is above ${thresholds.disk}% (Current: ${metrics.disk_percent.toFixed(1)}%)`,
-        value: metrics.disk_percent,
-        timestamp: new Date()
-      });
+  // ✅ Alerts are evaluated by the server as samples arrive; show the ones firing now
+  const checkAlerts = async () => {
+    if (!server || !metrics) return;
+
+    try {
+      const response = await fetch(
+        `/api/alerts?server=${server.ip_address}`,
+        {
+          headers: {
+            "Authorization": `Bearer ${localStorage.getItem("token")}`
+          }
+        }
+      );
+      if (!response.ok) {
+        throw new Error(`Failed to load alerts: ${response.statusText}`);
+      }
+      const data = await response.json();
+      setAlerts(data.active.map(alert => ({
+        type: alert.metric,
+        message: `${ALERT_LABELS[alert.metric] || `${alert.metric} usage`} is above ${alert.threshold}% (Peak: ${alert.peak.toFixed(1)}%)`,
+        value: alert.peak,
+        timestamp: new Date(alert.fired_at)
+      })));
+    } catch (error) {
+      console.error('Error loading alerts:', error);
     }
-    setAlerts(newAlerts);
   };
 
   useEffect(() => {
@@ -512,6 +560,16 @@ export const MetricsHistory = ({ server, metrics }) => {
               marks
               valueLabelDisplay="auto"
             />
+            <Typography gutterBottom>Alert After (seconds above threshold)</Typography>
+            <Slider
+              value={thresholds.duration}
+              onChange={(_, value) => handleThresholdChange('duration', value)}
+              min={0}
+              max={600}
+              step={30}
+              marks
+              valueLabelDisplay="auto"
+            />
           </Box>
         </DialogContent>
         <DialogActions>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React from 'react';
 import {
   Card,
   CardContent,
@@ -17,83 +17,7 @@ import {
 } from '@mui/icons-material';
 
 export const SystemMetrics = ({ metrics, isLoading, currentServer }) => {
-  const [localMetrics, setLocalMetrics] = useState(metrics);
-  const [updateInterval, setUpdateInterval] = useState(null);
-
-  useEffect(() => {
-    setLocalMetrics(metrics);
-  }, [metrics]);
-
-  useEffect(() => {
-    const fetchLatestMetrics = async () => {
-      if (!currentServer) return;
-      
-      try {
-        const response = await fetch(
-          `/api/system?server=${currentServer.ip_address}`,
-          {
-            headers: {
-              "Authorization": `Bearer ${localStorage.getItem("token")}`
-            }
-          }
-        );
-        
-        if (!response.ok) {
-          const errorData = await response.json();
-          throw new Error(errorData.error || 'Failed to fetch metrics');
-        }
-        
-        const data = await response.json();
-        
-        // Ensure all values are properly formatted
-        const memoryInfo = data.memory_info || {};
-        const diskInfo = (data.disk_usage && data.disk_usage['/']) || {};
-        
-        setLocalMetrics({
-          cpu_percent: parseFloat(data.cpu_percent || 0),
-          memory_percent: parseFloat(memoryInfo.percent || 0),
-          memory_used: parseInt(memoryInfo.used || 0, 10),
-          memory_total: parseInt(memoryInfo.total || 0, 10),
-          disk_percent: parseFloat(diskInfo.percent || 0),
-          disk_used: parseInt(diskInfo.used || 0, 10),
-          disk_total: parseInt(diskInfo.total || 0, 10),
-          disks: Object.entries(data.disk_usage || {}).map(([mount, usage]) => ({
-            mount,
-            percent: parseFloat(usage.percent || 0),
-            used: parseInt(usage.used || 0, 10),
-            total: parseInt(usage.total || 0, 10)
-          }))
-        });
-      } catch (error) {
-        console.error('Error fetching latest metrics:', error);
-        setLocalMetrics({
-          cpu_percent: 0,
-          memory_percent: 0,
-          memory_used: 0,
-          memory_total: 0,
-          disk_percent: 0,
-          disk_used: 0,
-          disk_total: 0,
-          disks: []
-        });
-      }
-    };
-
-    // Set up polling interval for real-time updates
-    if (currentServer) {
-      fetchLatestMetrics(); // Initial fetch
-      const interval = setInterval(fetchLatestMetrics, 5000); // Update every 5 seconds
-      setUpdateInterval(interval);
-    }
-
-    return () => {
-      if (updateInterval) {
-        clearInterval(updateInterval);
-      }
-    };
-  }, [currentServer]);
-
-  if (isLoading || !localMetrics) {
+  if (isLoading || !metrics) {
     return (
       <Card sx={{ mb: 3 }}>
         <CardContent>
@@ -132,18 +56,18 @@ export const SystemMetrics = ({ metrics, isLoading, currentServer }) => {
               <SpeedIcon sx={{ mr: 1 }} />
               <Typography variant="h6">CPU Usage</Typography>
             </Box>
-            <Tooltip title={`${localMetrics.cpu_percent}%`}>
+            <Tooltip title={`${metrics.cpu_percent}%`}>
               <Box sx={{ display: 'flex', alignItems: 'center', gap: 1 }}>
                 <Box sx={{ flexGrow: 1 }}>
                   <LinearProgress
                     variant="determinate"
-                    value={localMetrics.cpu_percent}
-                    color={getProgressColor(localMetrics.cpu_percent)}
+                    value={metrics.cpu_percent}
+                    color={getProgressColor(metrics.cpu_percent)}
                     sx={{ height: 10, borderRadius: 5 }}
                   />
                 </Box>
                 <Typography variant="body2" color="text.secondary">
-                  {localMetrics.cpu_percent}%
+                  {metrics.cpu_percent}%
                 </Typography>
               </Box>
             </Tooltip>
@@ -153,23 +77,23 @@ export const SystemMetrics = ({ metrics, isLoading, currentServer }) => {
               <MemoryIcon sx={{ mr: 1 }} />
               <Typography variant="h6">Memory Usage</Typography>
             </Box>
-            <Tooltip title={`${localMetrics.memory_percent}%`}>
+            <Tooltip title={`${metrics.memory_percent}%`}>
               <Box sx={{ display: 'flex', alignItems: 'center', gap: 1 }}>
                 <Box sx={{ flexGrow: 1 }}>
                   <LinearProgress
                     variant="determinate"
-                    value={localMetrics.memory_percent}
-                    color={getProgressColor(localMetrics.memory_percent)}
+                    value={metrics.memory_percent}
+                    color={getProgressColor(metrics.memory_percent)}
                     sx={{ height: 10, borderRadius: 5 }}
                   />
                 </Box>
                 <Typography variant="body2" color="text.secondary">
-                  {localMetrics.memory_percent}%
+                  {metrics.memory_percent}%
                 </Typography>
               </Box>
             </Tooltip>
             <Typography variant="body2" color="text.secondary" sx={{ mt: 1 }}>
-              {formatBytes(localMetrics.memory_used)} / {formatBytes(localMetrics.memory_total)}
+              {formatBytes(metrics.memory_used)} / {formatBytes(metrics.memory_total)}
             </Typography>
           </Grid>
           <Grid item xs={12} md={4}>
@@ -177,8 +101,8 @@ export const SystemMetrics = ({ metrics, isLoading, currentServer }) => {
               <StorageIcon sx={{ mr: 1 }} />
               <Typography variant="h6">Disk Usage</Typography>
             </Box>
-            {localMetrics.disks && localMetrics.disks.map((disk, index) => (
-              <Box key={disk.mount} sx={{ mb: index < localMetrics.disks.length - 1 ? 2 : 0 }}>
+            {metrics.disks && metrics.disks.map((disk, index) => (
+              <Box key={disk.mount} sx={{ mb: index < metrics.disks.length - 1 ? 2 : 0 }}>
                 <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
                   <Typography variant="caption" sx={{ 
                     maxWidth: '40%', 
@@ -200,7 +124,7 @@ export const SystemMetrics = ({ metrics, isLoading, currentServer }) => {
                     sx={{ height: 8, borderRadius: 4, mt: 0.5 }}
                   />
                 </Tooltip>
-                {index < localMetrics.disks.length - 1 && <Divider sx={{ mt: 1 }} />}
+                {index < metrics.disks.length - 1 && <Divider sx={{ mt: 1 }} />}
               </Box>
             ))}
           </Grid>
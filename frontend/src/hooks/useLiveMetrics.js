@@ -0,0 +1,96 @@
+import { useState, useEffect } from "react";
+
+const RECONNECT_DELAY = 5000;
+
+// Parse "event: ...\ndata: ..." blocks out of the stream; returns the unfinished tail
+const parseEvents = (buffer, onEvent) => {
+  const blocks = buffer.split("\n\n");
+  const rest = blocks.pop();
+  for (const block of blocks) {
+    const data = block
+      .split("\n")
+      .filter((line) => line.startsWith("data: "))
+      .map((line) => line.slice(6))
+      .join("\n");
+    if (data) onEvent(JSON.parse(data));
+  }
+  return rest;
+};
+
+// Flatten a collector snapshot into the shape the dashboard cards display
+export const toDisplayMetrics = (data) => {
+  if (!data) return null;
+  const memoryInfo = data.memory_info || {};
+  const diskInfo = (data.disk_usage && data.disk_usage['/']) || {};
+  return {
+    cpu_percent: parseFloat(data.cpu_percent || 0),
+    memory_percent: parseFloat(memoryInfo.percent || 0),
+    memory_used: parseInt(memoryInfo.used || 0, 10),
+    memory_total: parseInt(memoryInfo.total || 0, 10),
+    disk_percent: parseFloat(diskInfo.percent || 0),
+    disk_used: parseInt(diskInfo.used || 0, 10),
+    disk_total: parseInt(diskInfo.total || 0, 10),
+    disks: Object.entries(data.disk_usage || {}).map(([mount, usage]) => ({
+      mount,
+      percent: parseFloat(usage.percent || 0),
+      used: parseInt(usage.used || 0, 10),
+      total: parseInt(usage.total || 0, 10)
+    }))
+  };
+};
+
+// ✅ Subscribe to /api/stream/metrics for one server instead of polling /api/system.
+// fetch() is used rather than EventSource so the Authorization header can be sent.
+export const useLiveMetrics = (serverIp) => {
+  const [live, setLive] = useState({ metrics: null, error: null });
+
+  useEffect(() => {
+    setLive({ metrics: null, error: null });  // Don't show the previous server's metrics
+    if (!serverIp) return;
+
+    const controller = new AbortController();
+    let retryTimer = null;
+
+    const connect = async () => {
+      try {
+        const response = await fetch(`/api/stream/metrics?servers=${serverIp}`, {
+          headers: {
+            "Authorization": `Bearer ${localStorage.getItem("token")}`,
+          },
+          signal: controller.signal,
+        });
+        if (!response.ok) throw new Error(`Live stream failed: ${response.status}`);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer = parseEvents(buffer + decoder.decode(value, { stream: true }), (event) => {
+            if (event.ip_address !== serverIp) return;
+            setLive((previous) => ({
+              metrics: event.metrics || previous.metrics,
+              error: event.error,
+            }));
+          });
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return;
+        console.error("Live metrics stream error:", error);
+      }
+      if (!controller.signal.aborted) {
+        retryTimer = setTimeout(connect, RECONNECT_DELAY);
+      }
+    };
+
+    connect();
+
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+    };
+  }, [serverIp]);
+
+  return live;
+};
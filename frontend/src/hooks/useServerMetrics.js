@@ -1,4 +1,5 @@
 import { useState, useEffect } from "react";
+import { useLiveMetrics } from "./useLiveMetrics";
 
 export const useServerMetrics = (currentServer) => {
   const [metrics, setMetrics] = useState({
@@ -8,6 +9,7 @@ export const useServerMetrics = (currentServer) => {
     alerts: [],
     isLoading: true
   });
+  const live = useLiveMetrics(currentServer?.ip_address);
 
   useEffect(() => {
     if (!currentServer) return;
@@ -16,22 +18,19 @@ export const useServerMetrics = (currentServer) => {
 
     const fetchData = async () => {
       try {
-        const systemRes = await fetch(`/metrics/system?server=${currentServer.ip_address}`);
-        const systemData = systemRes.ok ? await systemRes.json() : {};
-
         const dockerRes = await fetch(`/metrics/docker?server=${currentServer.ip_address}`);
         const dockerData = dockerRes.ok ? await dockerRes.json() : [];
 
         const historicalRes = await fetch(`/metrics/servers/${currentServer.ip_address}/metrics`);
         const historicalData = historicalRes.ok ? await historicalRes.json() : [];
 
-        setMetrics({
-          system: systemData,
+        setMetrics((previous) => ({
+          ...previous,
           docker: dockerData,
           historical: Array.isArray(historicalData) ? historicalData : [],  // ✅ Ensure it's always an array
           alerts: [],
           isLoading: false
-        });
+        }));
 
       } catch (error) {
         console.error("Error fetching metrics:", error);
@@ -44,5 +43,5 @@ export const useServerMetrics = (currentServer) => {
     return () => clearInterval(interval);  // ✅ Cleanup interval on unmount
   }, [currentServer]);
 
-  return metrics;
+  return { ...metrics, system: live.metrics };
 };
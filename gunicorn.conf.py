@@ -0,0 +1,66 @@
+"""Production server settings: ``gunicorn -c gunicorn.conf.py run:app``.
+
+Every setting can be overridden from the environment. Only one worker collects (see
+COLLECTOR_ROLE in app/config.py); the others serve the API from its snapshots.
+"""
+import multiprocessing
+import os
+import signal
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Threaded workers: requests mostly wait on SQLite or the network, and every open live
+# stream (metrics or container logs) holds one thread for as long as it is open
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', min(multiprocessing.cpu_count(), 4)))
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+
+# With gthread, timeout only kills a worker whose main loop stopped heartbeating, so
+# long-lived streams are not cut off by it
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Workers hold in-memory state (ring buffers, snapshots, caches), so restarting them
+# periodically is off by default
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+# Background threads and database connections must be created in each worker, not
+# inherited through fork
+preload_app = False
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def _coordinator(worker):
+    return worker.wsgi.extensions.get('collection_coordinator')
+
+
+def post_worker_init(worker):
+    """Elect the collecting worker right away rather than on its first request."""
+    coordinator = _coordinator(worker)
+    if coordinator is None:
+        return
+    if coordinator.collect or coordinator.retain:
+        coordinator.ensure_started()
+
+    # Close live streams as soon as the worker is asked to stop, so draining its
+    # requests doesn't wait for graceful_timeout
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        coordinator.begin_shutdown()
+        if callable(handle_exit):
+            handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_exit(server, worker):
+    """Flush buffered samples and release the collector lock before the worker exits."""
+    coordinator = _coordinator(worker) if hasattr(worker, 'wsgi') else None
+    if coordinator is not None:
+        coordinator.stop()
@@ -0,0 +1,140 @@
+"""columnar time-series tables
+
+Moves samples out of the JSON-blob ``metric`` table into ``metric_sample`` (one typed
+column per series value) and ``disk_sample`` (one row per mount), keyed by integer
+epoch timestamps.
+
+Revision ID: 3f6c2a9d8b41
+Revises:
+Create Date: 2026-10-18 09:12:44.318203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2a9d8b41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table('metric_sample'):
+        op.create_table(
+            'metric_sample',
+            sa.Column('server_ip', sa.String(length=45), nullable=False),
+            sa.Column('metric_name', sa.String(length=255), nullable=False),
+            sa.Column('ts', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('cpu_percent', sa.Float(), nullable=False),
+            sa.Column('memory_percent', sa.Float(), nullable=True),
+            sa.Column('memory_used', sa.Float(), nullable=True),
+            sa.Column('memory_total', sa.Float(), nullable=True),
+            sa.Column('memory_available', sa.Float(), nullable=True),
+            sa.Column('memory_free', sa.Float(), nullable=True),
+            sa.Column('disk_percent', sa.Float(), nullable=True),
+            sa.PrimaryKeyConstraint('server_ip', 'metric_name', 'ts'),
+            sqlite_with_rowid=False
+        )
+    if not _has_table('disk_sample'):
+        op.create_table(
+            'disk_sample',
+            sa.Column('server_ip', sa.String(length=45), nullable=False),
+            sa.Column('ts', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('mount', sa.String(length=255), nullable=False),
+            sa.Column('total', sa.Float(), nullable=False),
+            sa.Column('used', sa.Float(), nullable=False),
+            sa.Column('free', sa.Float(), nullable=False),
+            sa.Column('percent', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('server_ip', 'ts', 'mount'),
+            sqlite_with_rowid=False
+        )
+
+    # Databases created by the new init_db.py never had the legacy table
+    if not _has_table('metric'):
+        return
+
+    # Legacy timestamps were written with datetime.now(), i.e. local time
+    op.execute("""
+        INSERT OR REPLACE INTO metric_sample (
+            server_ip, metric_name, ts, cpu_percent, memory_percent, memory_used,
+            memory_total, memory_available, memory_free, disk_percent
+        )
+        SELECT
+            server_ip,
+            metric_name,
+            CAST(strftime('%s', timestamp, 'utc') AS INTEGER),
+            COALESCE(metric_value, 0),
+            CASE WHEN metric_name = 'system' THEN memory_percent END,
+            CASE WHEN metric_name = 'system'
+                 THEN json_extract(memory_info, '$.used')
+                 ELSE memory_percent * 1048576 END,  -- docker rows stored MB in memory_percent
+            json_extract(memory_info, '$.total'),
+            json_extract(memory_info, '$.available'),
+            json_extract(memory_info, '$.free'),
+            disk_percent
+        FROM metric
+    """)
+    op.execute("""
+        INSERT OR REPLACE INTO disk_sample (server_ip, ts, mount, total, used, free, percent)
+        SELECT
+            m.server_ip,
+            CAST(strftime('%s', m.timestamp, 'utc') AS INTEGER),
+            d.key,
+            COALESCE(json_extract(d.value, '$.total'), 0),
+            COALESCE(json_extract(d.value, '$.used'), 0),
+            COALESCE(json_extract(d.value, '$.free'), 0),
+            COALESCE(json_extract(d.value, '$.percent'), 0)
+        FROM metric AS m, json_each(m.disk_usage) AS d
+        WHERE m.metric_name = 'system' AND json_valid(m.disk_usage)
+    """)
+    op.drop_table('metric')
+
+
+def downgrade():
+    op.create_table(
+        'metric',
+        sa.Column('m_id', sa.Integer(), nullable=False),
+        sa.Column('metric_name', sa.String(length=50), nullable=False),
+        sa.Column('metric_value', sa.Float(), nullable=False),
+        sa.Column('memory_percent', sa.Float(), nullable=True),
+        sa.Column('disk_percent', sa.Float(), nullable=True),
+        sa.Column('memory_info', sa.JSON(), nullable=True),
+        sa.Column('disk_usage', sa.JSON(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('server_ip', sa.String(length=15), nullable=False),
+        sa.ForeignKeyConstraint(['server_ip'], ['server.ip_address'], ),
+        sa.PrimaryKeyConstraint('m_id')
+    )
+    op.execute("""
+        INSERT INTO metric (
+            metric_name, metric_value, memory_percent, disk_percent,
+            memory_info, disk_usage, timestamp, server_ip
+        )
+        SELECT
+            s.metric_name,
+            s.cpu_percent,
+            CASE WHEN s.metric_name = 'system' THEN s.memory_percent ELSE s.memory_used / 1048576 END,
+            s.disk_percent,
+            CASE WHEN s.metric_name = 'system' THEN json_object(
+                'total', s.memory_total, 'available', s.memory_available,
+                'percent', s.memory_percent, 'used', s.memory_used, 'free', s.memory_free
+            ) END,
+            CASE WHEN s.metric_name = 'system' THEN (
+                SELECT json_group_object(d.mount, json_object(
+                    'total', d.total, 'used', d.used, 'free', d.free, 'percent', d.percent
+                ))
+                FROM disk_sample AS d
+                WHERE d.server_ip = s.server_ip AND d.ts = s.ts
+            ) END,
+            datetime(s.ts, 'unixepoch', 'localtime'),
+            s.server_ip
+        FROM metric_sample AS s
+    """)
+    op.drop_table('disk_sample')
+    op.drop_table('metric_sample')
@@ -0,0 +1,35 @@
+"""server snapshots
+
+Adds the server_snapshot table the collecting process publishes its latest system
+and Docker snapshots to, so processes that don't collect can serve them.
+
+Revision ID: 5e0b8c2f71a4
+Revises: d41a6c7e93b5
+Create Date: 2026-10-18 17:26:09.104873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b8c2f71a4'
+down_revision = 'd41a6c7e93b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'server_snapshot',
+        sa.Column('server_ip', sa.String(length=45), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('server_ip', 'kind')
+    )
+
+
+def downgrade():
+    op.drop_table('server_snapshot')
@@ -0,0 +1,37 @@
+"""sample time indexes
+
+History queries filter on (server_ip, metric_name, ts) and are served by the
+clustered primary keys of the WITHOUT ROWID sample tables, which already cover every
+column they read. This adds the remaining access path: time-only range scans across
+all servers, used when expiring old samples.
+
+Revision ID: 8c51d0e7a2f6
+Revises: 3f6c2a9d8b41
+Create Date: 2026-10-18 11:47:05.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c51d0e7a2f6'
+down_revision = '3f6c2a9d8b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('metric_sample', schema=None) as batch_op:
+        batch_op.create_index('ix_metric_sample_ts', ['ts'], unique=False)
+
+    with op.batch_alter_table('disk_sample', schema=None) as batch_op:
+        batch_op.create_index('ix_disk_sample_ts', ['ts'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('disk_sample', schema=None) as batch_op:
+        batch_op.drop_index('ix_disk_sample_ts')
+
+    with op.batch_alter_table('metric_sample', schema=None) as batch_op:
+        batch_op.drop_index('ix_metric_sample_ts')
@@ -0,0 +1,34 @@
+"""rollup backfill
+
+Adds the rollup_backfill table: spans of raw samples stored after their buckets were
+rolled up (pushed late by an agent), which the retention engine rolls up again.
+
+Revision ID: 9a3d6e1f0c57
+Revises: 5e0b8c2f71a4
+Create Date: 2026-10-18 19:02:41.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3d6e1f0c57'
+down_revision = '5e0b8c2f71a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'rollup_backfill',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_ts', sa.Integer(), nullable=False),
+        sa.Column('end_ts', sa.Integer(), nullable=False),
+        sa.Column('requested_at', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('rollup_backfill')
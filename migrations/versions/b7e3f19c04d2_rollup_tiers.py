@@ -0,0 +1,56 @@
+"""rollup tiers
+
+Adds the 1-minute, 15-minute and 1-hour rollup tables maintained by the retention
+engine. They are filled from existing raw samples on the engine's first pass.
+
+Revision ID: b7e3f19c04d2
+Revises: 8c51d0e7a2f6
+Create Date: 2026-10-18 12:38:51.207734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3f19c04d2'
+down_revision = '8c51d0e7a2f6'
+branch_labels = None
+depends_on = None
+
+ROLLUP_TABLES = ('metric_rollup_1m', 'metric_rollup_15m', 'metric_rollup_1h')
+
+
+def upgrade():
+    for table_name in ROLLUP_TABLES:
+        op.create_table(
+            table_name,
+            sa.Column('server_ip', sa.String(length=45), nullable=False),
+            sa.Column('metric_name', sa.String(length=255), nullable=False),
+            sa.Column('ts', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.Column('cpu_min', sa.Float(), nullable=False),
+            sa.Column('cpu_avg', sa.Float(), nullable=False),
+            sa.Column('cpu_max', sa.Float(), nullable=False),
+            sa.Column('memory_min', sa.Float(), nullable=True),
+            sa.Column('memory_avg', sa.Float(), nullable=True),
+            sa.Column('memory_max', sa.Float(), nullable=True),
+            sa.Column('memory_used_min', sa.Float(), nullable=True),
+            sa.Column('memory_used_avg', sa.Float(), nullable=True),
+            sa.Column('memory_used_max', sa.Float(), nullable=True),
+            sa.Column('memory_total', sa.Float(), nullable=True),
+            sa.Column('disk_min', sa.Float(), nullable=True),
+            sa.Column('disk_avg', sa.Float(), nullable=True),
+            sa.Column('disk_max', sa.Float(), nullable=True),
+            sa.PrimaryKeyConstraint('server_ip', 'metric_name', 'ts'),
+            sqlite_with_rowid=False
+        )
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.create_index(f'ix_{table_name}_ts', ['ts'], unique=False)
+
+
+def downgrade():
+    for table_name in reversed(ROLLUP_TABLES):
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table_name}_ts')
+        op.drop_table(table_name)
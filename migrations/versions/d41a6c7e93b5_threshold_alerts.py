@@ -0,0 +1,59 @@
+"""threshold alerts
+
+Adds the alert table written by the alert engine and a breach duration to each
+server's thresholds. Existing thresholds keep firing on the first breaching sample.
+
+Revision ID: d41a6c7e93b5
+Revises: b7e3f19c04d2
+Create Date: 2026-10-18 15:02:44.318520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a6c7e93b5'
+down_revision = 'b7e3f19c04d2'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    op.create_table(
+        'alert',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('server_ip', sa.String(length=45), nullable=False),
+        sa.Column('metric', sa.String(length=16), nullable=False),
+        sa.Column('threshold', sa.Float(), nullable=False),
+        sa.Column('duration_seconds', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('peak', sa.Float(), nullable=False),
+        sa.Column('started_at', sa.Integer(), nullable=False),
+        sa.Column('fired_at', sa.Integer(), nullable=False),
+        sa.Column('resolved_at', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('alert', schema=None) as batch_op:
+        batch_op.create_index('ix_alert_server_ip_started_at', ['server_ip', 'started_at'], unique=False)
+        batch_op.create_index('ix_alert_started_at', ['started_at'], unique=False)
+
+    # thresholds is created by init_db and may not exist on databases made by migrations alone
+    if _has_table('thresholds'):
+        with op.batch_alter_table('thresholds', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('duration_seconds', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    if _has_table('thresholds'):
+        with op.batch_alter_table('thresholds', schema=None) as batch_op:
+            batch_op.drop_column('duration_seconds')
+
+    with op.batch_alter_table('alert', schema=None) as batch_op:
+        batch_op.drop_index('ix_alert_started_at')
+        batch_op.drop_index('ix_alert_server_ip_started_at')
+    op.drop_table('alert')
@@ -2,5 +2,6 @@ from app import create_app
 
 app = create_app()
 
+# Development server; in production run `gunicorn -c gunicorn.conf.py run:app`
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+# The app reads its settings from the environment when app.config is first imported
+_db_dir = tempfile.mkdtemp(prefix='metricly-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_db_dir, 'metricly.db')}",
+    'COLLECTOR_ENABLED': 'false',
+    'RETENTION_ENABLED': 'false',
+    'COLLECTOR_LOCK_FILE': os.path.join(_db_dir, 'collector.lock'),
+    'LOG_LEVEL': 'WARNING',
+    'JWT_SECRET_KEY': 'metricly-tests-jwt-secret-of-32-bytes',
+})
+
+import pytest
+
+from app import create_app
+from app.models.database import db
+from app.models.recent_samples import recent_samples
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app()
+
+
+@pytest.fixture
+def db_session(app):
+    """An app context over freshly created, empty tables."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        recent_samples._rings.clear()
+        yield db.session
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, db_session):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(db_session):
+    """Bearer token of a freshly created admin user."""
+    import jwt
+    from datetime import datetime, timedelta, timezone
+    from app.api.routes import SECRET_KEY
+    from app.models.database import User
+
+    db_session.add(User(username='admin', password='-', role='admin'))
+    db_session.commit()
+    token = jwt.encode({'username': 'admin', 'exp': datetime.now(timezone.utc) + timedelta(hours=1)},
+                       SECRET_KEY, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,65 @@
+import pytest
+
+from app.metrics.alerts import AlertEngine
+from app.models.database import Alert, Threshold
+
+IP = '10.0.0.1'
+
+
+def sample(ts, cpu, memory=10.0, disk=10.0):
+    return {'server_ip': IP, 'metric_name': 'system', 'ts': ts,
+            'cpu_percent': cpu, 'memory_percent': memory, 'disk_percent': disk}
+
+
+@pytest.fixture
+def engine(app, db_session):
+    """An engine over thresholds of 80% CPU held for 60s."""
+    db_session.add(Threshold(server_ip=IP, cpu_threshold=80, memory_threshold=90,
+                             disk_threshold=90, duration_seconds=60))
+    db_session.commit()
+    engine = AlertEngine()
+    engine.init_app(app)
+    return engine
+
+
+def feed(engine, start, cpus, step=10):
+    for i, cpu in enumerate(cpus):
+        engine.evaluate(sample(start + i * step, cpu))
+
+
+def test_fires_once_the_breach_lasts_the_duration(engine):
+    feed(engine, 1000, [85, 90, 95, 90, 85, 85])
+    assert engine.active(IP) == []
+    engine.evaluate(sample(1060, 88))
+    engine.evaluate(sample(1070, 92))
+    (alert,) = engine.active(IP)
+    assert (alert['metric'], alert['threshold'], alert['value'], alert['peak']) == ('cpu', 80, 88, 92)
+    (row,) = Alert.query.all()
+    assert (row.started_at, row.fired_at, row.resolved_at) == (1000, 1060, None)
+
+
+def test_fired_alert_resolves_on_first_sample_under_the_threshold(engine):
+    feed(engine, 1000, [85] * 7 + [99, 80])
+    assert engine.active(IP) == []
+    (row,) = Alert.query.all()
+    assert (row.fired_at, row.resolved_at, row.peak) == (1060, 1080, 99)
+    assert [alert['id'] for alert in engine.resolved(IP)] == [row.id]
+
+
+def test_breach_ending_before_the_duration_never_fires(engine):
+    feed(engine, 1000, [85, 90, 95, 90, 85, 70])
+    feed(engine, 1060, [85, 85])
+    assert engine.active(IP) == []
+    assert Alert.query.count() == 0
+
+
+def test_late_samples_are_skipped(engine):
+    feed(engine, 1000, [85] * 7)
+    engine.evaluate(sample(1010, 10))
+    assert len(engine.active(IP)) == 1
+
+
+def test_servers_without_thresholds_use_the_defaults(engine):
+    engine.evaluate(dict(sample(1000, 10, memory=81), server_ip='10.0.0.2'))
+    (alert,) = engine.active('10.0.0.2')
+    assert (alert['metric'], alert['threshold'], alert['duration']) == ('memory', 80, 0)
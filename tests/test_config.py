@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.config import in_memory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter, since the config is read from the environment on import
+READ_BACK = '''
+from sqlalchemy import select
+from app import create_app
+from app.models.database import Server, db
+from app.models.sqlite_tuning import history_engine, read
+
+app = create_app()
+with app.app_context():
+    db.create_all()
+    db.session.add(Server(ip_address='10.0.0.1'))
+    db.session.commit()
+    assert history_engine() is db.engine, app.config['SQLALCHEMY_BINDS']
+    print(read(select(Server.ip_address))[0][0])
+'''
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('sqlite://', True),
+    ('sqlite:///:memory:', True),
+    ('sqlite:///file:metricly?mode=memory&cache=shared&uri=true', True),
+    ('sqlite:////var/lib/metricly/metricly.db', False),
+    ('postgresql://localhost/metricly', False),
+])
+def test_in_memory(url, expected):
+    assert in_memory(url) is expected
+
+
+def test_in_memory_database_serves_history_from_the_main_engine(tmp_path):
+    env = dict(
+        os.environ, DATABASE_URL='sqlite://', COLLECTOR_ENABLED='false', RETENTION_ENABLED='false',
+        COLLECTOR_LOCK_FILE=str(tmp_path / 'collector.lock'),
+    )
+    env.pop('DATABASE_READ_URL', None)
+    result = subprocess.run([sys.executable, '-c', READ_BACK], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == '10.0.0.1'
@@ -0,0 +1,59 @@
+import pytest
+
+from app.metrics import docker_metrics
+from app.models.database import Server
+
+REMOTE = '10.0.0.7'
+
+
+@pytest.fixture
+def remote_caches(monkeypatch):
+    """The module's remote caches, emptied for the test."""
+    monkeypatch.setattr(docker_metrics, '_remote_caches', {})
+    return docker_metrics._remote_caches
+
+
+@pytest.fixture
+def registered(db_session):
+    db_session.add(Server(ip_address=REMOTE))
+    db_session.commit()
+
+
+def test_remote_docker_metrics_need_a_token(client, remote_caches):
+    assert client.get(f'/api/docker?server={REMOTE}').status_code == 401
+
+
+def test_unregistered_server_is_not_contacted(client, auth_headers, remote_caches):
+    response = client.get('/api/docker?server=169.254.169.254', headers=auth_headers)
+    assert response.status_code == 404
+    assert remote_caches == {}
+
+
+def test_registered_server_without_a_cache_reads_nothing(client, auth_headers, registered, remote_caches):
+    response = client.get(f'/api/docker?server={REMOTE}', headers=auth_headers)
+    assert response.status_code == 200 and response.get_json() == []
+    assert remote_caches == {}
+
+
+def test_registered_server_serves_its_snapshot(client, auth_headers, registered, remote_caches):
+    docker_metrics.docker_metrics_for(REMOTE).mirror([{'name': 'web', 'status': 'running'}], 100)
+    response = client.get(f'/api/docker?server={REMOTE}', headers=auth_headers)
+    assert response.get_json() == [{'name': 'web', 'status': 'running'}]
+
+
+def test_history_rejects_unregistered_servers(client, remote_caches):
+    assert client.get('/api/servers/169.254.169.254/docker/metrics').status_code == 404
+    assert remote_caches == {}
+
+
+def test_history_of_registered_server_without_a_cache(client, registered, remote_caches):
+    response = client.get(f'/api/servers/{REMOTE}/docker/metrics')
+    assert response.status_code == 200
+    assert remote_caches == {}
+
+
+def test_find_docker_metrics_never_creates(remote_caches):
+    assert docker_metrics.find_docker_metrics(REMOTE) is None
+    assert docker_metrics.find_docker_metrics('127.0.0.1') is docker_metrics.docker_metrics_cache
+    cache = docker_metrics.docker_metrics_for(REMOTE)
+    assert docker_metrics.find_docker_metrics(REMOTE) is cache
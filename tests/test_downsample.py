@@ -0,0 +1,110 @@
+import math
+
+import pytest
+
+from app.api.routes import parse_downsampling
+from app.models.downsample import bucket_width, lttb
+from app.models.timeseries import downsample_lttb
+
+
+def series(n):
+    xs = list(range(n))
+    return xs, [math.sin(x / 5) * 10 + x % 7 for x in xs]
+
+
+@pytest.mark.parametrize('n, threshold', [(10, 3), (100, 10), (1000, 37), (1001, 1000)])
+def test_lttb_keeps_endpoints_and_threshold_points(n, threshold):
+    xs, ys = series(n)
+    indices = lttb(xs, ys, threshold)
+    assert len(indices) == threshold
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert indices == sorted(set(indices))
+
+
+def test_lttb_keeps_a_spike():
+    xs = list(range(200))
+    ys = [0.0] * 200
+    ys[123] = 100.0
+    assert 123 in lttb(xs, ys, 10)
+
+
+@pytest.mark.parametrize('threshold', [5, 6, 50])
+def test_lttb_returns_everything_when_threshold_covers_the_data(threshold):
+    xs, ys = series(5)
+    assert lttb(xs, ys, threshold) == list(range(5))
+
+
+@pytest.mark.parametrize('threshold', [0, 1, 2])
+def test_lttb_below_three_points_returns_everything(threshold):
+    xs, ys = series(20)
+    assert lttb(xs, ys, threshold) == list(range(20))
+
+
+def test_lttb_flat_series():
+    xs = list(range(50))
+    indices = lttb(xs, [3.0] * 50, 8)
+    assert len(indices) == 8
+    assert indices[0] == 0 and indices[-1] == 49
+    assert indices == sorted(set(indices))
+
+
+def test_lttb_duplicate_timestamps():
+    xs = [x // 2 for x in range(60)]  # every timestamp twice
+    ys = [float(x % 5) for x in range(60)]
+    indices = lttb(xs, ys, 10)
+    assert len(indices) == 10
+    assert indices[0] == 0 and indices[-1] == 59
+    assert indices == sorted(set(indices))
+
+
+def test_lttb_empty_and_tiny_series():
+    assert lttb([], [], 10) == []
+    assert lttb([1], [1.0], 3) == [0]
+    assert lttb([1, 2], [1.0, 2.0], 3) == [0, 1]
+
+
+def test_downsample_lttb_passes_short_rows_through():
+    rows = [{'ts': ts, 'v': ts} for ts in range(5)]
+    assert downsample_lttb(rows, None, lambda r: r['ts'], lambda r: r['v']) is rows
+    assert downsample_lttb(rows, 5, lambda r: r['ts'], lambda r: r['v']) is rows
+
+
+def test_downsample_lttb_treats_missing_values_as_zero():
+    rows = [{'ts': ts, 'v': None if ts % 3 else ts} for ts in range(30)]
+    kept = downsample_lttb(rows, 6, lambda r: r['ts'], lambda r: r['v'])
+    assert len(kept) == 6
+    assert kept[0] is rows[0] and kept[-1] is rows[-1]
+
+
+def test_bucket_width():
+    assert bucket_width(3600, 300) == 12
+    assert bucket_width(3600, 7) == 515
+    assert bucket_width(10, 300) == 1
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('', ('avg', None, None)),
+    ('?points=300', ('avg', 12, 300)),
+    ('?bucket=60&mode=lttb', ('lttb', 60, 60)),
+])
+def test_parse_downsampling(app, query, expected):
+    with app.test_request_context(f'/history{query}'):
+        assert parse_downsampling(3600) == expected
+
+
+@pytest.mark.parametrize('query', ['?points=2', '?bucket=0', '?mode=median'])
+def test_parse_downsampling_rejects(app, query):
+    with app.test_request_context(f'/history{query}'):
+        with pytest.raises(ValueError):
+            parse_downsampling(3600)
+
+
+@pytest.mark.parametrize('n, threshold', [(10, 3), (1000, 37), (20000, 300), (50001, 1000)])
+def test_numpy_lttb_picks_the_same_points(monkeypatch, n, threshold):
+    pytest.importorskip('numpy')
+    from app.models import downsample
+
+    xs, ys = series(n)
+    picked = downsample._lttb_numpy(xs, ys, threshold)
+    monkeypatch.setattr(downsample, 'np', None)
+    assert lttb(xs, ys, threshold) == picked
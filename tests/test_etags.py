@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from app.models.database import db
+from app.models.timeseries import insert_samples, system_sample_rows
+
+URL = '/api/servers/127.0.0.1/metrics?timeRange=1h'
+
+
+@pytest.fixture
+def history(db_session):
+    """Ten minutes of samples, enough for the response to be compressed."""
+    now = int(time.time())
+    metrics = {
+        'cpu_percent': 12.5,
+        'memory_info': {'total': 8e9, 'available': 4e9, 'percent': 50.0, 'used': 4e9, 'free': 3e9},
+        'disk_usage': {},
+    }
+    insert_samples([system_sample_rows('127.0.0.1', metrics, ts, 40.0)[0] for ts in range(now - 600, now, 5)])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'identity'])
+def test_200_and_304_carry_the_same_etag(client, auth_headers, history, encoding):
+    headers = dict(auth_headers, **{'Accept-Encoding': encoding})
+    response = client.get(URL, headers=headers)
+    assert response.status_code == 200
+    assert (response.headers.get('Content-Encoding') == 'gzip') is (encoding == 'gzip')
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    for accept in ('gzip', 'identity'):
+        revalidated = client.get(URL, headers=dict(auth_headers, **{
+            'Accept-Encoding': accept, 'If-None-Match': etag,
+        }))
+        assert revalidated.status_code == 304
+        assert revalidated.headers['ETag'] == etag
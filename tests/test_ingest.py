@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from app.agent import encode_batch
+from app.config import agent_tokens
+from app.metrics.alerts import alert_engine
+from app.metrics.leader import coordinator
+from app.models.database import Alert, Server, Threshold
+
+SERVER = '10.0.0.5'
+
+
+def test_agent_tokens_map_tokens_to_servers():
+    assert agent_tokens('') == {}
+    assert agent_tokens('a=10.0.0.5|10.0.0.6, b=10.0.0.7,c') == {
+        'a': {'10.0.0.5', '10.0.0.6'}, 'b': {'10.0.0.7'}, 'c': frozenset(),
+    }
+
+
+@pytest.fixture
+def push(app, client, db_session, monkeypatch):
+    """POST a one-sample batch for ``server_ip`` with ``token``; SERVER is registered."""
+    monkeypatch.setitem(app.config, 'AGENT_TOKENS', agent_tokens(f'hub=10.0.0.9|{SERVER},other=10.0.0.8'))
+    db_session.add_all([Server(ip_address=SERVER), Server(ip_address='10.0.0.8')])
+    db_session.commit()
+
+    def push(server_ip, token='hub', samples=None):
+        body = encode_batch(server_ip, samples or [{'ts': int(time.time()), 'containers': []}])
+        headers = {'Authorization': f'Bearer {token}', 'Content-Encoding': 'gzip'}
+        return client.post('/api/ingest', data=body, headers=headers)
+    return push
+
+
+def test_unknown_token_is_rejected(push):
+    assert push(SERVER, token='nope').status_code == 401
+
+
+def test_token_may_only_push_for_its_servers(push):
+    assert push('10.0.0.8').status_code == 403
+    assert push('10.0.0.8', token='other').status_code != 403
+
+
+def test_listed_but_unregistered_server_is_not_found(push):
+    assert push('10.0.0.9').status_code == 404
+
+
+def test_listed_server_is_accepted(push):
+    response = push(SERVER)
+    assert response.status_code == 200, response.get_json()
+
+
+def system(cpu):
+    return {
+        'cpu_percent': cpu,
+        'memory_info': {'total': 8e9, 'available': 4e9, 'percent': 50.0, 'used': 4e9, 'free': 3e9},
+        'disk_usage': {'/': {'total': 1e11, 'used': 4e10, 'free': 6e10, 'percent': 40.0}},
+    }
+
+
+@pytest.fixture
+def lead(monkeypatch):
+    """Makes this process a follower; calling ``lead()`` turns it into a leader that hasn't seen its relays."""
+    monkeypatch.setattr(coordinator, 'is_leader', False)
+    monkeypatch.setattr(coordinator, '_applied', {})
+    monkeypatch.setattr(coordinator, '_published', {})
+    alert_engine.set_evaluating(False)
+
+    def lead():
+        coordinator.is_leader = True
+        coordinator._applied.clear()
+        alert_engine.set_evaluating(True)
+    yield lead
+    alert_engine.set_evaluating(True)
+
+
+def test_leader_evaluates_every_sample_a_follower_ingested(push, db_session, lead):
+    db_session.add(Threshold(server_ip=SERVER, cpu_threshold=80, duration_seconds=0))
+    db_session.commit()
+    now = int(time.time())
+    # A breach that starts and ends inside the batch, so the relayed snapshot shows none
+    samples = [{'ts': now - 20 + i * 5, 'system': system(cpu)} for i, cpu in enumerate([10, 95, 97, 10, 20])]
+    assert push(SERVER, samples=samples).status_code == 200
+
+    lead()
+    coordinator.mirror(remove=False)
+    (alert,) = Alert.query.all()
+    assert (alert.started_at, alert.resolved_at, alert.peak) == (now - 15, now - 5, 97)
@@ -0,0 +1,42 @@
+import pytest
+
+from app.models.database import db
+from app.models.query_plans import HISTORY_QUERIES, capture_statements, explain, plan_problems
+from app.models.timeseries import ROLLUP_TIERS, container_sample_row, insert_samples, system_sample_rows
+
+METRICS = {
+    'cpu_percent': 12.5,
+    'memory_info': {'total': 8e9, 'available': 4e9, 'percent': 50.0, 'used': 4e9, 'free': 3e9},
+    'disk_usage': {'/': {'total': 1e11, 'used': 5e10, 'free': 5e10, 'percent': 50.0}},
+}
+
+
+@pytest.fixture
+def seeded(db_session):
+    samples, disks = [], []
+    for ts in range(0, 600, 5):
+        sample, disk_rows = system_sample_rows('127.0.0.1', METRICS, ts, 50.0)
+        samples.append(sample)
+        disks.extend(disk_rows)
+        samples.append(container_sample_row('127.0.0.1', 'metricly', ts, 1.0, 64.0, 512.0))
+    insert_samples(samples, disks)
+    for tier in ROLLUP_TIERS:
+        db.session.execute(tier.table.insert(), [{
+            'server_ip': '127.0.0.1', 'metric_name': 'system', 'ts': 0, 'count': 1,
+            **{f'{name}_{stat}': 1.0 for name in ('cpu', 'memory', 'memory_used', 'disk')
+               for stat in ('min', 'avg', 'max')},
+            'memory_total': 8e9,
+        }])
+    db.session.commit()
+    return db_session
+
+
+@pytest.mark.parametrize('name, fn, args, kwargs', HISTORY_QUERIES, ids=[query[0] for query in HISTORY_QUERIES])
+def test_history_query_uses_an_index(seeded, name, fn, args, kwargs):
+    statements = capture_statements(fn, *args, **kwargs)
+    assert statements, f"{name} issued no query"
+    for statement, parameters in statements:
+        plan = explain(statement, parameters)
+        assert not any(step.startswith('SCAN') for step in plan), plan
+        assert any(step.startswith('SEARCH') and 'USING' in step for step in plan), plan
+        assert plan_problems(plan) == [], plan
@@ -0,0 +1,121 @@
+import pytest
+
+from app.models.database import MetricSample, db
+from app.models.recent_samples import RecentSamples, SeriesRing, aggregate, recent_samples
+from app.models.timeseries import bucket_rows, insert_samples, raw_rows, stored_bucket_rows, system_sample_rows
+
+IP = '10.0.0.1'
+
+
+def sample(ts, cpu=None):
+    metrics = {
+        'cpu_percent': float(ts % 100) if cpu is None else cpu,
+        'memory_info': {'total': 8e9, 'available': 4e9, 'percent': 50.0, 'used': 4e9, 'free': 3e9},
+        'disk_usage': {},
+    }
+    return system_sample_rows(IP, metrics, ts, 40.0)[0]
+
+
+def test_ring_wraps_around_and_keeps_the_newest():
+    ring = SeriesRing(4)
+    for ts in range(10, 70, 10):
+        assert ring.append(ts, sample(ts))
+    assert ring.size == 4
+    assert (ring.oldest(), ring.newest()) == (30, 60)
+    assert [row.ts for row in ring.rows(0)] == [30, 40, 50, 60]
+    assert [row.ts for row in ring.rows(35, 60)] == [40, 50]
+    assert [row.ts for row in ring.rows(40, 41)] == [40]
+    assert ring.rows(61) == []
+
+
+def test_ring_ignores_older_samples_and_replaces_the_newest():
+    ring = SeriesRing(4)
+    ring.append(10, sample(10))
+    ring.append(20, sample(20, cpu=1.0))
+    assert not ring.append(15, sample(15))
+    assert ring.append(20, sample(20, cpu=2.0))
+    assert [(row.ts, row.cpu_percent) for row in ring.rows(0)] == [(10, 10.0), (20, 2.0)]
+
+
+def test_ring_stores_missing_values_as_none():
+    ring = SeriesRing(2)
+    row = dict(sample(10), memory_available=None)
+    ring.append(10, row)
+    assert ring.rows(0)[0].memory_available is None
+
+
+def test_recent_samples_limits_series_and_discards_servers():
+    buffer = RecentSamples(window=60, interval=5, max_series=2)
+    buffer.add([sample(1), dict(sample(1), metric_name='docker_a'), dict(sample(1), metric_name='docker_b')])
+    assert buffer.stats()['series'] == 2 and buffer.rejected == 1
+    assert buffer.covered_from(IP, 'system') == 1
+    buffer.discard(IP)
+    assert buffer.covered_from(IP, 'system') is None
+    assert buffer.rows(IP, 'system', 0) == (None, [])
+
+
+def test_recent_samples_disabled_with_zero_window():
+    buffer = RecentSamples(window=0)
+    buffer.add([sample(1)])
+    assert buffer.stats()['series'] == 0
+
+
+@pytest.fixture
+def stored_and_buffered(db_session, monkeypatch):
+    """Samples every 5s from 0 to 595 in the database; the ring holds the last 40 of them."""
+    monkeypatch.setattr(recent_samples, 'window', 180)
+    monkeypatch.setattr(recent_samples, 'interval', 5.0)
+    samples = [sample(ts) for ts in range(0, 600, 5)]
+    insert_samples(samples)
+    db.session.commit()
+    recent_samples.add(samples)
+    return samples
+
+
+def test_ring_capacity_evicts_old_samples(stored_and_buffered):
+    assert recent_samples.capacity == 40
+    assert recent_samples.covered_from(IP, 'system') == 400
+
+
+def test_raw_rows_merges_database_and_ring_without_duplicates(stored_and_buffered):
+    rows = raw_rows(IP, 'system', 0)
+    assert [row.ts for row in rows] == list(range(0, 600, 5))
+    assert rows[-1].cpu_percent == 95.0
+
+
+def test_raw_rows_inside_ring_skips_database(stored_and_buffered):
+    db.session.execute(MetricSample.__table__.delete())
+    db.session.commit()
+    assert [row.ts for row in raw_rows(IP, 'system', 500)] == list(range(500, 600, 5))
+    assert [row.ts for row in raw_rows(IP, 'system', 500, 550)] == list(range(500, 550, 5))
+
+
+def test_raw_rows_reads_database_when_nothing_is_buffered(stored_and_buffered):
+    recent_samples.discard(IP)
+    assert [row.ts for row in raw_rows(IP, 'system', 300, 320)] == [300, 305, 310, 315]
+
+
+def test_raw_rows_before_ring_only_from_database(stored_and_buffered):
+    assert [row.ts for row in raw_rows(IP, 'system', 100, 120)] == [100, 105, 110, 115]
+
+
+@pytest.mark.parametrize('start_ts, bucket', [(0, 60), (0, 7), (405, 60), (430, 30)])
+def test_bucket_rows_from_ring_match_database(stored_and_buffered, start_ts, bucket):
+    table = MetricSample.__table__
+    merged = bucket_rows(table, IP, 'system', start_ts, None, bucket)
+    stored = stored_bucket_rows(table, IP, 'system', start_ts, None, bucket)
+    assert [row.bucket_ts for row in merged] == [row.bucket_ts for row in stored]
+    for ours, theirs in zip(merged, stored):
+        assert ours.count == theirs.count
+        assert ours.cpu_min == theirs.cpu_min and ours.cpu_max == theirs.cpu_max
+        assert ours.cpu_avg == pytest.approx(theirs.cpu_avg)
+
+
+def test_aggregate_skips_missing_values():
+    ring = SeriesRing(4)
+    ring.append(0, sample(0, cpu=10.0))
+    ring.append(1, dict(sample(1), cpu_percent=None))
+    ring.append(2, sample(2, cpu=30.0))
+    (bucket,) = aggregate(ring.rows(0), 60)
+    assert bucket.count == 3
+    assert (bucket.cpu_min, bucket.cpu_avg, bucket.cpu_max) == (10.0, 20.0, 30.0)
@@ -0,0 +1,143 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.models.database import DiskSample, RollupBackfill, db
+from app.models.retention import RetentionEngine
+from app.models.timeseries import RAW_TIER, ROLLUP_TIERS, insert_samples, rollup_watermark, system_sample_rows
+
+TIER_1M, TIER_15M, TIER_1H = ROLLUP_TIERS
+HOUR = 3600
+NOW = 1_800_000_000 // HOUR * HOUR  # on an hour boundary, so every tier's buckets line up
+
+
+def metrics(cpu):
+    return {
+        'cpu_percent': cpu,
+        'memory_info': {'total': 8e9, 'available': 4e9, 'percent': 50.0, 'used': 4e9, 'free': 3e9},
+        'disk_usage': {'/': {'total': 1e11, 'used': 5e10, 'free': 5e10, 'percent': 40.0}},
+    }
+
+
+def store(start, end, step=10, cpu=lambda ts: 10.0):
+    samples, disks = [], []
+    for ts in range(start, end, step):
+        sample, disk_rows = system_sample_rows('10.0.0.1', metrics(cpu(ts)), ts, 40.0)
+        samples.append(sample)
+        disks.extend(disk_rows)
+    insert_samples(samples, disks)
+    db.session.commit()
+
+
+def rollup(tier, ts):
+    t = tier.table
+    return db.session.execute(select(t).where(t.c.ts == ts, t.c.metric_name == 'system')).one()
+
+
+def count(table, *conditions):
+    return db.session.execute(select(func.count()).select_from(table).where(*conditions)).scalar()
+
+
+@pytest.fixture
+def engine(app, db_session, monkeypatch):
+    for setting, hours in (('RAW_RETENTION_HOURS', 48), ('ROLLUP_1M_RETENTION_HOURS', 8 * 24),
+                           ('ROLLUP_15M_RETENTION_HOURS', 90 * 24), ('ROLLUP_1H_RETENTION_HOURS', 2 * 365 * 24)):
+        monkeypatch.setitem(app.config, setting, hours)
+    return RetentionEngine(grace=60)
+
+
+def test_roll_up_folds_complete_buckets_only(engine):
+    store(NOW - 2 * HOUR, NOW, cpu=lambda ts: 10.0 if ts % 60 < 30 else 30.0)
+    engine.roll_up(NOW)
+
+    # Raw samples are folded up to `grace` before now, each tier only up to the one below it
+    assert rollup_watermark(TIER_1M) == NOW - 60
+    assert rollup_watermark(TIER_15M) == NOW - 15 * 60
+    assert rollup_watermark(TIER_1H) == NOW - HOUR
+
+    minute = rollup(TIER_1M, NOW - 2 * HOUR)
+    assert minute.count == 6
+    assert (minute.cpu_min, minute.cpu_avg, minute.cpu_max) == (10.0, 20.0, 30.0)
+    hour = rollup(TIER_1H, NOW - 2 * HOUR)
+    assert hour.count == 360
+    assert (hour.cpu_min, hour.cpu_avg, hour.cpu_max) == (10.0, 20.0, 30.0)
+
+
+def test_roll_up_resumes_from_watermark(engine):
+    store(NOW - 2 * HOUR, NOW - HOUR)
+    engine.roll_up(NOW - HOUR + 60)
+    assert rollup_watermark(TIER_1M) == NOW - HOUR
+
+    store(NOW - HOUR, NOW)
+    engine.roll_up(NOW + 60)
+    assert rollup_watermark(TIER_1M) == NOW
+    assert count(TIER_1M.table) == 120
+    assert db.session.execute(select(func.sum(TIER_1M.table.c.count))).scalar() == 720
+
+
+def test_expire_never_drops_what_is_not_rolled_up(engine, app):
+    app.config['RAW_RETENTION_HOURS'] = 1
+    store(NOW - 3 * HOUR, NOW)
+
+    # Nothing is rolled up yet, so raw samples past their retention are kept
+    engine.expire(NOW)
+    assert count(RAW_TIER.table) == 3 * 360
+
+    engine.roll_up(NOW)
+    engine.expire(NOW)
+    assert db.session.execute(select(func.min(RAW_TIER.table.c.ts))).scalar() == NOW - HOUR
+    assert db.session.execute(select(func.min(DiskSample.__table__.c.ts))).scalar() == NOW - HOUR
+    assert count(TIER_1M.table) == 3 * 60 - 1
+
+
+def test_expire_is_capped_by_next_tier_watermark(engine, app):
+    app.config['RAW_RETENTION_HOURS'] = 1
+    store(NOW - 3 * HOUR, NOW)
+    engine.roll_up(NOW - 2 * HOUR + 60)  # 1m watermark: NOW - 2h
+    engine.expire(NOW)
+    assert db.session.execute(select(func.min(RAW_TIER.table.c.ts))).scalar() == NOW - 2 * HOUR
+
+
+def test_request_backfill_only_for_late_samples(engine):
+    assert not engine.request_backfill(NOW - 2 * HOUR, NOW - HOUR, now=NOW)  # nothing rolled up yet
+
+    store(NOW - 2 * HOUR, NOW)
+    engine.roll_up(NOW)
+    assert not engine.request_backfill(NOW - 30, NOW, now=NOW)  # still within grace
+    assert engine.request_backfill(NOW - 2 * HOUR, NOW - HOUR, now=NOW)
+    assert count(RollupBackfill.__table__) == 1
+
+
+def test_backfill_refolds_late_samples_into_every_tier(engine):
+    store(NOW - 2 * HOUR, NOW, step=20)
+    engine.roll_up(NOW)
+    assert rollup(TIER_1M, NOW - 2 * HOUR).count == 3
+
+    # An agent's spool delivers the samples in between, with a higher CPU
+    store(NOW - 2 * HOUR + 10, NOW - HOUR, step=20, cpu=lambda ts: 50.0)
+    assert engine.request_backfill(NOW - 2 * HOUR + 10, NOW - HOUR - 10, now=NOW)
+
+    engine.backfill(NOW + 30)  # before the grace: the write buffer may still hold samples
+    assert rollup(TIER_1M, NOW - 2 * HOUR).count == 3
+
+    engine.backfill(NOW + 60)
+    minute = rollup(TIER_1M, NOW - 2 * HOUR)
+    assert minute.count == 6 and minute.cpu_max == 50.0 and minute.cpu_avg == 30.0
+    assert rollup(TIER_15M, NOW - 2 * HOUR).count == 90
+    hour = rollup(TIER_1H, NOW - 2 * HOUR)
+    assert hour.count == 360 and hour.cpu_avg == 30.0
+    # Buckets past the span are left as they were
+    assert rollup(TIER_15M, NOW - HOUR).count == 45
+    assert count(RollupBackfill.__table__) == 0
+
+
+def test_backfill_stops_at_each_tier_watermark(engine):
+    store(NOW - 2 * HOUR, NOW)
+    engine.roll_up(NOW)
+    store(NOW - 90, NOW - 60, step=1, cpu=lambda ts: 90.0)  # last whole minute
+    assert engine.request_backfill(NOW - 90, NOW - 61, now=NOW)
+    engine.backfill(NOW + 60)
+
+    assert rollup(TIER_1M, NOW - 120).cpu_max == 90.0
+    # The 15m and 1h buckets holding it are not complete, so roll_up will fold them
+    assert rollup_watermark(TIER_15M) == NOW - 15 * 60
+    assert rollup_watermark(TIER_1H) == NOW - HOUR
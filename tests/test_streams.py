@@ -0,0 +1,92 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.metrics.broadcaster import broadcaster
+from app.metrics.docker_logs import log_stream_slots
+from app.metrics.docker_pool import docker_pool
+
+
+def test_head_on_metrics_stream_keeps_no_subscriber(client, auth_headers):
+    before = broadcaster.subscriber_count()
+    # buffered=True closes the response the way a WSGI server does, without reading a body
+    for _ in range(3):
+        assert client.head('/api/stream/metrics', headers=auth_headers, buffered=True).status_code == 200
+    assert broadcaster.subscriber_count() == before
+
+
+def test_metrics_stream_closed_before_reading_unsubscribes(client, auth_headers):
+    before = broadcaster.subscriber_count()
+    response = client.get('/api/stream/metrics', headers=auth_headers, buffered=False)
+    assert broadcaster.subscriber_count() == before + 1
+    response.close()
+    assert broadcaster.subscriber_count() == before
+
+
+def test_metrics_stream_unsubscribes_after_reading(client, auth_headers):
+    before = broadcaster.subscriber_count()
+    response = client.get('/api/stream/metrics', headers=auth_headers, buffered=False)
+    assert next(response.response).startswith(b'retry:')
+    response.close()
+    assert broadcaster.subscriber_count() == before
+
+
+class FakeLogs:
+    """Docker log stream that sends ``lines`` and then, when following, blocks until closed."""
+
+    def __init__(self, lines, follow):
+        self.lines = lines
+        self.follow = follow
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield from self.lines
+        if self.follow:
+            self.closed.wait(5)
+
+    def close(self):
+        self.closed.set()
+
+
+@pytest.fixture
+def docker_logs(monkeypatch):
+    """Streams opened on a fake local Docker engine, one per logs() call."""
+    streams = []
+
+    def logs(container_id, follow=False, **kwargs):
+        streams.append(FakeLogs([b'2024-01-01T00:00:00.000000000Z hello\n'], follow))
+        return streams[-1]
+
+    api = SimpleNamespace(
+        inspect_container=lambda name: {'Id': 'abc', 'State': {'Running': True}},
+        logs=logs,
+    )
+    monkeypatch.setattr(docker_pool, 'get', lambda server_ip: SimpleNamespace(api=api))
+    return streams
+
+
+def test_head_on_log_stream_keeps_no_slot(client, auth_headers, docker_logs):
+    for _ in range(3):
+        response = client.head('/api/containers/web/logs/stream?server=127.0.0.1&follow=true',
+                               headers=auth_headers, buffered=True)
+        assert response.status_code == 200
+    assert log_stream_slots.open == 0
+    assert docker_logs == []
+
+
+def test_log_stream_closed_early_releases_its_slot(client, auth_headers, docker_logs):
+    response = client.get('/api/containers/web/logs/stream?server=127.0.0.1&follow=true',
+                          headers=auth_headers, buffered=False)
+    assert log_stream_slots.open == 1
+    assert b'hello' in next(response.response)
+    response.close()
+    assert log_stream_slots.open == 0
+    assert docker_logs[0].closed.wait(1)
+
+
+def test_finished_log_stream_releases_its_slot(client, auth_headers, docker_logs):
+    response = client.get('/api/containers/web/logs/stream?server=127.0.0.1', headers=auth_headers,
+                          buffered=True)
+    assert b'event: end' in response.data
+    assert log_stream_slots.open == 0
@@ -0,0 +1,73 @@
+import pytest
+
+from app.models.database import db
+from app.models.timeseries import (
+    RAW_TIER,
+    ROLLUP_TIERS,
+    insert_samples,
+    pick_tier,
+    query_system_history,
+    system_sample_rows,
+)
+
+TIER_1M, TIER_15M, TIER_1H = ROLLUP_TIERS
+
+METRICS = {
+    'cpu_percent': 20.0,
+    'memory_info': {'total': 8e9, 'available': 4e9, 'percent': 50.0, 'used': 4e9, 'free': 3e9},
+    'disk_usage': {'/': {'total': 1e11, 'used': 5e10, 'free': 5e10, 'percent': 50.0}},
+}
+
+
+@pytest.fixture
+def retention(app, monkeypatch):
+    """Default tier retention: raw 48h, 1m 8d, 15m 90d, 1h two years."""
+    for setting, hours in (('RAW_RETENTION_HOURS', 48), ('ROLLUP_1M_RETENTION_HOURS', 8 * 24),
+                           ('ROLLUP_15M_RETENTION_HOURS', 90 * 24), ('ROLLUP_1H_RETENTION_HOURS', 2 * 365 * 24)):
+        monkeypatch.setitem(app.config, setting, hours)
+    monkeypatch.setitem(app.config, 'HISTORY_MAX_POINTS', 1000)
+    with app.app_context():
+        yield app.config
+
+
+@pytest.mark.parametrize('range_seconds, bucket, expected', [
+    (3600, None, RAW_TIER),           # 3s per point: only raw has it
+    (86400, None, TIER_1M),           # 86s per point: 1m is the coarsest that fits
+    (7 * 86400, None, TIER_1M),       # 604s per point
+    (30 * 86400, None, TIER_15M),     # 2592s per point; raw and 1m no longer cover it
+    (365 * 86400, None, TIER_1H),
+    (3600, 60, TIER_1M),
+    (3600, 59, RAW_TIER),
+    (86400, 900, TIER_15M),
+    (86400, 7200, TIER_1H),
+    (30 * 86400, 60, TIER_15M),       # finest tier still covering the range
+])
+def test_pick_tier(retention, range_seconds, bucket, expected):
+    assert pick_tier(range_seconds, bucket) is expected
+
+
+def test_pick_tier_uses_longest_kept_tier_when_none_covers(retention):
+    assert pick_tier(10 * 365 * 86400) is TIER_1H
+    retention['ROLLUP_1H_RETENTION_HOURS'] = 0  # kept forever
+    assert pick_tier(10 * 365 * 86400, 60) is TIER_1H
+
+
+def test_pick_tier_follows_history_max_points(retention):
+    retention['HISTORY_MAX_POINTS'] = 100000
+    assert pick_tier(86400) is RAW_TIER
+
+
+def test_bucketed_points_keep_raw_keys(retention, db_session):
+    now = 1_800_000_000
+    start = now - 86400
+    samples = [system_sample_rows('10.0.0.1', METRICS, ts, 50.0)[0] for ts in range(start, now, 30)]
+    insert_samples(samples)
+    db.session.commit()
+
+    raw = query_system_history('10.0.0.1', now - 3600, 3600)
+    bucketed = query_system_history('10.0.0.1', start, 86400)
+    assert raw and bucketed
+    assert set(raw[0]) <= set(bucketed[0])
+    assert set(raw[0]['memory_info']) == set(bucketed[0]['memory_info'])
+    assert bucketed[0]['memory_info']['available'] is None
+    assert bucketed[0]['count'] == 2
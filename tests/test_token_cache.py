@@ -0,0 +1,39 @@
+import pytest
+
+from app.api.token_cache import Principal, token_cache
+from app.models.database import User
+
+
+@pytest.fixture
+def user(db_session):
+    user = User(username='alice', password='old', role='user')
+    db_session.add(user)
+    db_session.commit()
+    token_cache.clear()
+    token_cache.put('token', Principal(user.u_id, 'alice', 'user'))
+    return user
+
+
+def test_entries_survive_until_the_change_commits(db_session, user):
+    user.password = 'new'
+    db_session.flush()
+    assert token_cache.get('token') is not None
+    db_session.commit()
+    assert token_cache.get('token') is None
+
+
+def test_rolled_back_change_keeps_entries(db_session, user):
+    user.username = 'bob'
+    db_session.flush()
+    db_session.rollback()
+    db_session.commit()
+    assert token_cache.get('token') is not None
+
+
+def test_deleted_user_is_invalidated_on_commit(db_session, user):
+    db_session.delete(user)
+    db_session.flush()
+    assert token_cache.get('token') is not None
+    db_session.commit()
+    assert token_cache.get('token') is None
+
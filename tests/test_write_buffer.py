@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from app.metrics import collector as collector_module
+from app.models import write_buffer as write_buffer_module
+from app.models.database import MetricSample, db
+from app.models.recent_samples import recent_samples
+from app.models.timeseries import container_sample_row
+from app.models.write_buffer import WriteBuffer
+
+
+def rows(n, start=0):
+    return [container_sample_row('10.0.0.1', 'web', ts, 1.0, 64.0, 512.0) for ts in range(start, start + n)]
+
+
+@pytest.fixture
+def buffer(app, db_session):
+    buffer = WriteBuffer(flush_rows=1000, capacity=10, put_timeout=0.05)
+    buffer._app = app
+    buffer._stop.set()  # no flusher thread: tests flush by hand
+    return buffer
+
+
+def stored():
+    return db.session.execute(select(func.count()).select_from(MetricSample)).scalar()
+
+
+def test_flush_writes_queued_rows(buffer):
+    assert buffer.add(rows(4))
+    assert len(buffer) == 4
+    buffer.flush()
+    assert len(buffer) == 0
+    assert stored() == 4
+
+
+def test_add_past_capacity_drops_after_timeout(buffer):
+    assert buffer.add(rows(8))
+    started = time.monotonic()
+    assert not buffer.add(rows(3, start=8))
+    assert time.monotonic() - started >= buffer.put_timeout
+    assert buffer.dropped == 3
+    assert len(buffer) == 8  # rows already queued are kept
+
+
+def test_add_waits_for_a_flush_to_make_room(buffer):
+    buffer.put_timeout = 5
+    assert buffer.add(rows(8))
+    flusher = threading.Timer(0.1, buffer.flush)
+    flusher.start()
+    assert buffer.add(rows(3, start=8))
+    flusher.join()
+    assert buffer.dropped == 0
+    buffer.flush()
+    assert stored() == 11
+
+
+def test_failed_flush_requeues_rows(buffer, monkeypatch):
+    def fail(samples, disks=()):
+        raise RuntimeError("disk I/O error")
+
+    buffer.add(rows(4))
+    monkeypatch.setattr(write_buffer_module, 'insert_samples', fail)
+    buffer.flush()
+    assert len(buffer) == 4 and buffer.dropped == 0
+
+    monkeypatch.undo()
+    buffer.flush()
+    assert stored() == 4
+
+
+def test_failed_flush_drops_rows_that_no_longer_fit(buffer, monkeypatch):
+    def fail_and_refill(samples, disks=()):
+        buffer.add(rows(8, start=100))  # newer rows arrive while the flush is failing
+        raise RuntimeError("disk I/O error")
+
+    buffer.add(rows(4))
+    monkeypatch.setattr(write_buffer_module, 'insert_samples', fail_and_refill)
+    buffer.flush()
+    assert buffer.dropped == 4
+    assert len(buffer) == 8
+
+
+def test_collector_keeps_dropped_samples_out_of_the_ring(db_session, monkeypatch):
+    metrics = {'cpu_percent': 5.0, 'memory_info': {'percent': 10.0}, 'disk_usage': {}}
+    monkeypatch.setattr(collector_module.write_buffer, 'add', lambda samples, disks=(): False)
+    collector_module.collector._store('10.0.0.9', metrics, 1000)
+    assert recent_samples.covered_from('10.0.0.9', 'system') is None
+
+    monkeypatch.setattr(collector_module.write_buffer, 'add', lambda samples, disks=(): True)
+    collector_module.collector._store('10.0.0.9', metrics, 1005)
+    assert recent_samples.covered_from('10.0.0.9', 'system') == 1005